@@ -0,0 +1,66 @@
+"""
+benchmark.cold_start
+~~~~~~~~~~~~~~~~~~~~
+
+Measures cold start time of Home Assistant. Every run is a fresh Python
+process that imports bootstrap and sets up a configuration.
+
+Usage: python3 benchmark/cold_start.py [runs]
+"""
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+RUN = """
+import json, logging, time
+start = time.time()
+import homeassistant
+import homeassistant.bootstrap as bootstrap
+import homeassistant.loader as loader
+imported = time.time()
+hass = homeassistant.HomeAssistant()
+hass.config_dir = {config_dir!r}
+before = time.time()
+loader.prepare(hass)
+prepared = time.time()
+logging.disable(logging.CRITICAL)
+bootstrap.from_config_dict({config!r}, hass)
+done = time.time()
+hass._pool.stop()
+print(json.dumps({{'import': imported - start,
+                  'prepare': prepared - before,
+                  'setup': done - prepared}}))
+"""
+
+CONFIG = {
+    'group': {'test': 'light.Bowl,light.Ceiling'},
+    'process': {'python': 'python'},
+    'downloader': {'download_dir': '/tmp'},
+}
+
+
+def main():
+    """ Runs the benchmark. """
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+
+    script = RUN.format(config_dir=os.path.join(ROOT, 'config'),
+                        config=CONFIG)
+
+    totals = {'import': 0, 'prepare': 0, 'setup': 0}
+
+    for _ in range(runs):
+        output = subprocess.check_output(
+            [sys.executable, '-c', script], cwd=ROOT)
+
+        for key, value in json.loads(output.decode().splitlines()[-1]).items():
+            totals[key] += value
+
+    for key in ('import', 'prepare', 'setup'):
+        print("{:<10}{:>8.1f} ms".format(key, totals[key] / runs * 1000))
+
+
+if __name__ == "__main__":
+    main()
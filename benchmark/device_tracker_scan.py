@@ -0,0 +1,128 @@
+"""
+benchmark.device_tracker_scan
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Measures how fast the device tracker processes scan results when many
+devices are known, comparing matching found devices against lists to
+matching them against the sets the tracker keeps.
+
+Half of the known devices are tracked and the scanner finds half of the
+known devices each scan.
+
+Usage: python3 benchmark/device_tracker_scan.py [number_of_devices]
+"""
+import os
+import sys
+import csv
+import time
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+# pylint: disable=wrong-import-position
+import homeassistant as ha
+import homeassistant.components.device_tracker as device_tracker
+
+SCANS = 20
+
+
+class FixedScanner(object):
+    """ Scanner that always finds the same devices. """
+
+    def __init__(self, found):
+        self.found = found
+
+    def scan_devices(self):
+        """ Returns the MACs of the found devices. """
+        return self.found
+
+    # pylint: disable=no-self-use
+    def get_device_name(self, device):
+        """ Returns the name of device. """
+        return device
+
+
+def create_macs(count):
+    """ Returns count unique MAC addresses. """
+    return ['00:11:22:{:02X}:{:02X}:{:02X}'.format(
+        index >> 16, (index >> 8) & 0xFF, index & 0xFF)
+            for index in range(count)]
+
+
+def write_known_devices(path, macs):
+    """ Writes a known devices file that tracks every other device. """
+    with open(path, 'w') as outp:
+        writer = csv.writer(outp)
+        writer.writerow(("device", "name", "track", "picture"))
+
+        for index, mac in enumerate(macs):
+            writer.writerow((mac, "device_{}".format(index), index % 2, ""))
+
+
+def match_lists(known_dev, found_devices):
+    """ Matches found devices the way the tracker did using lists. """
+    temp_tracking_devices = [device for device in known_dev
+                             if known_dev[device]['track']]
+    home = []
+
+    for device in found_devices:
+        if device in temp_tracking_devices:
+            temp_tracking_devices.remove(device)
+            home.append(device)
+
+    unknown_devices = [device for device in found_devices
+                       if device not in known_dev]
+
+    return home, temp_tracking_devices, unknown_devices
+
+
+def match_sets(tracker, found_devices):
+    """ Matches found devices using the sets of the tracker. """
+    found_devices = set(found_devices)
+
+    return (found_devices & tracker.tracked,
+            tracker.tracked - found_devices,
+            found_devices - tracker.tracked - tracker.untracked)
+
+
+def measure(func):
+    """ Returns number of calls to func per second. """
+    start = time.time()
+
+    for _ in range(SCANS):
+        func()
+
+    return SCANS / (time.time() - start)
+
+
+def main():
+    """ Runs the benchmark. """
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    macs = create_macs(count)
+    found = macs[::2][:count // 4] + macs[1::2][:count // 4]
+
+    with tempfile.TemporaryDirectory() as config_dir:
+        hass = ha.HomeAssistant()
+        hass.config_dir = config_dir
+
+        write_known_devices(
+            hass.get_config_path(device_tracker.KNOWN_DEVICES_FILE), macs)
+
+        tracker = device_tracker.DeviceTracker(
+            hass, {'fixed': FixedScanner(found)})
+
+        lists = measure(lambda: match_lists(tracker.known_devices, found))
+        sets = measure(lambda: match_sets(tracker, found))
+        update = measure(tracker.update_devices)
+
+        hass._pool.stop()  # pylint: disable=protected-access
+
+    print("{} known devices, {} found per scan".format(count, len(found)))
+    print("match with lists: {:>10.1f} scans/s".format(lists))
+    print("match with sets:  {:>10.1f} scans/s".format(sets))
+    print("update_devices:   {:>10.1f} scans/s".format(update))
+
+
+if __name__ == "__main__":
+    main()
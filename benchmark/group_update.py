@@ -0,0 +1,92 @@
+"""
+benchmark.group_update
+~~~~~~~~~~~~~~~~~~~~~~
+
+Measures how fast a group follows the state changes of its members,
+comparing the on count of the group component to rescanning all members
+on every change.
+
+Every member is turned on and off again, one after the other.
+
+Usage: python3 benchmark/group_update.py [number_of_members]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+# pylint: disable=wrong-import-position
+import homeassistant as ha
+import homeassistant.components.group as group
+from homeassistant.components import STATE_ON, STATE_OFF
+
+
+def setup_rescanning_group(hass, entity_id, entity_ids):
+    """ Sets up a group that rescans all members to find out if it should
+        turn off. """
+    hass.states.set(entity_id, STATE_OFF)
+
+    # pylint: disable=unused-argument
+    def update_group_state(changed_id, old_state, new_state):
+        """ Updates the group state by rescanning the members. """
+        cur_gr_state = hass.states.get(entity_id).state
+
+        if cur_gr_state == STATE_OFF and new_state.state == STATE_ON:
+            hass.states.set(entity_id, STATE_ON)
+
+        elif cur_gr_state == STATE_ON and new_state.state == STATE_OFF:
+            if not any([hass.states.is_state(ent_id, STATE_ON)
+                        for ent_id in entity_ids if ent_id != changed_id]):
+                hass.states.set(entity_id, STATE_OFF)
+
+    hass.track_state_change(entity_ids, update_group_state)
+
+
+def measure(count, setup):
+    """ Returns number of member changes per second a group follows. """
+    hass = ha.HomeAssistant()
+
+    entity_ids = ['light.light_{}'.format(index) for index in range(count)]
+
+    for entity_id in entity_ids:
+        hass.states.set(entity_id, STATE_OFF)
+
+    # Keep one member on so the group has to check the others
+    hass.states.set(entity_ids[0], STATE_ON)
+
+    setup(hass, entity_ids)
+
+    start = time.time()
+
+    for entity_id in entity_ids[1:]:
+        hass.states.set(entity_id, STATE_ON)
+        hass.states.set(entity_id, STATE_OFF)
+
+    hass._pool.block_till_done()  # pylint: disable=protected-access
+
+    duration = time.time() - start
+
+    hass._pool.stop()  # pylint: disable=protected-access
+
+    return 2 * (count - 1) / duration
+
+
+def main():
+    """ Runs the benchmark. """
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+
+    rescan = measure(count, lambda hass, entity_ids: setup_rescanning_group(
+        hass, 'group.rescan', entity_ids))
+
+    on_count = measure(count, lambda hass, entity_ids: group.setup_group(
+        hass, 'on_count', entity_ids))
+
+    print("Group of {} members".format(count))
+    print("rescan members: {:>10.0f} changes/s".format(rescan))
+    print("on count:       {:>10.0f} changes/s".format(on_count))
+    print("speed up:       {:>10.1f}x".format(on_count / rescan))
+
+
+if __name__ == "__main__":
+    main()
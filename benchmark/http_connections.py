@@ -0,0 +1,111 @@
+"""
+benchmark.http_connections
+~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Load test that measures how many concurrent keep-alive connections the
+HTTP component can hold open and still serve.
+
+Opens the requested number of connections, keeps them all idle at the
+same time and then sends one API request over every connection.
+
+Usage: python3 benchmark/http_connections.py [threaded|asyncio] [count]
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+# pylint: disable=wrong-import-position
+import homeassistant as ha
+import homeassistant.remote as remote
+import homeassistant.components.http as http
+
+API_PASSWORD = "benchmark"
+
+SERVER_PORT = 8129
+
+REQUEST = ("GET {} HTTP/1.1\r\n"
+           "Host: 127.0.0.1\r\n"
+           "{}: {}\r\n\r\n").format(
+               remote.URL_API, remote.AUTH_HEADER, API_PASSWORD).encode()
+
+
+async def open_connections(count):
+    """ Opens count connections. Returns list of (reader, writer). """
+    connections = []
+
+    for _ in range(count):
+        try:
+            connections.append(await asyncio.wait_for(
+                asyncio.open_connection('127.0.0.1', SERVER_PORT), 5))
+
+        except (OSError, asyncio.TimeoutError):
+            break
+
+    return connections
+
+
+async def request(reader, writer):
+    """ Sends a request over an open connection.
+        Returns True if a response was received. """
+    try:
+        writer.write(REQUEST)
+        await writer.drain()
+
+        status_line = await asyncio.wait_for(reader.readline(), 30)
+
+        return b' 200 ' in status_line
+
+    except (OSError, asyncio.TimeoutError):
+        return False
+
+
+async def run(count):
+    """ Runs the load test against a running server. """
+    start = time.time()
+    connections = await open_connections(count)
+    print("Opened {} of {} connections in {:.2f}s".format(
+        len(connections), count, time.time() - start))
+
+    # Let the connections sit idle for a moment
+    await asyncio.sleep(1)
+
+    start = time.time()
+    results = await asyncio.gather(
+        *(request(reader, writer) for reader, writer in connections))
+    print("Served {} of {} idle connections in {:.2f}s".format(
+        sum(results), len(connections), time.time() - start))
+
+    for _, writer in connections:
+        writer.close()
+
+
+def main():
+    """ Starts Home Assistant with the given backend and runs the test. """
+    backend = sys.argv[1] if len(sys.argv) > 1 else http.SERVER_BACKEND_ASYNCIO
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+
+    hass = ha.HomeAssistant()
+
+    http.setup(hass,
+               {http.DOMAIN: {http.CONF_API_PASSWORD: API_PASSWORD,
+                              http.CONF_SERVER_PORT: SERVER_PORT,
+                              http.CONF_SERVER_BACKEND: backend}})
+
+    hass.start()
+
+    # Give the server thread time to start
+    time.sleep(.5)
+
+    print("Backend: {}".format(backend))
+
+    try:
+        asyncio.run(run(count))
+    finally:
+        hass.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+benchmark.state_from_dict
+~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Measures the throughput of State.as_dict and State.from_dict round trips,
+comparing the built-in datetime codec to strftime/strptime.
+
+Usage: python3 benchmark/state_from_dict.py [number_of_states]
+"""
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+# pylint: disable=wrong-import-position
+import homeassistant as ha
+import homeassistant.util as util
+
+
+def create_state_dicts(count):
+    """ Creates count state dicts spread out over a few timestamps. """
+    start = datetime(2015, 2, 1, 12, 0, 0)
+
+    return [ha.State('sensor.sensor_{}'.format(index), str(index),
+                     {'unit_of_measurement': 'C'},
+                     start + timedelta(seconds=index % 60)).as_dict()
+            for index in range(count)]
+
+
+def measure(state_dicts):
+    """ Returns number of from_dict + as_dict round trips per second. """
+    start = time.time()
+
+    for state_dict in state_dicts:
+        ha.State.from_dict(state_dict).as_dict()
+
+    return len(state_dicts) / (time.time() - start)
+
+
+def main():
+    """ Runs the benchmark. """
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+
+    state_dicts = create_state_dicts(count)
+
+    fast = measure(state_dicts)
+
+    # Swap in the strftime/strptime based codec to compare
+    fast_to_str, fast_to_datetime = \
+        util.datetime_to_str, util.str_to_datetime
+
+    util.datetime_to_str = \
+        lambda dattim: dattim.strftime(util.DATE_STR_FORMAT)
+    util.str_to_datetime = \
+        lambda dt_str: datetime.strptime(dt_str, util.DATE_STR_FORMAT)
+
+    try:
+        slow = measure(state_dicts)
+    finally:
+        util.datetime_to_str, util.str_to_datetime = \
+            fast_to_str, fast_to_datetime
+
+    print("strftime/strptime: {:>10.0f} states/s".format(slow))
+    print("built-in codec:    {:>10.0f} states/s".format(fast))
+    print("speed up:          {:>10.1f}x".format(fast / slow))
+
+
+if __name__ == "__main__":
+    main()
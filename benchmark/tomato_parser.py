@@ -0,0 +1,98 @@
+"""
+benchmark.tomato_parser
+~~~~~~~~~~~~~~~~~~~~~~~
+
+Measures how fast responses of the Tomato API are parsed, comparing the
+targeted parser of the Tomato scanner to matching every value with a
+regular expression and decoding it as JSON.
+
+The responses are modeled after a recorded response of a Tomato router,
+with the given number of connected devices.
+
+Usage: python3 benchmark/tomato_parser.py [number_of_devices]
+"""
+import os
+import sys
+import re
+import json
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+# pylint: disable=wrong-import-position
+import homeassistant.components.device_tracker.tomato as tomato
+
+PARSES = 200
+
+
+def create_response(count):
+    """ Returns a Tomato API response for count devices. """
+    macs = ['00:11:22:{:02X}:{:02X}:{:02X}'.format(
+        index >> 16, (index >> 8) & 0xFF, index & 0xFF)
+            for index in range(count)]
+
+    arplist = ",".join(
+        "['192.168.{}.{}','{}','br0']".format(index >> 8, index & 0xFF, mac)
+        for index, mac in enumerate(macs))
+
+    wldev = ",".join(
+        "['eth1','{}',-{},{},6000,6000,0]".format(mac, 40 + index % 50,
+                                                  index % 2)
+        for index, mac in enumerate(macs))
+
+    dhcpd_lease = ",".join(
+        "['device_{}','192.168.{}.{}','{}','0 days, 16:17:08']".format(
+            index, index >> 8, index & 0xFF, mac)
+        for index, mac in enumerate(macs))
+
+    return (
+        "\nnvram = {{'lan_ipaddr':'192.168.1.1','wan_proto':'dhcp'}};\n"
+        "arplist = [{}];\n"
+        "wlnoise = [-99];\n"
+        "dhcpd_static = 'AA:BB<192.168.1.2<static>'.split('>');\n"
+        "wldev = [{}];\n"
+        "dhcpd_lease = [{}];\n").format(arplist, wldev, dhcpd_lease)
+
+
+API_PATTERN = re.compile(r"(?P<param>\w*) = (?P<value>.*);")
+
+
+def parse_regex_json(text):
+    """ Parses the response the way the Tomato scanner used to. """
+    results = {}
+
+    for param, value in API_PATTERN.findall(text):
+        if param == 'wldev' or param == 'dhcpd_lease':
+            results[param] = json.loads(value.replace("'", '"'))
+
+    return results
+
+
+def measure(parse, text):
+    """ Returns number of parses per second. """
+    start = time.time()
+
+    for _ in range(PARSES):
+        parse(text)
+
+    return PARSES / (time.time() - start)
+
+
+def main():
+    """ Runs the benchmark. """
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 250
+
+    text = create_response(count)
+
+    assert parse_regex_json(text) == tomato.parse_tomato_response(text)
+
+    regex_json = measure(parse_regex_json, text)
+    targeted = measure(tomato.parse_tomato_response, text)
+
+    print("Response with {} devices, {} bytes".format(count, len(text)))
+    print("regex and json:  {:>10.1f} parses/s".format(regex_json))
+    print("targeted parser: {:>10.1f} parses/s".format(targeted))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+benchmark.wire_format
+~~~~~~~~~~~~~~~~~~~~~
+
+Compares payload size and encode/decode speed of the binary wire format
+with JSON on a realistic dump of states.
+
+Usage: python3 benchmark/wire_format.py [repeat]
+"""
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+# pylint: disable=wrong-import-position
+import homeassistant as ha
+import homeassistant.remote as remote
+import homeassistant.wire as wire
+
+
+def create_states():
+    """ Creates a list of states like a typical installation has. """
+    now = datetime(2015, 2, 1, 18, 30, 12)
+
+    states = [ha.State('sun.sun', 'below_horizon',
+                       {'next_rising': '07:04:15 02-02-2015',
+                        'next_setting': '18:00:31 02-02-2015'}, now)]
+
+    for index in range(30):
+        states.append(ha.State(
+            'light.light_{}'.format(index), 'on' if index % 2 else 'off',
+            {'friendly_name': 'Light {}'.format(index),
+             'brightness': 120 + index, 'xy_color': [0.4585, 0.4078]}, now))
+
+    for index in range(20):
+        states.append(ha.State(
+            'device_tracker.phone_{}'.format(index), 'home',
+            {'entity_picture': 'http://example.com/pictures/{}.jpg'.format(
+                index)}, now))
+
+    for index in range(10):
+        states.append(ha.State(
+            'tellstick_sensor.sensor_{}'.format(index), 21.5 + index,
+            {'friendly_name': 'Sensor {}'.format(index),
+             'unit_of_measurement': 'C'}, now))
+
+    for index in range(3):
+        states.append(ha.State(
+            'chromecast.living_room_{}'.format(index), 'Netflix',
+            {'friendly_name': 'Living Room',
+             'media_title': 'House of Cards, Chapter 14',
+             'media_artist': 'Netflix', 'media_album': 'Season 2',
+             'media_image_url': 'http://example.com/images/artwork.jpg',
+             'media_duration': 3120, 'media_position': 1200,
+             'media_state': 'playing', 'volume': 0.6}, now))
+
+    states.append(ha.State(
+        'group.all_lights', 'on',
+        {'entity_id': [state.entity_id for state in states
+                       if state.entity_id.startswith('light.')],
+         'auto': True}, now))
+
+    return states
+
+
+def timed(func, repeat):
+    """ Returns average milliseconds per call of func. """
+    start = time.time()
+
+    for _ in range(repeat):
+        func()
+
+    return (time.time() - start) / repeat * 1000
+
+
+def main():
+    """ Runs the benchmark. """
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+    states = create_states()
+
+    # The HTTP component serves states as dicts and pretty prints JSON
+    dicts = [state.as_dict() for state in states]
+
+    def json_api():
+        """ JSON as sent by the HTTP component. """
+        return json.dumps(dicts, indent=4, sort_keys=True,
+                          cls=remote.JSONEncoder).encode()
+
+    def json_compact():
+        """ JSON without whitespace. """
+        return json.dumps(dicts, separators=(',', ':')).encode()
+
+    def binary_dicts():
+        """ Binary wire format of the state dicts. """
+        return wire.pack(dicts)
+
+    def binary_states():
+        """ Binary wire format of the State objects. """
+        return wire.pack(states)
+
+    print("{} states\n".format(len(states)))
+    print("{:<22}{:>10}{:>14}{:>14}".format(
+        "format", "bytes", "encode ms", "decode ms"))
+
+    for name, encode, decode in (
+            ("JSON (as served)", json_api, json.loads),
+            ("JSON (compact)", json_compact, json.loads),
+            ("binary (dicts)", binary_dicts, wire.unpack),
+            ("binary (States)", binary_states, wire.unpack)):
+
+        payload = encode()
+
+        print("{:<22}{:>10}{:>14.3f}{:>14.3f}".format(
+            name, len(payload), timed(encode, repeat),
+            timed(lambda payload=payload, decode=decode: decode(payload),
+                  repeat)))
+
+
+if __name__ == "__main__":
+    main()
@@ -14,14 +14,20 @@ import enum
 import re
 import datetime as dt
 import functools as ft
+from collections import Counter
+from contextlib import contextmanager
 
 import homeassistant.util as util
+import homeassistant.metrics as metrics
+
+# pylint: disable=too-many-lines
 
 MATCH_ALL = '*'
 
 DOMAIN = "homeassistant"
 
 SERVICE_HOMEASSISTANT_STOP = "stop"
+SERVICE_HOMEASSISTANT_RELOAD_CONFIG = "reload_config"
 
 EVENT_HOMEASSISTANT_START = "homeassistant_start"
 EVENT_HOMEASSISTANT_STOP = "homeassistant_stop"
@@ -40,6 +46,7 @@ CONF_HOST = "host"
 CONF_HOSTS = "hosts"
 CONF_USERNAME = "username"
 CONF_PASSWORD = "password"
+CONF_METRICS = "metrics"
 
 # How often time_changed event should fire
 TIMER_INTERVAL = 10  # seconds
@@ -52,27 +59,89 @@ ENTITY_ID_PATTERN = re.compile(r"^(?P<domain>\w+)\.(?P<entity>\w+)$")
 
 _LOGGER = logging.getLogger(__name__)
 
+# Keeps track of the component scope the current thread is working in
+_SETUP_CONTEXT = threading.local()
+
 
 class HomeAssistant(object):
     """ Core class to route all communication to right components. """
+    # pylint: disable=too-many-instance-attributes
 
     def __init__(self):
-        self._pool = pool = create_worker_pool()
+        self.metrics = metrics.Metrics()
+
+        self._pool = pool = create_worker_pool(hass_metrics=self.metrics)
 
-        self.bus = EventBus(pool)
+        self.metrics.add_gauge(metrics.METRIC_POOL_QUEUE,
+                               pool.work_queue.qsize)
+
+        self.bus = EventBus(pool, self.metrics)
         self.services = ServiceRegistry(self.bus, pool)
         self.states = StateMachine(self.bus)
 
+        # List of components that have been set up
+        self.components = []
+
+        # Dict mapping component domain => ComponentScope
+        self._scopes = {}
+
+        # If the start event has been fired
+        self.started = False
+        self._start_lock = threading.Lock()
+
         self.config_dir = os.path.join(os.getcwd(), 'config')
 
     def get_config_path(self, path):
         """ Returns path to the file within the config dir. """
         return os.path.join(self.config_dir, path)
 
+    @contextmanager
+    def component_context(self, domain):
+        """ Context manager to set up a component in. Listeners, timers and
+            services that are registered from the current thread while
+            inside the context are owned by the component.
+
+            Yields the ComponentScope of the component. Entering the context
+            again later, ie. from a listener, uses the same scope. """
+        scope = self._scopes.setdefault(domain, ComponentScope(domain))
+
+        previous = getattr(_SETUP_CONTEXT, 'scope', None)
+        _SETUP_CONTEXT.scope = scope
+
+        try:
+            yield scope
+
+        finally:
+            _SETUP_CONTEXT.scope = previous
+
+    def unload_component(self, domain):
+        """ Removes the listeners, timers and services owned by a component
+            and calls the callbacks it registered with register_unload. """
+        scope = self._scopes.pop(domain, None)
+
+        if scope is not None:
+            scope.remove()
+
+        if domain in self.components:
+            self.components.remove(domain)
+
+    def register_unload(self, action):
+        """ Registers action to be called without arguments when the
+            component that is being set up is unloaded. Components use this
+            to stop the servers and threads they started. Does nothing
+            outside of a component context. """
+        scope = _current_scope()
+
+        if scope is not None:
+            scope.track_cleanup(action)
+
     def start(self):
         """ Start home assistant. """
         Timer(self)
 
+        with self._start_lock:
+            self.started = True
+
         self.bus.fire(EVENT_HOMEASSISTANT_START)
 
     def block_till_stopped(self):
@@ -114,6 +183,8 @@ class HomeAssistant(object):
         Track specific state changes.
         entity_ids, from_state and to_state can be string or list.
         Use list to match multiple.
+
+        Returns a function that removes the listener.
         """
         from_state = _process_match_param(from_state)
         to_state = _process_match_param(to_state)
@@ -134,40 +205,30 @@ class HomeAssistant(object):
                        event.data['old_state'],
                        event.data['new_state'])
 
-        self.bus.listen(EVENT_STATE_CHANGED, state_listener)
+        return self.bus.listen(EVENT_STATE_CHANGED, state_listener)
 
     def track_point_in_time(self, action, point_in_time):
         """
         Adds a listener that fires once at or after a spefic point in time.
+
+        Returns a function that removes the listener.
         """
 
         @ft.wraps(action)
         def point_in_time_listener(event):
-            """ Listens for matching time_changed events. """
-            now = event.data[ATTR_NOW]
-
-            if now >= point_in_time and \
-               not hasattr(point_in_time_listener, 'run'):
-
-                # Set variable so that we will never run twice.
-                # Because the event bus might have to wait till a thread comes
-                # available to execute this listener it might occur that the
-                # listener gets lined up twice to be executed. This will make
-                # sure the second time it does nothing.
-                point_in_time_listener.run = True
-
-                self.bus.remove_listener(EVENT_TIME_CHANGED,
-                                         point_in_time_listener)
+            """ Fires action with the time of the time_changed event. """
+            action(event.data[ATTR_NOW])
 
-                action(now)
-
-        self.bus.listen(EVENT_TIME_CHANGED, point_in_time_listener)
+        return self.bus.listen_once(
+            EVENT_TIME_CHANGED, point_in_time_listener,
+            lambda event: event.data[ATTR_NOW] >= point_in_time)
 
     # pylint: disable=too-many-arguments
     def track_time_change(self, action,
                           year=None, month=None, day=None,
                           hour=None, minute=None, second=None):
-        """ Adds a listener that will fire if time matches a pattern. """
+        """ Adds a listener that will fire if time matches a pattern.
+            Returns a function that removes the listener. """
 
         # We do not have to wrap the function with time pattern matching logic
         # if no pattern given
@@ -200,7 +261,20 @@ class HomeAssistant(object):
                 """ Fires every time event that comes in. """
                 action(event.data[ATTR_NOW])
 
-        self.bus.listen(EVENT_TIME_CHANGED, time_listener)
+        return self.bus.listen(EVENT_TIME_CHANGED, time_listener)
+
+    def track_start(self, action):
+        """ Calls action with the start event once Home Assistant starts.
+            If it has started already, ie. because a component is set up
+            again after the config has been reloaded, action is called
+            right away from the worker pool. """
+        with self._start_lock:
+            if self.started:
+                self._pool.add_job(JobPriority.EVENT_DEFAULT,
+                                   (action, Event(EVENT_HOMEASSISTANT_START)))
+
+            else:
+                self.listen_once_event(EVENT_HOMEASSISTANT_START, action)
 
     def listen_once_event(self, event_type, listener):
         """ Listen once for event of a specific type.
@@ -208,24 +282,9 @@ class HomeAssistant(object):
         To listen to all events specify the constant ``MATCH_ALL``
         as event_type.
 
-        Note: at the moment it is impossible to remove a one time listener.
+        Returns a function that removes the listener.
         """
-        @ft.wraps(listener)
-        def onetime_listener(event):
-            """ Removes listener from eventbus and then fires listener. """
-            if not hasattr(onetime_listener, 'run'):
-                # Set variable so that we will never run twice.
-                # Because the event bus might have to wait till a thread comes
-                # available to execute this listener it might occur that the
-                # listener gets lined up twice to be executed.
-                # This will make sure the second time it does nothing.
-                onetime_listener.run = True
-
-                self.bus.remove_listener(event_type, onetime_listener)
-
-                listener(event)
-
-        self.bus.listen(event_type, onetime_listener)
+        return self.bus.listen_once(event_type, listener)
 
     def stop(self):
         """ Stops Home Assistant and shuts down all threads. """
@@ -279,8 +338,14 @@ class JobPriority(util.OrderedEnum):
             return JobPriority.EVENT_DEFAULT
 
 
-def create_worker_pool(thread_count=POOL_NUM_THREAD):
-    """ Creates a worker pool to be used. """
+def _current_scope():
+    """ Returns the ComponentScope the current thread is working in. """
+    return getattr(_SETUP_CONTEXT, 'scope', None)
+
+
+def create_worker_pool(thread_count=POOL_NUM_THREAD, hass_metrics=None):
+    """ Creates a worker pool to be used.
+        Job run times are recorded in hass_metrics if given. """
 
     def job_handler(job):
         """ Called whenever a job is available to do. """
@@ -303,7 +368,22 @@ def create_worker_pool(thread_count=POOL_NUM_THREAD):
             _LOGGER.error("WorkerPool:Current job from %s: %s",
                           util.datetime_to_str(start), job)
 
-    return util.ThreadPool(thread_count, job_handler, busy_callback)
+    def job_done_callback(job, wait_time, run_time):
+        """ Records how long a job waited and ran. """
+        if not hass_metrics.enabled:
+            return
+
+        func, arg = job
+
+        hass_metrics.record_job(
+            getattr(func, '__name__', repr(func)), wait_time, run_time)
+
+        if isinstance(arg, ServiceCall):
+            hass_metrics.record_service_call(
+                arg.domain, arg.service, wait_time + run_time)
+
+    return util.ThreadPool(thread_count, job_handler, busy_callback,
+                           job_done_callback if hass_metrics else None)
 
 
 class EventOrigin(enum.Enum):
@@ -344,10 +424,14 @@ class EventBus(object):
     and events.
     """
 
-    def __init__(self, pool=None):
+    def __init__(self, pool=None, hass_metrics=None):
         self._listeners = {}
+        self._one_time = {}
+        # Dict mapping (event_type, listener) => ComponentScope that owns it
+        self._owners = {}
         self._lock = threading.Lock()
         self._pool = pool or create_worker_pool()
+        self._metrics = hass_metrics
 
     @property
     def listeners(self):
@@ -371,8 +455,14 @@ class EventBus(object):
 
             _LOGGER.info("Bus:Handling %s", event)
 
-            if not listeners:
-                return
+            # One time listeners are removed before they are handed to the
+            # pool so they can never be lined up twice.
+            if listeners and self._one_time:
+                listeners = [func for func in listeners
+                             if self._claim_listener(func, event)]
+
+            if self._metrics is not None and self._metrics.enabled:
+                self._metrics.record_event(event_type, len(listeners))
 
             for func in listeners:
                 self._pool.add_job(JobPriority.from_event_type(event_type),
@@ -383,27 +473,95 @@ class EventBus(object):
 
         To listen to all events specify the constant ``MATCH_ALL``
         as event_type.
+
+        Returns a function that removes the listener.
         """
         with self._lock:
-            if event_type in self._listeners:
-                self._listeners[event_type].append(listener)
-            else:
-                self._listeners[event_type] = [listener]
+            self._add_listener(event_type, listener)
+
+        return ft.partial(self.remove_listener, event_type, listener)
+
+    def listen_once(self, event_type, listener, condition=None):
+        """ Listen once for the first event of a specific type.
+
+        If condition is given, listen for the first event for which
+        condition(event) returns True. The condition is evaluated while
+        the event is fired and should be fast.
+
+        Returns a function that removes the listener.
+        """
+        # Wrap the listener so that every registration is unique
+        @ft.wraps(listener)
+        def onetime_listener(event):
+            """ Fires listener. """
+            listener(event)
+
+        with self._lock:
+            self._one_time[onetime_listener] = (event_type, condition)
+            self._add_listener(event_type, onetime_listener)
+
+        return ft.partial(self.remove_listener, event_type, onetime_listener)
 
     def remove_listener(self, event_type, listener):
         """ Removes a listener of a specific event_type. """
         with self._lock:
-            try:
-                self._listeners[event_type].remove(listener)
+            self._remove_listener(event_type, listener)
 
-                # delete event_type list if empty
-                if not self._listeners[event_type]:
-                    self._listeners.pop(event_type)
+    def _add_listener(self, event_type, listener):
+        """ Adds a listener. Lock should be held. """
+        if event_type in self._listeners:
+            self._listeners[event_type].append(listener)
+        else:
+            self._listeners[event_type] = [listener]
+
+        scope = _current_scope()
 
-            except (KeyError, ValueError):
-                # KeyError is key event_type listener did not exist
-                # ValueError if listener did not exist within event_type
-                pass
+        if scope is not None:
+            scope.track_listener(self, event_type, listener)
+            self._owners[(event_type, listener)] = scope
+
+    def _remove_listener(self, event_type, listener):
+        """ Removes a listener. Lock should be held. """
+        try:
+            listeners = self._listeners[event_type]
+            listeners.remove(listener)
+
+        except (KeyError, ValueError):
+            # KeyError is key event_type listener did not exist
+            # ValueError if listener did not exist within event_type
+            return
+
+        # delete event_type list if empty
+        if not listeners:
+            self._listeners.pop(event_type)
+
+        self._one_time.pop(listener, None)
+
+        # Owner does not need to keep track of a removed listener
+        scope = self._owners.get((event_type, listener))
+
+        if scope is not None:
+            scope.untrack_listener(self, event_type, listener)
+
+            if listener not in listeners:
+                del self._owners[(event_type, listener)]
+
+    def _claim_listener(self, listener, event):
+        """ Returns if listener should get event. Removes one time listeners
+            that match the event. Lock should be held. """
+        one_time = self._one_time.get(listener)
+
+        if one_time is None:
+            return True
+
+        event_type, condition = one_time
+
+        if condition is not None and not condition(event):
+            return False
+
+        self._remove_listener(event_type, listener)
+
+        return True
 
 
 class State(object):
@@ -427,8 +585,7 @@ class State(object):
         # This behavior occurs because to_dict uses datetime_to_str
         # which strips microseconds
         if last_changed.microsecond:
-            self.last_changed = last_changed - dt.timedelta(
-                microseconds=last_changed.microsecond)
+            self.last_changed = last_changed.replace(microsecond=0)
         else:
             self.last_changed = last_changed
 
@@ -437,14 +594,27 @@ class State(object):
         return State(self.entity_id, self.state,
                      dict(self.attributes), self.last_changed)
 
-    def as_dict(self):
+    def as_dict(self, fields=None):
         """ Converts State to a dict to be used within JSON.
+        Fields is an optional list of keys to limit the dict to.
         Ensures: state == State.from_dict(state.as_dict()) """
 
-        return {'entity_id': self.entity_id,
-                'state': self.state,
-                'attributes': self.attributes,
-                'last_changed': util.datetime_to_str(self.last_changed)}
+        if fields is None:
+            return {'entity_id': self.entity_id,
+                    'state': self.state,
+                    'attributes': self.attributes,
+                    'last_changed': util.datetime_to_str(self.last_changed)}
+
+        json_dict = {}
+
+        for field in fields:
+            if field == 'last_changed':
+                json_dict[field] = util.datetime_to_str(self.last_changed)
+
+            elif field in State.__slots__:
+                json_dict[field] = getattr(self, field)
+
+        return json_dict
 
     @classmethod
     def from_dict(cls, json_dict):
@@ -487,6 +657,9 @@ class StateMachine(object):
         self._bus = bus
         self._lock = threading.Lock()
 
+        # Maps a domain to the set of entity ids within that domain
+        self._domain_index = {}
+
     @property
     def entity_ids(self):
         """ List of entity ids that are being tracked. """
@@ -496,6 +669,35 @@ class StateMachine(object):
         """ Returns a list of all states. """
         return [state.copy() for state in self._states.values()]
 
+    def as_dicts(self, domains=None, entity_ids=None, fields=None):
+        """ Returns a list of dicts representing the states, optionally
+        limited to the given domains and/or entity ids. Fields is an optional
+        list of keys to include in each dict.
+
+        This does not copy the states, making it cheaper than all(). """
+
+        with self._lock:
+            if domains is None and entity_ids is None:
+                states = list(self._states.values())
+
+            else:
+                candidates = set()
+
+                if domains is not None:
+                    for domain in domains:
+                        candidates.update(self._domain_index.get(domain, ()))
+
+                    if entity_ids is not None:
+                        candidates.intersection_update(entity_ids)
+
+                else:
+                    candidates.update(entity_ids)
+
+                states = [self._states[entity_id] for entity_id
+                          in sorted(candidates) if entity_id in self._states]
+
+        return [state.as_dict(fields) for state in states]
+
     def get(self, entity_id):
         """ Returns the state of the specified entity. """
         state = self._states.get(entity_id)
@@ -513,32 +715,82 @@ class StateMachine(object):
 
         Returns boolean to indicate if a entity was removed. """
         with self._lock:
-            return self._states.pop(entity_id, None) is not None
+            if self._states.pop(entity_id, None) is None:
+                return False
+
+            self._unindex(entity_id)
+
+            return True
 
     def set(self, entity_id, new_state, attributes=None):
         """ Set the state of an entity, add entity if it does not exist.
 
         Attributes is an optional dict to specify attributes of this state. """
 
-        attributes = attributes or {}
+        with self._lock:
+            self._set(entity_id, new_state, attributes)
+
+    def set_multiple(self, updates):
+        """ Set the state of multiple entities in one transaction.
+
+        Updates is an iterable of (entity_id, new_state, attributes) tuples.
+        Returns a list with a tuple (state, is_new) for each update. """
 
         with self._lock:
-            old_state = self._states.get(entity_id)
+            return [(state.copy(), is_new) for state, is_new
+                    in (self._set(entity_id, new_state, attributes)
+                        for entity_id, new_state, attributes in updates)]
+
+    def _set(self, entity_id, new_state, attributes):
+        """ Sets the state of an entity. Lock has to be held by caller.
+
+        Returns a tuple (state, is_new). """
+
+        attributes = attributes or {}
+
+        old_state = self._states.get(entity_id)
+
+        # If state did not exist or is different, set it
+        if not old_state or \
+           old_state.state != new_state or \
+           old_state.attributes != attributes:
+
+            state = self._states[entity_id] = \
+                State(entity_id, new_state, attributes)
+
+            event_data = {'entity_id': entity_id, 'new_state': state}
 
-            # If state did not exist or is different, set it
-            if not old_state or \
-               old_state.state != new_state or \
-               old_state.attributes != attributes:
+            if old_state:
+                event_data['old_state'] = old_state
+            else:
+                self._index(entity_id)
+
+            self._bus.fire(EVENT_STATE_CHANGED, event_data)
+
+            return state, old_state is None
 
-                state = self._states[entity_id] = \
-                    State(entity_id, new_state, attributes)
+        return old_state, False
 
-                event_data = {'entity_id': entity_id, 'new_state': state}
+    def _index(self, entity_id):
+        """ Adds entity_id to the domain index. """
+        domain = util.split_entity_id(entity_id)[0]
+
+        if domain in self._domain_index:
+            self._domain_index[domain].add(entity_id)
+        else:
+            self._domain_index[domain] = {entity_id}
 
-                if old_state:
-                    event_data['old_state'] = old_state
+    def _unindex(self, entity_id):
+        """ Removes entity_id from the domain index. """
+        domain = util.split_entity_id(entity_id)[0]
 
-                self._bus.fire(EVENT_STATE_CHANGED, event_data)
+        entity_ids = self._domain_index.get(domain)
+
+        if entity_ids is not None:
+            entity_ids.discard(entity_id)
+
+            if not entity_ids:
+                self._domain_index.pop(domain)
 
 
 # pylint: disable=too-few-public-methods
@@ -565,6 +817,8 @@ class ServiceRegistry(object):
 
     def __init__(self, bus, pool=None):
         self._services = {}
+        # Dict mapping (domain, service) => ComponentScope that owns it
+        self._owners = {}
         self._lock = threading.Lock()
         self._pool = pool or create_worker_pool()
         bus.listen(EVENT_CALL_SERVICE, self._event_to_service_call)
@@ -582,12 +836,40 @@ class ServiceRegistry(object):
 
     def register(self, domain, service, service_func):
         """ Register a service. """
+        scope = _current_scope()
+
         with self._lock:
             if domain in self._services:
                 self._services[domain][service] = service_func
             else:
                 self._services[domain] = {service: service_func}
 
+            self._set_owner(domain, service, scope)
+
+    def unregister(self, domain, service):
+        """ Removes a service. """
+        with self._lock:
+            services = self._services.get(domain, {})
+
+            services.pop(service, None)
+
+            if not services:
+                self._services.pop(domain, None)
+
+            self._set_owner(domain, service, None)
+
+    def _set_owner(self, domain, service, scope):
+        """ Makes scope the owner of service, the previous owner stops
+            owning it. Lock should be held. """
+        old_scope = self._owners.pop((domain, service), None)
+
+        if old_scope is not None:
+            old_scope.untrack_service(self, domain, service)
+
+        if scope is not None:
+            scope.track_service(self, domain, service)
+            self._owners[(domain, service)] = scope
+
     def _event_to_service_call(self, event):
         """ Calls a service from an event. """
         service_data = dict(event.data)
@@ -603,6 +885,93 @@ class ServiceRegistry(object):
                                     service_call))
 
 
+class ComponentScope(object):
+    """ Keeps track of the listeners and services that a component
+        registered and the cleanup callbacks it added so they can be
+        removed in bulk. """
+
+    def __init__(self, domain):
+        self.domain = domain
+        # Counter of (bus, event_type, listener), a listener can be added
+        # more than once
+        self._listeners = Counter()
+        # Set of (registry, domain, service)
+        self._services = set()
+        self._cleanups = []
+        self._lock = threading.Lock()
+
+    @property
+    def listeners(self):
+        """ List of tuples (event_type, listener) owned by the component. """
+        with self._lock:
+            return [(event_type, listener) for _, event_type, listener
+                    in self._listeners.elements()]
+
+    @property
+    def services(self):
+        """ List of tuples (domain, service) owned by the component. """
+        with self._lock:
+            return [(domain, service) for _, domain, service
+                    in self._services]
+
+    def track_listener(self, bus, event_type, listener):
+        """ Records that listener has been added to bus. """
+        with self._lock:
+            self._listeners[(bus, event_type, listener)] += 1
+
+    def untrack_listener(self, bus, event_type, listener):
+        """ Forgets about a listener that has been removed from bus. """
+        key = (bus, event_type, listener)
+
+        with self._lock:
+            if self._listeners[key] > 1:
+                self._listeners[key] -= 1
+
+            else:
+                self._listeners.pop(key, None)
+
+    def track_service(self, registry, domain, service):
+        """ Records that service has been registered with registry. """
+        with self._lock:
+            self._services.add((registry, domain, service))
+
+    def untrack_service(self, registry, domain, service):
+        """ Forgets about a service that has been removed from registry. """
+        with self._lock:
+            self._services.discard((registry, domain, service))
+
+    def track_cleanup(self, action):
+        """ Records action to be called when the component is removed. """
+        with self._lock:
+            self._cleanups.append(action)
+
+    def remove(self):
+        """ Removes all listeners and services of the component, then calls
+            the cleanup callbacks in reverse order. """
+        with self._lock:
+            listeners = list(self._listeners.elements())
+            services = list(self._services)
+            cleanups = self._cleanups
+
+            self._listeners = Counter()
+            self._services = set()
+            self._cleanups = []
+
+        for bus, event_type, listener in listeners:
+            bus.remove_listener(event_type, listener)
+
+        for registry, domain, service in services:
+            registry.unregister(domain, service)
+
+        for action in reversed(cleanups):
+            try:
+                action()
+
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("Error cleaning up component %s",
+                                  self.domain)
+
+
 class Timer(threading.Thread):
     """ Timer will sent out an event every TIMER_INTERVAL seconds. """
 
@@ -6,7 +6,7 @@ import argparse
 import importlib
 
 try:
-    from homeassistant import bootstrap
+    from homeassistant import bootstrap, profiler as profiling
 
 except ImportError:
     # This is to add support to load Home Assistant using
@@ -15,7 +15,22 @@ except ImportError:
     # Insert the parent directory of this file into the module search path
     sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
-    from homeassistant import bootstrap
+    from homeassistant import bootstrap, profiler as profiling
+
+
+def report_startup(hass, profiler):
+    """ Prints the startup report once the start event has been handled
+        and writes the Chrome trace to the config dir. """
+    trace_path = hass.get_config_path(profiling.TRACE_FILE)
+
+    # Wait till the start event has been processed
+    profiler.finish_start(hass)
+
+    print(profiler.report())
+
+    profiler.write_chrome_trace(trace_path)
+
+    print("Startup trace written to {}".format(trace_path))
 
 
 def main():
@@ -27,6 +42,10 @@ def main():
         metavar='path_to_config_dir',
         default="config",
         help="Directory that contains the Home Assistant configuration")
+    parser.add_argument(
+        '--profile-startup',
+        action='store_true',
+        help="Report where time is spent during startup")
 
     args = parser.parse_args()
 
@@ -68,8 +87,14 @@ def main():
                    'to write a default one to {}').format(config_path))
             sys.exit()
 
-    hass = bootstrap.from_config_file(config_path)
+    profiler = profiling.StartupProfiler() if args.profile_startup else None
+
+    hass = bootstrap.from_config_file(config_path, profiler=profiler)
     hass.start()
+
+    if profiler is not None:
+        report_startup(hass, profiler)
+
     hass.block_till_stopped()
 
 if __name__ == "__main__":
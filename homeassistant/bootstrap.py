@@ -11,22 +11,27 @@ start by calling homeassistant.start_home_assistant(bus)
 
 import os
 import configparser
+import time
 import logging
+import threading
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait
 from itertools import chain
 
 import homeassistant
 import homeassistant.loader as loader
-import homeassistant.components as core_components
-import homeassistant.components.group as group
+import homeassistant.profiler as profiling
 
+# Maximum number of components that are set up at the same time
+SETUP_THREAD_COUNT = 8
 
-# pylint: disable=too-many-branches, too-many-statements
-def from_config_dict(config, hass=None):
+
+def from_config_dict(config, hass=None, profiler=None):
     """
     Tries to configure Home Assistant from a config dict.
 
     Dynamically loads required components and its dependencies.
+    If a StartupProfiler is given, the time each step takes is recorded.
     """
     if hass is None:
         hass = homeassistant.HomeAssistant()
@@ -37,123 +42,301 @@ def from_config_dict(config, hass=None):
     # Convert it to defaultdict so components can always have config dict
     config = defaultdict(dict, config)
 
-    # List of loaded components
-    components = {}
+    if config[homeassistant.DOMAIN].get(homeassistant.CONF_METRICS) == "1":
+        hass.metrics.enabled = True
+
+    if profiler is not None:
+        profiler.track_start(hass)
+
+    with profiling.measure(profiler, profiling.CATEGORY_LOADER, "prepare"):
+        loader.prepare(hass)
+
+    # Components are only imported once they are needed
+    with profiling.measure(profiler, profiling.CATEGORY_IMPORT,
+                           homeassistant.DOMAIN):
+        import homeassistant.components as core_components
 
-    # List of components to validate
-    to_validate = []
+    # Setup the core
+    with profiling.measure(profiler, profiling.CATEGORY_SETUP,
+                           homeassistant.DOMAIN):
+        core_setup = core_components.setup(hass, config)
 
-    # List of validated components
-    validated = []
+    if core_setup:
+        logger.info("Home Assistant core initialized")
+
+        _setup_components(
+            hass, config,
+            [key for key in config.keys() if key != homeassistant.DOMAIN],
+            profiler)
+
+    else:
+        logger.error(("Home Assistant core failed to initialize. "
+                      "Further initialization aborted."))
+
+    return hass
+
+
+# pylint: disable=too-many-locals
+def _setup_components(hass, config, domains, profiler=None):
+    """
+    Loads the given domains and their dependencies and sets up the ones
+    that have not been set up yet.
+    """
+    logger = logging.getLogger(__name__)
+
+    # Components that have already been set up count as resolved
+    resolved = set(hass.components)
+
+    # List of loaded components
+    components = {}
 
     # List of components we are going to load
-    to_load = [key for key in config.keys() if key != homeassistant.DOMAIN]
+    to_load = [domain for domain in domains if domain not in resolved]
 
-    loader.prepare(hass)
+    # Set of components that have been queued for loading
+    queued = set(to_load) | resolved
+
+    with profiling.measure(profiler, profiling.CATEGORY_IMPORT, 'group'):
+        group = loader.get_component('group')
 
     # Load required components
     while to_load:
         domain = to_load.pop()
 
-        component = loader.get_component(domain)
+        with profiling.measure(profiler, profiling.CATEGORY_IMPORT, domain):
+            component = loader.get_component(domain)
 
         # if None it does not exist, error already thrown by get_component
         if component is not None:
             components[domain] = component
 
-            # Special treatment for GROUP, we want to load it as late as
-            # possible. We do this by loading it if all other to be loaded
-            # modules depend on it.
-            if component.DOMAIN == group.DOMAIN:
-                pass
+            # Make sure to load all dependencies that are not being loaded
+            for dependency in component.DEPENDENCIES:
+                if dependency not in queued:
+                    queued.add(dependency)
+                    to_load.append(dependency)
+
+    dependencies = {domain: component.DEPENDENCIES
+                    for domain, component in components.items()}
+
+    if group.DOMAIN in resolved:
+        levels, unresolved = _dependency_levels(dependencies, resolved)
+
+    # Special treatment for GROUP, we want to load it as late as possible.
+    # We do this by setting it up after all components that do not need it
+    # and before the components that depend on it, directly or indirectly.
+    else:
+        components[group.DOMAIN] = group
+        dependencies[group.DOMAIN] = group.DEPENDENCIES
+
+        after_group = _dependents(dependencies, group.DOMAIN)
+
+        levels, unresolved = _dependency_levels(
+            {domain: deps for domain, deps in dependencies.items()
+             if domain != group.DOMAIN and domain not in after_group},
+            resolved)
+
+        resolved.update(chain.from_iterable(levels))
+        resolved.add(group.DOMAIN)
+
+        levels.append([group.DOMAIN])
+
+        group_levels, group_unresolved = _dependency_levels(
+            {domain: dependencies[domain] for domain in after_group},
+            resolved)
+
+        levels.extend(group_levels)
+        unresolved.update(group_unresolved)
 
-            # Components with no dependencies are valid
-            elif not component.DEPENDENCIES:
-                validated.append(domain)
+    resolved.update(chain.from_iterable(levels))
 
-            # If dependencies we'll validate it later
-            else:
-                to_validate.append(domain)
+    # Report cycles and missing deps as error and skip loading these domains
+    for domain in sorted(unresolved):
+        logger.error(
+            "Could not resolve dependencies for %s: %s", domain,
+            " -> ".join(_dependency_chain(dependencies, domain, resolved)))
 
-                # Make sure to load all dependencies that are not being loaded
-                for dependency in component.DEPENDENCIES:
-                    if dependency not in chain(components.keys(), to_load):
-                        to_load.append(dependency)
+    with ThreadPoolExecutor(SETUP_THREAD_COUNT) as executor:
+        for level in levels:
+            wait([executor.submit(_setup_component, hass, config,
+                                  domain, components[domain], profiler)
+                  for domain in level])
 
-    # Validate dependencies
-    group_added = False
 
-    while to_validate:
-        newly_validated = []
+def reload_config(hass, old_config, new_config):
+    """
+    Sets up the components again whose config section changed.
+
+    Components that depend on a changed component are set up again too.
+    Components whose section has been removed are only unloaded.
+    Components that set RELOADABLE to False are not unloaded, changes to
+    their section or to the section of a component they depend on require
+    a restart.
+    """
+    logger = logging.getLogger(__name__)
+
+    changed = {domain for domain in set(old_config) | set(new_config)
+               if old_config.get(domain) != new_config.get(domain)}
+
+    if homeassistant.DOMAIN in changed:
+        changed.remove(homeassistant.DOMAIN)
 
-        for domain in to_validate:
-            if all(domain in validated for domain
-                   in components[domain].DEPENDENCIES):
+        logger.warning("Changes to the %s section require a restart",
+                       homeassistant.DOMAIN)
 
-                newly_validated.append(domain)
+    components = {domain: loader.get_component(domain)
+                  for domain in hass.components}
 
-        # We validated new domains this iteration, add them to validated
-        if newly_validated:
+    dependencies = {domain: component.DEPENDENCIES
+                    for domain, component in components.items()}
 
-            # Add newly validated domains to validated
-            validated.extend(newly_validated)
+    to_unload = set()
 
-            # remove domains from to_validate
-            for domain in newly_validated:
-                to_validate.remove(domain)
+    for domain in changed.intersection(hass.components):
+        affected = _dependents(dependencies, domain)
+        affected.add(domain)
 
-            newly_validated.clear()
+        # Unloading would leave servers or threads behind that the
+        # component cannot stop
+        not_reloadable = sorted(
+            dep for dep in affected
+            if not getattr(components[dep], 'RELOADABLE', True))
 
-        # Nothing validated this iteration. Add group dependency and try again.
-        elif not group_added:
-            group_added = True
-            validated.append(group.DOMAIN)
+        if not_reloadable:
+            logger.warning(
+                "Changes to the %s section require a restart because %s "
+                "cannot be unloaded", domain, ", ".join(not_reloadable))
 
-        # Group has already been added and we still can't validate all.
-        # Report missing deps as error and skip loading of these domains
         else:
-            for domain in to_validate:
-                missing_deps = [dep for dep in components[domain].DEPENDENCIES
-                                if dep not in validated]
+            to_unload.update(affected)
 
-                logger.error(
-                    "Could not validate all dependencies for %s: %s",
-                    domain, ", ".join(missing_deps))
+    for domain in to_unload:
+        logger.info("Unloading component %s", domain)
 
-            break
+        hass.unload_component(domain)
 
-    # Make sure we load groups if not in list yet.
-    if not group_added:
-        validated.append(group.DOMAIN)
+    config = defaultdict(dict, new_config)
 
-        if group.DOMAIN not in components:
-            components[group.DOMAIN] = \
-                loader.get_component(group.DOMAIN)
+    # Set up changed components and the ones that were unloaded because
+    # they depend on a changed component, if still needed.
+    _setup_components(
+        hass, config,
+        [domain for domain in chain(new_config.keys(), to_unload)
+         if domain != homeassistant.DOMAIN and
+         (domain in new_config or domain not in changed)])
 
-    # Setup the components
-    if core_components.setup(hass, config):
-        logger.info("Home Assistant core initialized")
 
-        for domain in validated:
-            component = components[domain]
+def _dependents(dependencies, domain):
+    """ Returns the set of domains that depend on domain, directly
+        or through other domains. """
+    dependents = defaultdict(list)
 
-            try:
-                if component.setup(hass, config):
-                    logger.info("component %s initialized", domain)
-                else:
-                    logger.error("component %s failed to initialize", domain)
+    for dependent, deps in dependencies.items():
+        for dependency in deps:
+            dependents[dependency].append(dependent)
 
-            except Exception:  # pylint: disable=broad-except
-                logger.exception("Error during setup of component %s", domain)
+    found = set()
+    to_check = [domain]
 
-    else:
-        logger.error(("Home Assistant core failed to initialize. "
-                      "Further initialization aborted."))
+    while to_check:
+        for dependent in dependents[to_check.pop()]:
+            if dependent not in found:
+                found.add(dependent)
+                to_check.append(dependent)
 
-    return hass
+    return found
 
 
-def from_config_file(config_path, hass=None, enable_logging=True):
+def _dependency_levels(dependencies, resolved=()):
+    """
+    Sorts domains topologically using Kahn's algorithm.
+
+    dependencies maps each domain to the domains it depends on. Domains in
+    resolved are considered to be set up already.
+
+    Returns a tuple (levels, unresolved). Domains in a level only depend
+    on domains in earlier levels. Unresolved is the set of domains that
+    are part of a cycle or depend on a domain that is not available.
+    """
+    pending = {}
+    dependents = defaultdict(list)
+
+    for domain, deps in dependencies.items():
+        deps = set(deps).difference(resolved)
+
+        pending[domain] = len(deps)
+
+        for dependency in deps:
+            dependents[dependency].append(domain)
+
+    levels = []
+    level = sorted(domain for domain, count in pending.items() if not count)
+
+    while level:
+        levels.append(level)
+
+        next_level = []
+
+        for domain in level:
+            for dependent in dependents[domain]:
+                pending[dependent] -= 1
+
+                if not pending[dependent]:
+                    next_level.append(dependent)
+
+        level = sorted(next_level)
+
+    return levels, {domain for domain, count in pending.items() if count}
+
+
+def _dependency_chain(dependencies, domain, resolved):
+    """ Returns the list of domains from domain to the first cycle or
+        unavailable dependency that prevents domain from being set up. """
+    path = [domain]
+
+    while True:
+        deps = [dep for dep in dependencies.get(path[-1], [])
+                if dep not in resolved]
+
+        # Not available or invalid, loader has already logged the reason
+        if not deps:
+            path[-1] += " (not available)"
+            return path
+
+        # Prefer following a dependency that closes the cycle
+        dependency = next((dep for dep in deps if dep in path), deps[0])
+
+        path.append(dependency)
+
+        if dependency in path[:-1]:
+            return path
+
+
+def _setup_component(hass, config, domain, component, profiler=None):
+    """ Sets up a component and logs how long it took. """
+    logger = logging.getLogger(__name__)
+
+    start = time.time()
+
+    try:
+        with profiling.measure(profiler, profiling.CATEGORY_SETUP, domain), \
+                hass.component_context(domain):
+            success = component.setup(hass, config)
+
+        if success:
+            hass.components.append(domain)
+
+            logger.info("component %s initialized in %.2f seconds",
+                        domain, time.time() - start)
+        else:
+            logger.error("component %s failed to initialize", domain)
+
+    except Exception:  # pylint: disable=broad-except
+        logger.exception("Error during setup of component %s", domain)
+
+
+def from_config_file(config_path, hass=None, enable_logging=True,
+                     profiler=None):
     """
     Reads the configuration file and tries to start all the required
     functionality. Will add functionality to 'hass' parameter if given,
@@ -192,6 +375,18 @@ def from_config_file(config_path, hass=None, enable_logging=True):
                 "Unable to setup error log %s (access denied)", err_log_path)
 
     # Read config
+    with profiling.measure(profiler, profiling.CATEGORY_CONFIG, config_path):
+        config_dict = read_config(config_path)
+
+    hass = from_config_dict(config_dict, hass, profiler)
+
+    _register_reload_service(hass, config_path, config_dict)
+
+    return hass
+
+
+def read_config(config_path):
+    """ Reads the configuration file into a dict with a dict per section. """
     config = configparser.ConfigParser()
     config.read(config_path)
 
@@ -203,4 +398,24 @@ def from_config_file(config_path, hass=None, enable_logging=True):
         for key, val in config.items(section):
             config_dict[section][key] = val
 
-    return from_config_dict(config_dict, hass)
+    return config_dict
+
+
+def _register_reload_service(hass, config_path, config_dict):
+    """ Registers the service to reload the configuration file. """
+    lock = threading.Lock()
+    current = {'config': config_dict}
+
+    # pylint: disable=unused-argument
+    def reload_config_service(service):
+        """ Sets up the components again whose config section changed. """
+        with lock:
+            new_config = read_config(config_path)
+
+            reload_config(hass, current['config'], new_config)
+
+            current['config'] = new_config
+
+    hass.services.register(homeassistant.DOMAIN,
+                           homeassistant.SERVICE_HOMEASSISTANT_RELOAD_CONFIG,
+                           reload_config_service)
@@ -101,24 +101,20 @@ def extract_entity_ids(hass, service):
     Helper method to extract a list of entity ids from a service call.
     Will convert group entity ids to the entity ids it represents.
     """
-    entity_ids = []
+    if not service.data or ATTR_ENTITY_ID not in service.data:
+        return []
 
-    if service.data and ATTR_ENTITY_ID in service.data:
-        group = get_component('group')
-
-        # Entity ID attr can be a list or a string
-        service_ent_id = service.data[ATTR_ENTITY_ID]
-        if isinstance(service_ent_id, list):
-            ent_ids = service_ent_id
-        else:
-            ent_ids = [service_ent_id]
+    group = get_component('group')
 
-        entity_ids.extend(
-            ent_id for ent_id
-            in group.expand_entity_ids(hass, ent_ids)
-            if ent_id not in entity_ids)
+    # Entity ID attr can be a list or a string
+    service_ent_id = service.data[ATTR_ENTITY_ID]
+    if isinstance(service_ent_id, list):
+        ent_ids = service_ent_id
+    else:
+        ent_ids = [service_ent_id]
 
-    return entity_ids
+    # Expanding returns every entity id once
+    return group.expand_entity_ids(hass, ent_ids)
 
 
 class ToggleDevice(object):
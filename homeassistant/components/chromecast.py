@@ -13,6 +13,9 @@ import homeassistant.components as components
 DOMAIN = 'chromecast'
 DEPENDENCIES = []
 
+# The connections pychromecast opens to the Chromecasts cannot be closed
+RELOADABLE = False
+
 SERVICE_YOUTUBE_VIDEO = 'play_youtube_video'
 
 ENTITY_ID_FORMAT = DOMAIN + '.{}'
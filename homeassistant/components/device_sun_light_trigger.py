@@ -61,6 +61,9 @@ def setup(hass, config):
         else:
             return None
 
+    # Functions to cancel the scheduled turn on of each light
+    scheduled = []
+
     # pylint: disable=unused-argument
     def schedule_light_on_sun_rise(entity, old_state, new_state):
         """The moment sun sets we want to have all the lights on.
@@ -82,13 +85,18 @@ def setup(hass, config):
             only the last light will be turned on.. """
             return lambda now: turn_light_on_before_sunset(light_id)
 
+        # Cancel what is left of the previous schedule
+        while scheduled:
+            scheduled.pop()()
+
         start_point = calc_time_for_light_when_sunset()
 
         if start_point:
-            for index, light_id in enumerate(light_ids):
-                hass.track_point_in_time(turn_on(light_id),
-                                         (start_point +
-                                          index * LIGHT_TRANSITION_TIME))
+            with hass.component_context(DOMAIN):
+                for index, light_id in enumerate(light_ids):
+                    scheduled.append(hass.track_point_in_time(
+                        turn_on(light_id),
+                        start_point + index * LIGHT_TRANSITION_TIME))
 
     # Track every time sun rises so we can schedule a time-based
     # pre-sun set event
@@ -8,9 +8,12 @@ import logging
 import threading
 import os
 import csv
+import time
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 
 import homeassistant as ha
+import homeassistant.metrics as metrics
 from homeassistant.loader import get_component
 import homeassistant.util as util
 import homeassistant.components as components
@@ -35,6 +38,16 @@ TIME_SPAN_FOR_ERROR_IN_SCANNING = timedelta(minutes=3)
 # Filename to save known devices to
 KNOWN_DEVICES_FILE = "known_devices.csv"
 
+# Columns of the known devices file
+KNOWN_DEVICES_COLUMNS = ("device", "name", "track", "picture")
+
+# Seconds to wait for more new devices before writing them to the known
+# devices file
+KNOWN_DEVICES_WRITE_DELAY = 10
+
+# How long device scanners remember the name of a device
+DEVICE_NAME_TTL = timedelta(hours=1)
+
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -47,52 +60,113 @@ def is_on(hass, entity_id=None):
 
 
 def setup(hass, config):
-    """ Sets up the device tracker. """
+    """ Sets up the device tracker.
+
+    Type can be a comma separated list of platforms to combine the devices
+    they find. Config values prefixed with the platform and an underscore,
+    ie netgear_host, are only used for that platform and take precedence
+    over values without prefix. """
 
     if not util.validate_config(config, {DOMAIN: [ha.CONF_TYPE]}, _LOGGER):
         return False
 
-    tracker_type = config[DOMAIN][ha.CONF_TYPE]
+    device_scanners = {}
 
-    tracker_implementation = get_component(
-        'device_tracker.{}'.format(tracker_type))
+    for tracker_type in config[DOMAIN][ha.CONF_TYPE].split(","):
+        tracker_type = tracker_type.strip()
 
-    if tracker_implementation is None:
-        _LOGGER.error("Unknown device_tracker type specified.")
+        tracker_implementation = get_component(
+            'device_tracker.{}'.format(tracker_type))
 
-        return False
+        if tracker_implementation is None:
+            _LOGGER.error("Unknown device_tracker type %s specified.",
+                          tracker_type)
+
+            continue
 
-    device_scanner = tracker_implementation.get_scanner(hass, config)
+        device_scanner = tracker_implementation.get_scanner(
+            hass, {DOMAIN: _platform_config(config[DOMAIN], tracker_type)})
 
-    if device_scanner is None:
-        _LOGGER.error("Failed to initialize device scanner for %s",
-                      tracker_type)
+        if device_scanner is None:
+            _LOGGER.error("Failed to initialize device scanner for %s",
+                          tracker_type)
 
+            continue
+
+        device_scanners[tracker_type] = device_scanner
+
+    if not device_scanners:
         return False
 
-    DeviceTracker(hass, device_scanner)
+    DeviceTracker(hass, device_scanners)
 
     return True
 
 
+def _platform_config(config, platform):
+    """ Returns the config for platform: config values prefixed with
+        platform override the values without prefix. """
+    prefix = platform + "_"
+
+    platform_config = dict(config)
+
+    platform_config.update(
+        (key[len(prefix):], value) for key, value in config.items()
+        if key.startswith(prefix))
+
+    return platform_config
+
+
 # pylint: disable=too-many-instance-attributes
 class DeviceTracker(object):
-    """ Class that tracks which devices are home and which are not. """
+    """ Class that tracks which devices are home and which are not.
+
+    Device_scanners is a dict mapping a name to a device scanner. All
+    scanners are scanned concurrently and a device is home if any of them
+    finds it. """
 
-    def __init__(self, hass, device_scanner):
+    def __init__(self, hass, device_scanners):
         self.states = hass.states
 
-        self.device_scanner = device_scanner
+        self.metrics = hass.metrics
+
+        self.device_scanners = device_scanners
+
+        # Scans multiple scanners concurrently, reused between scans
+        self._executor = ThreadPoolExecutor(len(device_scanners)) \
+            if len(device_scanners) > 1 else None
+
+        # Dict mapping MAC of tracked device => dict mapping scanner name
+        # => last seen
+        self.last_seen = {}
 
         self.error_scanning = TIME_SPAN_FOR_ERROR_IN_SCANNING
 
         self.lock = threading.Lock()
 
+        # Held while a scan is running
+        self._scan_lock = threading.Lock()
+
         self.path_known_devices_file = hass.get_config_path(KNOWN_DEVICES_FILE)
 
+        self.known_devices_store = KnownDevicesStore(
+            self.path_known_devices_file)
+
+        hass.listen_once_event(
+            ha.EVENT_HOMEASSISTANT_STOP, lambda event: self.stop())
+
+        hass.register_unload(self.stop)
+
         # Dictionary to keep track of known devices and devices we track
         self.known_devices = {}
 
+        # Sets of the MACs of known devices that are tracked or not tracked
+        # and the entity ids of the tracked devices. Only change when the
+        # known devices change.
+        self.tracked = set()
+        self.untracked = set()
+        self._device_entity_ids = frozenset()
+
         # Did we encounter an invalid known devices file
         self.invalid_known_devices_file = False
 
@@ -100,9 +174,9 @@ class DeviceTracker(object):
 
         # Wrap it in a func instead of lambda so it can be identified in
         # the bus by its __name__ attribute.
-        def update_device_state(time):  # pylint: disable=unused-argument
+        def update_device_state(now):  # pylint: disable=unused-argument
             """ Triggers update of the device states. """
-            self.update_devices()
+            self.scan_devices_async()
 
         hass.track_time_change(update_device_state)
 
@@ -110,183 +184,445 @@ class DeviceTracker(object):
                                SERVICE_DEVICE_TRACKER_RELOAD,
                                lambda service: self._read_known_devices_file())
 
-        self.update_devices()
+        with self._scan_lock:
+            self.update_devices()
 
         group.setup_group(
             hass, GROUP_NAME_ALL_DEVICES, self.device_entity_ids, False)
 
+    def stop(self):
+        """ Waits for a running scan to finish, stops the scan threads and
+            writes the known devices that have not been written yet. """
+        with self._scan_lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+
+            self.known_devices_store.flush()
+
     @property
     def device_entity_ids(self):
         """ Returns a set containing all device entity ids
             that are being tracked. """
-        return set([self.known_devices[device]['entity_id'] for device
-                    in self.known_devices
-                    if self.known_devices[device]['track']])
+        return self._device_entity_ids
+
+    def scan_devices_async(self):
+        """ Scans for devices on a background thread and updates the device
+            states when the scan is done. Does nothing if a scan is still
+            running. Returns if a scan was started. """
+        if not self._scan_lock.acquire(False):
+            _LOGGER.debug("Previous scan still running, skipping scan")
+
+            self.metrics.inc(metrics.METRIC_DEVICE_SCANS_SKIPPED)
+
+            return False
+
+        threading.Thread(target=self._scan, name="DeviceTrackerScan",
+                         daemon=True).start()
+
+        return True
+
+    def _scan(self):
+        """ Scans for devices and updates the device states. Releases the
+            scan lock when done. """
+        try:
+            self.update_devices()
+
+        except Exception:  # pylint: disable=broad-except
+            _LOGGER.exception("Error scanning for devices")
+
+        finally:
+            self._scan_lock.release()
+
+    def scan_devices(self):
+        """ Scans all device scanners concurrently. Returns dict mapping
+            scanner name to the devices it found. Scanners that fail are
+            left out. """
+        if self._executor is None:
+            return dict(self._scan_devices(name, scanner)
+                        for name, scanner in self.device_scanners.items())
+
+        return dict(self._executor.map(
+            lambda item: self._scan_devices(*item),
+            self.device_scanners.items()))
+
+    def _scan_devices(self, name, device_scanner):
+        """ Scans device_scanner. Returns tuple (name, found devices). """
+        start = time.perf_counter()
+
+        try:
+            return name, device_scanner.scan_devices()
+
+        except Exception:  # pylint: disable=broad-except
+            _LOGGER.exception("Error scanning for devices with %s", name)
+
+            return name, []
+
+        finally:
+            self.metrics.observe(metrics.METRIC_DEVICE_SCAN,
+                                 time.perf_counter() - start, platform=name)
 
     def update_devices(self, found_devices=None):
-        """ Update device states based on the found devices. """
-        self.lock.acquire()
+        """ Update device states based on the found devices. Found_devices
+            is a dict mapping scanner name to the devices it found or a list
+            of devices. Scans for devices if found_devices is None. """
+        if found_devices is None:
+            found_devices = self.scan_devices()
 
-        found_devices = found_devices or self.device_scanner.scan_devices()
+        elif not isinstance(found_devices, dict):
+            found_devices = {None: found_devices}
 
-        now = datetime.now()
+        with self.lock:
+
+            now = datetime.now()
 
-        known_dev = self.known_devices
+            known_dev = self.known_devices
 
-        temp_tracking_devices = [device for device in known_dev
-                                 if known_dev[device]['track']]
+            for name, devices in found_devices.items():
+                for device in self.tracked.intersection(devices):
+                    self.last_seen.setdefault(device, {})[name] = now
 
-        for device in found_devices:
-            # Are we tracking this device?
-            if device in temp_tracking_devices:
-                temp_tracking_devices.remove(device)
+            found_devices = set().union(*found_devices.values())
 
+            for device in found_devices & self.tracked:
                 known_dev[device]['last_seen'] = now
 
                 self.states.set(
                     known_dev[device]['entity_id'], components.STATE_HOME,
                     known_dev[device]['default_state_attr'])
 
-        # For all devices we did not find, set state to NH
-        # But only if they have been gone for longer then the error time span
-        # Because we do not want to have stuff happening when the device does
-        # not show up for 1 scan beacuse of reboot etc
-        for device in temp_tracking_devices:
-            if now - known_dev[device]['last_seen'] > self.error_scanning:
+            # For all devices we did not find, set state to NH
+            # But only if they have been gone for longer then the error time
+            # span because we do not want to have stuff happening when the
+            # device does not show up for 1 scan beacuse of reboot etc
+            for device in self.tracked - found_devices:
+                # The scanner that saw the device last decides
+                last_seen = max(self.last_seen.get(device, {}).values(),
+                                default=known_dev[device]['last_seen'])
+
+                if now - last_seen > self.error_scanning:
+
+                    self.states.set(known_dev[device]['entity_id'],
+                                    components.STATE_NOT_HOME,
+                                    known_dev[device]['default_state_attr'])
+
+            # If we come along any unknown devices we will write them to the
+            # known devices file but only if we did not encounter an invalid
+            # known devices file
+            if self.invalid_known_devices_file:
+                return
+
+            unknown_devices = found_devices - self.tracked - self.untracked
 
-                self.states.set(known_dev[device]['entity_id'],
-                                components.STATE_NOT_HOME,
-                                known_dev[device]['default_state_attr'])
+        if unknown_devices:
+            # See if the device scanners know the names. This can query the
+            # scanners so do it without holding the lock.
+            names = self._get_device_names(sorted(unknown_devices))
 
-        # If we come along any unknown devices we will write them to the
-        # known devices file but only if we did not encounter an invalid
-        # known devices file
-        if not self.invalid_known_devices_file:
+            with self.lock:
+                self._add_unknown_devices(unknown_devices, names)
 
-            known_dev_path = self.path_known_devices_file
+    def _add_unknown_devices(self, unknown_devices, names):
+        """ Adds unknown devices to the known devices and schedules writing
+            them to the known devices file. Names is a dict mapping device
+            to its name. Lock should be held. """
+        # The known devices can have changed since the devices were found
+        unknown_devices = sorted(
+            device for device in unknown_devices
+            if device not in self.known_devices)
 
-            unknown_devices = [device for device in found_devices
-                               if device not in known_dev]
+        if self.invalid_known_devices_file or not unknown_devices:
+            return
 
-            if unknown_devices:
-                try:
-                    # If file does not exist we will write the header too
-                    is_new_file = not os.path.isfile(known_dev_path)
+        _LOGGER.info("Found %d new devices", len(unknown_devices))
 
-                    with open(known_dev_path, 'a') as outp:
-                        _LOGGER.info(
-                            "Found %d new devices, updating %s",
-                            len(unknown_devices), known_dev_path)
+        rows = []
 
-                        writer = csv.writer(outp)
+        for device in unknown_devices:
+            name = names.get(device) or "unknown_device"
 
-                        if is_new_file:
-                            writer.writerow((
-                                "device", "name", "track", "picture"))
+            rows.append((device, name, 0, ""))
+            self.known_devices[device] = {'name': name,
+                                          'track': False,
+                                          'picture': ""}
+            self.untracked.add(device)
 
-                        for device in unknown_devices:
-                            # See if the device scanner knows the name
-                            # else defaults to unknown device
-                            name = (self.device_scanner.get_device_name(device)
-                                    or "unknown_device")
+        self.known_devices_store.add(rows)
 
-                            writer.writerow((device, name, 0, ""))
-                            known_dev[device] = {'name': name,
-                                                 'track': False,
-                                                 'picture': ""}
+    def _get_device_names(self, devices):
+        """ Returns dict mapping device to its name from the first scanner
+            that knows it. Devices no scanner knows are left out. """
+        names = {}
 
-                except IOError:
-                    _LOGGER.exception(
-                        "Error updating %s with %d new devices",
-                        known_dev_path, len(unknown_devices))
+        for device_scanner in self.device_scanners.values():
+            remaining = [device for device in devices if device not in names]
 
-        self.lock.release()
+            if not remaining:
+                break
+
+            if isinstance(device_scanner, DeviceScanner):
+                found = device_scanner.get_device_names(remaining)
+
+            else:
+                found = {device: device_scanner.get_device_name(device)
+                         for device in remaining}
+
+            names.update((device, name) for device, name in found.items()
+                         if name)
+
+        return names
+
+    def _set_known_devices(self, known_devices):
+        """ Makes known_devices the known devices and updates the sets of
+            tracked and untracked devices. Lock should be held. """
+        self.known_devices = known_devices
+
+        self.tracked = set(device for device, info in known_devices.items()
+                           if info['track'])
+        self.untracked = set(known_devices) - self.tracked
+
+        self._device_entity_ids = frozenset(
+            known_devices[device]['entity_id'] for device in self.tracked)
 
     def _read_known_devices_file(self):
-        """ Parse and process the known devices file. """
+        """ Parse and process the known devices file. Does nothing if the
+            file does not exist or did not change since it was last read or
+            written. """
+        with self.lock:
+            try:
+                rows = self.known_devices_store.read()
+
+            except KeyError:
+                self.invalid_known_devices_file = True
+                _LOGGER.warning(
+                    ("Invalid known devices file: %s. "
+                     "We won't update it with new found devices."),
+                    self.path_known_devices_file)
+
+                return
 
-        # Read known devices if file exists
-        if os.path.isfile(self.path_known_devices_file):
-            self.lock.acquire()
+            if rows is None:
+                return
 
             known_devices = {}
 
-            with open(self.path_known_devices_file) as inp:
-                default_last_seen = datetime(1990, 1, 1)
+            default_last_seen = datetime(1990, 1, 1)
+
+            # Makes sure that each device is mapped to a unique entity_id
+            entity_ids = util.UniqueStringAllocator()
+
+            for row in rows:
+                row['track'] = row['track'] == '1'
+
+                if row['picture']:
+                    row['default_state_attr'] = {
+                        components.ATTR_ENTITY_PICTURE: row['picture']}
+
+                else:
+                    row['default_state_attr'] = None
+
+                # If we track this device setup tracking variables
+                if row['track']:
+                    row['last_seen'] = default_last_seen
+
+                    name = util.slugify(row['name']) if row['name'] \
+                        else "unnamed_device"
+
+                    row['entity_id'] = ENTITY_ID_FORMAT.format(
+                        entity_ids.allocate(name))
+
+                known_devices[row['device']] = row
+
+            if not known_devices:
+                _LOGGER.warning(
+                    "No devices to track. Please update %s.",
+                    self.path_known_devices_file)
+
+            old_entity_ids = self.device_entity_ids
+
+            # File parsed, warnings given if necessary
+            # make it available
+            self._set_known_devices(known_devices)
+
+            # Remove entities that are no longer maintained
+            for entity_id in old_entity_ids - self.device_entity_ids:
+                _LOGGER.info("Removing entity %s", entity_id)
+                self.states.remove(entity_id)
+
+            _LOGGER.info("Loaded devices from %s",
+                         self.path_known_devices_file)
+
+
+class KnownDevicesStore(object):
+    """ Reads the known devices file and appends new devices to it.
 
-                # Temp variable to keep track of which entity ids we use
-                # so we can ensure we have unique entity ids.
-                used_entity_ids = []
+    New devices are written in batches: adding devices starts a timer and
+    all devices added before it fires are appended at once. Reading only
+    parses the file if it changed since it was last read or written. """
 
-                try:
-                    for row in csv.DictReader(inp):
-                        device = row['device']
+    def __init__(self, path, write_delay=KNOWN_DEVICES_WRITE_DELAY):
+        self.path = path
+        self.write_delay = write_delay
+        self._lock = threading.Lock()
+        self._pending = []
+        self._timer = None
 
-                        row['track'] = True if row['track'] == '1' else False
+        # (mtime, size) of the file when we last read or wrote it
+        self._signature = None
 
-                        if row['picture']:
-                            row['default_state_attr'] = {
-                                components.ATTR_ENTITY_PICTURE: row['picture']}
+    def read(self):
+        """ Returns the rows of the file as a list of dicts. Returns None if
+            the file does not exist or did not change. Raises KeyError if
+            the file is missing columns. """
+        self.flush()
 
-                        else:
-                            row['default_state_attr'] = None
+        with self._lock:
+            signature = self._file_signature()
 
-                        # If we track this device setup tracking variables
-                        if row['track']:
-                            row['last_seen'] = default_last_seen
+            if signature is None or signature == self._signature:
+                return None
 
-                            # Make sure that each device is mapped
-                            # to a unique entity_id name
-                            name = util.slugify(row['name']) if row['name'] \
-                                else "unnamed_device"
+            with open(self.path) as inp:
+                reader = csv.DictReader(inp)
 
-                            entity_id = ENTITY_ID_FORMAT.format(name)
-                            tries = 1
+                if not set(KNOWN_DEVICES_COLUMNS) <= set(
+                        reader.fieldnames or ()):
+                    raise KeyError(KNOWN_DEVICES_COLUMNS)
 
-                            while entity_id in used_entity_ids:
-                                tries += 1
+                rows = list(reader)
 
-                                suffix = "_{}".format(tries)
+            self._signature = signature
 
-                                entity_id = ENTITY_ID_FORMAT.format(
-                                    name + suffix)
+            return rows
 
-                            row['entity_id'] = entity_id
-                            used_entity_ids.append(entity_id)
+    def add(self, rows):
+        """ Schedules rows of (device, name, track, picture) to be appended
+            to the file. """
+        with self._lock:
+            self._pending.extend(rows)
+
+            if self._timer is None:
+                self._timer = threading.Timer(self.write_delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        """ Appends the scheduled rows to the file. """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+            rows, self._pending = self._pending, []
+
+            if not rows:
+                return
+
+            # If we knew the file before writing, we know it after
+            known = self._file_signature() == self._signature
+
+            try:
+                # If file does not exist we will write the header too
+                is_new_file = not os.path.isfile(self.path)
+
+                with open(self.path, 'a') as outp:
+                    _LOGGER.info("Writing %d new devices to %s",
+                                 len(rows), self.path)
+
+                    writer = csv.writer(outp)
+
+                    if is_new_file:
+                        writer.writerow(KNOWN_DEVICES_COLUMNS)
+
+                    writer.writerows(rows)
+
+            except IOError:
+                _LOGGER.exception(
+                    "Error updating %s with %d new devices",
+                    self.path, len(rows))
+
+                return
+
+            if known or is_new_file:
+                self._signature = self._file_signature()
+
+    def _file_signature(self):
+        """ Returns (mtime, size) of the file or None if it does not exist.
+        """
+        try:
+            stat = os.stat(self.path)
+
+        except OSError:
+            return None
+
+        return stat.st_mtime_ns, stat.st_size
+
+
+class DeviceScanner(object):
+    """ Base class for scanners of routers that remembers device names.
+
+    Names are cached for DEVICE_NAME_TTL. Subclasses implement
+    _fetch_device_names, which is called once for all devices whose name
+    is unknown or expired. Scanners that get names with their scan results
+    can pass them to _cache_device_names after each scan. """
+
+    def __init__(self):
+        # Dict mapping MAC => (name, expires)
+        self._names = {}
+        self._names_lock = threading.Lock()
+
+    def scan_devices(self):
+        """ Scans for new devices and return a
+            list containing found device ids. """
+        raise NotImplementedError()
+
+    def get_device_name(self, device):
+        """ Returns the name of the given device or None if we don't know. """
+        return self.get_device_names([device])[device]
+
+    def get_device_names(self, devices):
+        """ Returns dict mapping each of devices to its name or None if we
+            don't know. """
+        now = datetime.now()
+        names = {}
+        missing = []
 
-                            row['picture'] = row['picture']
+        with self._names_lock:
+            for device in devices:
+                cached = self._names.get(device)
 
-                        known_devices[device] = row
+                if cached is not None and cached[1] > now:
+                    names[device] = cached[0]
+                else:
+                    missing.append(device)
 
-                    if not known_devices:
-                        _LOGGER.warning(
-                            "No devices to track. Please update %s.",
-                            self.path_known_devices_file)
+        if missing:
+            fetched = self._fetch_device_names(missing)
 
-                    # Remove entities that are no longer maintained
-                    new_entity_ids = set([known_devices[dev]['entity_id']
-                                          for dev in known_devices
-                                          if known_devices[dev]['track']])
+            # Only remember names if fetching them worked
+            if fetched is None:
+                fetched = {}
+            else:
+                self._cache_device_names(fetched, missing)
 
-                    for entity_id in \
-                            self.device_entity_ids - new_entity_ids:
+            names.update((device, fetched.get(device) or None)
+                         for device in missing)
 
-                        _LOGGER.info("Removing entity %s", entity_id)
-                        self.states.remove(entity_id)
+        return names
 
-                    # File parsed, warnings given if necessary
-                    # entities cleaned up, make it available
-                    self.known_devices = known_devices
+    def _cache_device_names(self, names, devices=()):
+        """ Remembers names, a dict mapping MAC to name. Devices that are
+            not in names are remembered as having no name. """
+        expires = datetime.now() + DEVICE_NAME_TTL
 
-                    _LOGGER.info("Loaded devices from %s",
-                                 self.path_known_devices_file)
+        with self._names_lock:
+            for device in devices:
+                if device not in names:
+                    self._names[device] = (None, expires)
 
-                except KeyError:
-                    self.invalid_known_devices_file = True
-                    _LOGGER.warning(
-                        ("Invalid known devices file: %s. "
-                         "We won't update it with new found devices."),
-                        self.path_known_devices_file)
+            for device, name in names.items():
+                self._names[device] = (name or None, expires)
 
-                finally:
-                    self.lock.release()
+    def _fetch_device_names(self, devices):
+        """ Returns dict mapping MAC to name for at least devices or None
+            if the names could not be fetched. """
+        raise NotImplementedError()
@@ -2,13 +2,12 @@
 import logging
 import json
 from datetime import datetime, timedelta
-import re
 import threading
 import requests
 
 import homeassistant as ha
 import homeassistant.util as util
-from homeassistant.components.device_tracker import DOMAIN
+from homeassistant.components.device_tracker import DOMAIN, DeviceScanner
 
 # Return cached results if last scan was less then this time ago
 MIN_TIME_BETWEEN_SCANS = timedelta(seconds=5)
@@ -31,7 +30,7 @@ def get_scanner(hass, config):
 
 
 # pylint: disable=too-many-instance-attributes
-class LuciDeviceScanner(object):
+class LuciDeviceScanner(DeviceScanner):
     """ This class queries a wireless router running OpenWrt firmware
     for connected devices. Adapted from Tomato scanner.
 
@@ -45,20 +44,23 @@ class LuciDeviceScanner(object):
     """
 
     def __init__(self, config):
+        super().__init__()
+
         host = config[ha.CONF_HOST]
         username, password = config[ha.CONF_USERNAME], config[ha.CONF_PASSWORD]
 
-        self.parse_api_pattern = re.compile(r"(?P<param>\w*) = (?P<value>.*);")
-
         self.lock = threading.Lock()
 
         self.date_updated = None
         self.last_results = {}
 
-        self.token = _get_token(host, username, password)
+        # Reuse the connection to the router between requests
+        self.session = requests.Session()
+
         self.host = host
+        self._credentials = (username, password)
+        self.token = self._login()
 
-        self.mac2name = None
         self.success_init = self.token is not None
 
     def scan_devices(self):
@@ -69,24 +71,18 @@ class LuciDeviceScanner(object):
 
         return self.last_results
 
-    def get_device_name(self, device):
-        """ Returns the name of the given device or None if we don't know. """
+    def _fetch_device_names(self, devices):
+        """ Returns dict mapping MAC to name of all hosts known to the DHCP
+            server of the router. """
+        result = self._rpc('uci', 'get_all', 'dhcp')
 
-        with self.lock:
-            if self.mac2name is None:
-                url = 'http://{}/cgi-bin/luci/rpc/uci'.format(self.host)
-                result = _req_json_rpc(url, 'get_all', 'dhcp',
-                                       params={'auth': self.token})
-                if result:
-                    hosts = [x for x in result.values()
-                             if x['.type'] == 'host' and
-                             'mac' in x and 'name' in x]
-                    mac2name_list = [(x['mac'], x['name']) for x in hosts]
-                    self.mac2name = dict(mac2name_list)
-                else:
-                    # Error, handled in the _req_json_rpc
-                    return
-            return self.mac2name.get(device, None)
+        if not result:
+            # Error, handled in the _req_json_rpc
+            return None
+
+        return {host['mac']: host['name'] for host in result.values()
+                if host['.type'] == 'host' and
+                'mac' in host and 'name' in host}
 
     def _update_info(self):
         """ Ensures the information from the Luci router is up to date.
@@ -101,26 +97,77 @@ class LuciDeviceScanner(object):
 
                 _LOGGER.info("Checking ARP")
 
-                url = 'http://{}/cgi-bin/luci/rpc/sys'.format(self.host)
-                result = _req_json_rpc(url, 'net.arptable',
-                                       params={'auth': self.token})
-                if result:
-                    self.last_results = [x['HW address'] for x in result]
-                    self.date_updated = datetime.now()
-                    return True
-                return False
+                result = self._rpc('sys', 'net.arptable')
+
+                if not result:
+                    return False
+
+                self.last_results = [x['HW address'] for x in result]
+                self.date_updated = datetime.now()
+
+                # Look up the names of new devices as part of the scan so
+                # the lookups of the device tracker are answered from cache
+                self.get_device_names(self.last_results)
 
             return True
 
+    def _rpc(self, endpoint, method, *args):
+        """ Calls method on endpoint of the Luci RPC API. Logs in again and
+            retries once if the token is no longer valid. """
+        url = 'http://{}/cgi-bin/luci/rpc/{}'.format(self.host, endpoint)
+
+        for retry in (False, True):
+            try:
+                return _req_json_rpc(self.session, url, method, *args,
+                                     params={'auth': self.token})
+
+            except InvalidLuciTokenError:
+                if retry:
+                    _LOGGER.error("Luci did not accept the new token")
+
+                    return None
+
+                _LOGGER.info("Luci token expired, logging in again")
+
+                self.token = self._login()
+
+                if self.token is None:
+                    return None
 
-def _req_json_rpc(url, method, *args, **kwargs):
-    """ Perform one JSON RPC operation. """
+        return None
+
+    def _login(self):
+        """ Returns a new authentication token or None if login failed. """
+        url = 'http://{}/cgi-bin/luci/rpc/auth'.format(self.host)
+
+        try:
+            return _req_json_rpc(self.session, url, 'login',
+                                 *self._credentials)
+
+        except InvalidLuciTokenError:
+            _LOGGER.error(
+                "Failed to authenticate, "
+                "please check your username and password")
+
+            return None
+
+
+class InvalidLuciTokenError(Exception):
+    """ When the Luci RPC API does not accept the authentication token. """
+
+
+def _req_json_rpc(session, url, method, *args, **kwargs):
+    """ Perform one JSON RPC operation. Raises InvalidLuciTokenError if
+        authentication failed. """
     data = json.dumps({'method': method, 'params': args})
     try:
-        res = requests.post(url, data=data, timeout=5, **kwargs)
+        res = session.post(url, data=data, timeout=5, **kwargs)
     except requests.exceptions.Timeout:
         _LOGGER.exception("Connection to the router timed out")
         return
+    except requests.exceptions.ConnectionError:
+        _LOGGER.exception("Failed to connect to the router")
+        return
     if res.status_code == 200:
         try:
             result = res.json()
@@ -133,17 +180,9 @@ def _req_json_rpc(url, method, *args, **kwargs):
         except KeyError:
             _LOGGER.exception("No result in response from luci")
             return
-    elif res.status_code == 401:
-        # Authentication error
-        _LOGGER.exception(
-            "Failed to authenticate, "
-            "please check your username and password")
-        return
+    elif res.status_code in (401, 403):
+        # Authentication error, the token expired or the credentials
+        # are wrong
+        raise InvalidLuciTokenError()
     else:
         _LOGGER.error("Invalid response from luci: %s", res)
-
-
-def _get_token(host, username, password):
-    """ Get authentication token for the given host+username+password """
-    url = 'http://{}/cgi-bin/luci/rpc/auth'.format(host)
-    return _req_json_rpc(url, 'login', username, password)
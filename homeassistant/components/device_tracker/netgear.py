@@ -5,7 +5,7 @@ import threading
 
 import homeassistant as ha
 import homeassistant.util as util
-from homeassistant.components.device_tracker import DOMAIN
+from homeassistant.components.device_tracker import DOMAIN, DeviceScanner
 
 # Return cached results if last scan was less then this time ago
 MIN_TIME_BETWEEN_SCANS = timedelta(seconds=5)
@@ -27,10 +27,12 @@ def get_scanner(hass, config):
     return scanner if scanner.success_init else None
 
 
-class NetgearDeviceScanner(object):
+class NetgearDeviceScanner(DeviceScanner):
     """ This class queries a Netgear wireless router using the SOAP-api. """
 
     def __init__(self, config):
+        super().__init__()
+
         host = config[ha.CONF_HOST]
         username, password = config[ha.CONF_USERNAME], config[ha.CONF_PASSWORD]
 
@@ -72,20 +74,14 @@ class NetgearDeviceScanner(object):
 
         return [device.mac for device in self.last_results]
 
-    def get_device_name(self, mac):
-        """ Returns the name of the given device or None if we don't know. """
+    def _fetch_device_names(self, devices):
+        """ Returns dict mapping MAC to name of the last scan results. """
 
         # Make sure there are results
         if not self.date_updated:
             self._update_info()
 
-        filter_named = [device.name for device in self.last_results
-                        if device.mac == mac]
-
-        if filter_named:
-            return filter_named[0]
-        else:
-            return None
+        return {device.mac: device.name for device in self.last_results}
 
     def _update_info(self):
         """ Retrieves latest information from the Netgear router.
@@ -105,6 +101,9 @@ class NetgearDeviceScanner(object):
 
                 self.date_updated = datetime.now()
 
+                self._cache_device_names(
+                    {device.mac: device.name for device in self.last_results})
+
                 return
 
             else:
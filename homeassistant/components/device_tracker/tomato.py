@@ -2,20 +2,22 @@
 import logging
 import json
 from datetime import datetime, timedelta
-import re
 import threading
 
 import requests
 
 import homeassistant as ha
 import homeassistant.util as util
-from homeassistant.components.device_tracker import DOMAIN
+from homeassistant.components.device_tracker import DOMAIN, DeviceScanner
 
 # Return cached results if last scan was less then this time ago
 MIN_TIME_BETWEEN_SCANS = timedelta(seconds=5)
 
 CONF_HTTP_ID = "http_id"
 
+# The values of the Tomato API we use
+TOMATO_PARAMS = ("wldev", "dhcpd_lease")
+
 _LOGGER = logging.getLogger(__name__)
 
 
@@ -31,7 +33,8 @@ def get_scanner(hass, config):
     return TomatoDeviceScanner(config[DOMAIN])
 
 
-class TomatoDeviceScanner(object):
+# pylint: disable=too-many-instance-attributes
+class TomatoDeviceScanner(DeviceScanner):
     """ This class queries a wireless router running Tomato firmware
     for connected devices.
 
@@ -40,6 +43,8 @@ class TomatoDeviceScanner(object):
     """
 
     def __init__(self, config):
+        super().__init__()
+
         host, http_id = config[ha.CONF_HOST], config[CONF_HTTP_ID]
         username, password = config[ha.CONF_USERNAME], config[ha.CONF_PASSWORD]
 
@@ -50,10 +55,15 @@ class TomatoDeviceScanner(object):
                                     auth=requests.auth.HTTPBasicAuth(
                                         username, password)).prepare()
 
-        self.parse_api_pattern = re.compile(r"(?P<param>\w*) = (?P<value>.*);")
+        # Reuse the connection to the router between scans
+        self.session = requests.Session()
 
         self.logger = logging.getLogger("{}.{}".format(__name__, "Tomato"))
+
+        # Lock protects the results, scan lock makes sure that only one
+        # request to the router is made at a time
         self.lock = threading.Lock()
+        self._scan_lock = threading.Lock()
 
         self.date_updated = None
         self.last_results = {"wldev": [], "dhcpd_lease": []}
@@ -68,50 +78,48 @@ class TomatoDeviceScanner(object):
 
         return [item[1] for item in self.last_results['wldev']]
 
-    def get_device_name(self, device):
-        """ Returns the name of the given device or None if we don't know. """
+    def _fetch_device_names(self, devices):
+        """ Returns dict mapping MAC to name of the last scan results. """
 
         # Make sure there are results
         if not self.date_updated:
             self._update_tomato_info()
 
-        filter_named = [item[0] for item in self.last_results['dhcpd_lease']
-                        if item[2] == device]
+        return self._lease_names()
 
-        if not filter_named or not filter_named[0]:
-            return None
-        else:
-            return filter_named[0]
+    def _lease_names(self):
+        """ Returns dict mapping MAC to name of the DHCP leases. """
+        return {item[2]: item[0] for item in self.last_results['dhcpd_lease']}
 
     def _update_tomato_info(self):
         """ Ensures the information from the Tomato router is up to date.
-            Returns boolean if scanning successful. """
+            Returns boolean if scanning successful. If a scan is running,
+            waits for it and uses its results. """
 
-        self.lock.acquire()
-
-        # if date_updated is None or the date is too old we scan for new data
-        if not self.date_updated or \
-           datetime.now() - self.date_updated > MIN_TIME_BETWEEN_SCANS:
+        with self._scan_lock:
+            # if date_updated is None or the date is too old we scan for new
+            # data
+            if self.date_updated and \
+               datetime.now() - self.date_updated <= MIN_TIME_BETWEEN_SCANS:
+                return True
 
             self.logger.info("Scanning")
 
             try:
-                response = requests.Session().send(self.req, timeout=3)
+                response = self.session.send(self.req, timeout=3)
 
                 # Calling and parsing the Tomato api here. We only need the
                 # wldev and dhcpd_lease values. For API description see:
                 # http://paulusschoutsen.nl/
                 #   blog/2013/10/tomato-api-documentation/
                 if response.status_code == 200:
+                    results = parse_tomato_response(response.text)
 
-                    for param, value in \
-                            self.parse_api_pattern.findall(response.text):
-
-                        if param == 'wldev' or param == 'dhcpd_lease':
-                            self.last_results[param] = \
-                                json.loads(value.replace("'", '"'))
+                    with self.lock:
+                        self.last_results.update(results)
+                        self.date_updated = datetime.now()
 
-                    self.date_updated = datetime.now()
+                    self._cache_device_names(self._lease_names())
 
                     return True
 
@@ -141,18 +149,39 @@ class TomatoDeviceScanner(object):
                 return False
 
             except ValueError:
-                # If json decoder could not parse the response
+                # If the response could not be parsed
                 self.logger.exception(
                     "Failed to parse response from router")
 
                 return False
 
-            finally:
-                self.lock.release()
+
+def parse_tomato_response(text, params=TOMATO_PARAMS):
+    """ Returns dict mapping each of params to its value in text, the body
+        of a Tomato API response. Only the lines of params are parsed.
+        Raises ValueError if a value cannot be parsed. """
+    results = {}
+
+    for param in params:
+        prefix = param + " = "
+
+        if text.startswith(prefix):
+            start = len(prefix)
 
         else:
-            # We acquired the lock before the IF check,
-            # release it before we return True
-            self.lock.release()
+            start = text.find("\n" + prefix)
+
+            if start == -1:
+                continue
+
+            start += len(prefix) + 1
+
+        end = text.find("\n", start)
+
+        value = text[start:end if end != -1 else len(text)].rstrip()
+
+        # Values are JavaScript arrays with single quoted strings
+        results[param] = json.loads(
+            value.rstrip(';').replace('"', '\\"').replace("'", '"'))
 
-            return True
+    return results
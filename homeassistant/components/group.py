@@ -3,14 +3,24 @@ homeassistant.components.groups
 ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
 Provides functionality to group devices that can be turned on or off.
+
+Groups can also aggregate the states of their members, for example the
+minimum, maximum or mean temperature of a couple of sensors or the number of
+members that are active. Aggregates are updated incrementally when a member
+changes. More aggregate types can be added with register_aggregate_type.
 """
 
 import logging
+import threading
+import weakref
+import heapq
+from collections import defaultdict, Counter
 
 import homeassistant.util as util
 from homeassistant.components import (STATE_ON, STATE_OFF,
                                       STATE_HOME, STATE_NOT_HOME,
-                                      ATTR_ENTITY_ID)
+                                      ATTR_ENTITY_ID,
+                                      ATTR_UNIT_OF_MEASUREMENT)
 
 DOMAIN = "group"
 DEPENDENCIES = []
@@ -18,20 +28,31 @@ DEPENDENCIES = []
 ENTITY_ID_FORMAT = DOMAIN + ".{}"
 
 ATTR_AUTO = "auto"
+ATTR_AGGREGATE = "aggregate"
+
+STATE_OPEN = "open"
+STATE_UNKNOWN = "unknown"
+
+# States that count as active for the count aggregate
+ACTIVE_STATES = (STATE_ON, STATE_HOME, STATE_OPEN)
+
+# Dict mapping Home Assistant instance => GroupManager
+_MANAGERS = weakref.WeakKeyDictionary()
 
 _GROUP_TYPES = {
     "on_off": (STATE_ON, STATE_OFF),
     "home_not_home": (STATE_HOME, STATE_NOT_HOME)
 }
 
+# Dict mapping state => group type
+_STATE_GROUP_TYPES = {state: group_type
+                      for group_type, states in _GROUP_TYPES.items()
+                      for state in states}
+
 
 def _get_group_type(state):
     """ Determine the group type based on the given group type. """
-    for group_type, states in _GROUP_TYPES.items():
-        if state in states:
-            return group_type
-
-    return None
+    return _STATE_GROUP_TYPES.get(state)
 
 
 def is_on(hass, entity_id):
@@ -49,72 +70,70 @@ def is_on(hass, entity_id):
 
 def expand_entity_ids(hass, entity_ids):
     """ Returns the given list of entity ids and expands group ids into
-        the entity ids it represents if found. """
-    found_ids = []
+        the entity ids it represents if found. Nested groups are expanded
+        too. Each entity id is returned once, in order of appearance. """
+    return get_manager(hass).expand(entity_ids)
 
-    for entity_id in entity_ids:
-        try:
-            # If entity_id points at a group, expand it
-            domain, _ = util.split_entity_id(entity_id)
-
-            if domain == DOMAIN:
-                found_ids.extend(
-                    ent_id for ent_id
-                    in get_entity_ids(hass, entity_id)
-                    if ent_id not in found_ids)
-
-            else:
-                if entity_id not in found_ids:
-                    found_ids.append(entity_id)
 
-        except AttributeError:
-            # Raised by util.split_entity_id if entity_id is not a string
-            pass
+def get_entity_ids(hass, entity_id, domain_filter=None):
+    """ Get the entity ids that make up this group. """
+    entity_ids = get_manager(hass).get_members(entity_id)
 
-    return found_ids
+    if domain_filter:
+        return [ent_id for ent_id in entity_ids
+                if ent_id.startswith(domain_filter)]
+    else:
+        return entity_ids
 
 
-def get_entity_ids(hass, entity_id, domain_filter=None):
-    """ Get the entity ids that make up this group. """
-    try:
-        entity_ids = hass.states.get(entity_id).attributes[ATTR_ENTITY_ID]
+def get_groups(hass, entity_id):
+    """ Returns the entity ids of the groups that contain entity_id,
+        directly or through nested groups. """
+    return get_manager(hass).get_groups(entity_id)
 
-        if domain_filter:
-            return [ent_id for ent_id in entity_ids
-                    if ent_id.startswith(domain_filter)]
-        else:
-            return entity_ids
 
-    except (AttributeError, KeyError):
-        # AttributeError if state did not exist
-        # KeyError if key did not exist in attributes
-        return []
+def register_aggregate_type(name, aggregate_type):
+    """ Makes aggregate_type, a subclass of Aggregate, available to groups
+        as name. """
+    AGGREGATE_TYPES[name] = aggregate_type
 
 
 def setup(hass, config):
-    """ Sets up all groups found definded in the configuration. """
+    """ Sets up all groups found definded in the configuration.
+        Entity ids can be prefixed with an aggregate type and a colon,
+        ie max:tellstick_sensor.a,tellstick_sensor.b """
     for name, entity_ids in config.get(DOMAIN, {}).items():
+        aggregate = None
+
+        if ":" in entity_ids:
+            aggregate, entity_ids = entity_ids.split(":", 1)
+
         entity_ids = entity_ids.split(",")
 
-        setup_group(hass, name, entity_ids)
+        setup_group(hass, name, entity_ids, aggregate=aggregate)
 
     return True
 
 
 # pylint: disable=too-many-branches
-def setup_group(hass, name, entity_ids, user_defined=True):
+def setup_group(hass, name, entity_ids, user_defined=True, aggregate=None):
     """ Sets up a group state that is the combined state of
-        several states. Supports ON/OFF and DEVICE_HOME/DEVICE_NOT_HOME. """
+        several states. Supports ON/OFF and DEVICE_HOME/DEVICE_NOT_HOME.
+        If aggregate is given, the state of the group is the aggregate
+        of that type over the states of the members. """
 
     # In case an iterable is passed in
     entity_ids = list(entity_ids)
 
+    if aggregate is not None:
+        return _setup_aggregate_group(
+            hass, name, entity_ids, user_defined, aggregate)
+
     # Loop over the given entities to:
     #  - determine which group type this is (on_off, device_home)
     #  - if all states exist and have valid states
-    #  - retrieve the current state of the group
     errors = []
-    group_type, group_on, group_off, group_state = None, None, None, None
+    group_type, group_on, group_off = None, None, None
 
     for entity_id in entity_ids:
         state = hass.states.get(entity_id)
@@ -125,7 +144,6 @@ def setup_group(hass, name, entity_ids, user_defined=True):
 
             if group_type:
                 group_on, group_off = _GROUP_TYPES[group_type]
-                group_state = group_off
 
             else:
                 # We did not find a matching group_type
@@ -146,13 +164,48 @@ def setup_group(hass, name, entity_ids, user_defined=True):
             errors.append("State of {} is {} (expected: {} or {})".format(
                 entity_id, state.state, group_off, group_on))
 
-        # Keep track of the group state to init later on
-        elif state.state == group_on:
-            group_state = group_on
-
     if group_type is None and not errors:
         errors.append('Unable to determine group type for {}'.format(name))
 
+    return _add_group(
+        hass, name, errors,
+        Group(hass, ENTITY_ID_FORMAT.format(name), entity_ids,
+              not user_defined, group_on, group_off))
+
+
+def _setup_aggregate_group(hass, name, entity_ids, user_defined, aggregate):
+    """ Sets up a group whose state is an aggregate of its members. """
+    if aggregate not in AGGREGATE_TYPES:
+        return _add_group(hass, name, [
+            "Unknown aggregate {} (expected one of: {})".format(
+                aggregate, ", ".join(sorted(AGGREGATE_TYPES)))])
+
+    errors = []
+
+    if not entity_ids:
+        errors.append('No entities to aggregate for {}'.format(name))
+
+    errors.extend("Entity {} does not exist".format(entity_id)
+                  for entity_id in entity_ids
+                  if entity_id not in hass.states.entity_ids)
+
+    return _add_group(
+        hass, name, errors,
+        AggregateGroup(hass, ENTITY_ID_FORMAT.format(name), entity_ids,
+                       not user_defined, aggregate))
+
+
+def _add_group(hass, name, errors, group=None):
+    """ Adds group to the manager of hass unless there are errors or the
+        group would contain itself. Returns if the group was added. """
+    manager = get_manager(hass)
+
+    cycle = group and manager.find_cycle(group.entity_id, group.entity_ids)
+
+    if cycle:
+        errors.append("Group would contain itself: {}".format(
+            " -> ".join(cycle)))
+
     if errors:
         logging.getLogger(__name__).error(
             "Error setting up group %s: %s", name, ", ".join(errors))
@@ -160,34 +213,508 @@ def setup_group(hass, name, entity_ids, user_defined=True):
         return False
 
     else:
-        group_entity_id = ENTITY_ID_FORMAT.format(name)
-        state_attr = {ATTR_ENTITY_ID: entity_ids, ATTR_AUTO: not user_defined}
+        manager.add_group(group)
 
-        # pylint: disable=unused-argument
-        def update_group_state(entity_id, old_state, new_state):
-            """ Updates the group state based on a state change by
-                a tracked entity. """
+        # Groups of a component are removed when it is unloaded, so groups
+        # that have been removed from the config do not linger
+        hass.register_unload(lambda: manager.remove_group(group))
 
-            cur_gr_state = hass.states.get(group_entity_id).state
+        return True
 
-            # if cur_gr_state = OFF and new_state = ON: set ON
-            # if cur_gr_state = ON and new_state = OFF: research
-            # else: ignore
 
-            if cur_gr_state == group_off and new_state.state == group_on:
+def get_manager(hass):
+    """ Returns the GroupManager of hass. """
+    manager = _MANAGERS.get(hass)
 
-                hass.states.set(group_entity_id, group_on, state_attr)
+    if manager is None:
+        manager = _MANAGERS.setdefault(hass, GroupManager(hass))
 
-            elif cur_gr_state == group_on and new_state.state == group_off:
+    return manager
 
-                # Check if any of the other states is still on
-                if not any([hass.states.is_state(ent_id, group_on)
-                            for ent_id in entity_ids
-                            if entity_id != ent_id]):
-                    hass.states.set(group_entity_id, group_off, state_attr)
 
-        hass.track_state_change(entity_ids, update_group_state)
+class GroupManager(object):
+    """ Keeps track of the groups of a Home Assistant instance.
 
-        hass.states.set(group_entity_id, group_state, state_attr)
+    Maintains which entities are a member of each group and, in reverse,
+    which groups each entity is a member of. Groups can contain other groups
+    as long as no group ends up containing itself. """
 
-        return True
+    def __init__(self, hass):
+        self.hass = hass
+        self.groups = {}
+        self._members = {}
+        self._member_of = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def add_group(self, group):
+        """ Adds a group and sets its state. Replaces an existing group
+            with the same entity id. """
+        entity_id, entity_ids = group.entity_id, group.entity_ids
+
+        with self._lock:
+            old_group = self.groups.get(entity_id)
+            self.groups[entity_id] = group
+
+            for member_id in self._members.get(entity_id, ()):
+                self._member_of[member_id].discard(entity_id)
+
+            self._members[entity_id] = tuple(entity_ids)
+
+            for member_id in entity_ids:
+                self._member_of[member_id].add(entity_id)
+
+        if old_group is not None:
+            old_group.remove()
+
+        group.start()
+
+        return group
+
+    def remove_group(self, group):
+        """ Removes group and its state unless it has been replaced by
+            another group with the same entity id. """
+        entity_id = group.entity_id
+
+        with self._lock:
+            if self.groups.get(entity_id) is not group:
+                return
+
+            del self.groups[entity_id]
+
+            for member_id in self._members.pop(entity_id, ()):
+                self._member_of[member_id].discard(entity_id)
+
+        group.remove()
+
+        self.hass.states.remove(entity_id)
+
+    def get_members(self, entity_id):
+        """ Returns the entity ids that are a direct member of group
+            entity_id. Falls back to the attributes of the state for groups
+            that have not been set up by this manager. """
+        with self._lock:
+            members = self._members.get(entity_id)
+
+        if members is not None:
+            return list(members)
+
+        state = self.hass.states.get(entity_id)
+
+        if state is None:
+            return []
+
+        return list(state.attributes.get(ATTR_ENTITY_ID, []))
+
+    def get_groups(self, entity_id):
+        """ Returns set of group entity ids that contain entity_id,
+            directly or through nested groups. """
+        found = set()
+
+        with self._lock:
+            to_check = [entity_id]
+
+            while to_check:
+                for group_id in self._member_of.get(to_check.pop(), ()):
+                    if group_id not in found:
+                        found.add(group_id)
+                        to_check.append(group_id)
+
+        return found
+
+    def find_cycle(self, entity_id, entity_ids):
+        """ Returns the chain of groups through which group entity_id would
+            contain itself if it had entity_ids as members. Returns None if
+            it would not. """
+        with self._lock:
+            # Maps each group reached to the group it was reached from
+            parents = {}
+            to_check = [(member_id, entity_id) for member_id in entity_ids]
+
+            while to_check:
+                member_id, parent_id = to_check.pop()
+
+                if member_id in parents:
+                    continue
+
+                parents[member_id] = parent_id
+
+                if member_id == entity_id:
+                    chain = [entity_id]
+
+                    while len(chain) == 1 or chain[-1] != entity_id:
+                        chain.append(parents[chain[-1]])
+
+                    return list(reversed(chain))
+
+                to_check.extend((nested_id, member_id) for nested_id
+                                in self._members.get(member_id, ()))
+
+        return None
+
+    def expand(self, entity_ids):
+        """ Returns entity_ids with group ids replaced by their members.
+            Nested groups are expanded too. Each entity id is returned once,
+            in order of first appearance. Non strings are ignored. """
+        found = []
+        seen = set()
+
+        def add(entity_ids):
+            """ Adds entity_ids to found, expanding groups. """
+            for entity_id in entity_ids:
+                if entity_id in seen:
+                    continue
+
+                try:
+                    domain, _ = util.split_entity_id(entity_id)
+
+                except AttributeError:
+                    # Raised by util.split_entity_id if entity_id is not
+                    # a string
+                    continue
+
+                seen.add(entity_id)
+
+                if domain == DOMAIN:
+                    add(self.get_members(entity_id))
+
+                else:
+                    found.append(entity_id)
+
+        add(entity_ids)
+
+        return found
+
+
+class BaseGroup(object):
+    """ Base class for groups that keep their state up to date by tracking
+        the state changes of their members. """
+
+    def __init__(self, hass, entity_id, entity_ids, auto):
+        self.hass = hass
+        self.entity_id = entity_id
+        self.entity_ids = entity_ids
+        self.state_attr = {ATTR_ENTITY_ID: entity_ids, ATTR_AUTO: auto}
+        self._lock = threading.Lock()
+        self._remove_listener = None
+
+    def start(self):
+        """ Reads the states of the members, sets the group state and starts
+            tracking the members. """
+        with self._lock:
+            self._remove_listener = self.hass.track_state_change(
+                self.entity_ids, self._member_changed)
+
+            self._read_members()
+
+            self._set_state()
+
+    def remove(self):
+        """ Stops tracking the members. """
+        if self._remove_listener is not None:
+            self._remove_listener()
+
+    @property
+    def state(self):
+        """ The state the group should be in. """
+        raise NotImplementedError()
+
+    def _read_members(self):
+        """ Initializes the group from the current states of the members.
+            Lock should be held. """
+        raise NotImplementedError()
+
+    def _member_changed(self, entity_id, old_state, new_state):
+        """ Updates the group based on a state change of a member. """
+        raise NotImplementedError()
+
+    def _set_state(self):
+        """ Sets the group state. Lock should be held. """
+        self.hass.states.set(self.entity_id, self.state, self.state_attr)
+
+
+class Group(BaseGroup):
+    """ Keeps the state of a group up to date.
+
+    Keeps the set of members that are on. A state change of a member adds
+    or discards only that member, the group state is only set when the set
+    becomes empty or stops being empty. Applying a state change twice has
+    no effect, so a change that is also seen while reading the members is
+    not counted twice. """
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, hass, entity_id, entity_ids, auto, group_on,
+                 group_off):
+        super().__init__(hass, entity_id, entity_ids, auto)
+        self.group_on = group_on
+        self.group_off = group_off
+        self._on = set()
+
+    @property
+    def on_count(self):
+        """ Number of members that are on. """
+        return len(self._on)
+
+    @property
+    def state(self):
+        """ The state the group should be in. """
+        return self.group_on if self._on else self.group_off
+
+    def _read_members(self):
+        """ Finds the members that are on. Lock should be held. """
+        self._on = {entity_id for entity_id in self.entity_ids
+                    if self.hass.states.is_state(entity_id, self.group_on)}
+
+    # pylint: disable=unused-argument
+    def _member_changed(self, entity_id, old_state, new_state):
+        """ Updates the members that are on based on a state change of a
+            member. """
+        with self._lock:
+            was_on = bool(self._on)
+
+            if new_state.state == self.group_on:
+                self._on.add(entity_id)
+
+            else:
+                self._on.discard(entity_id)
+
+            # Only the first member turning on or the last turning off
+            # changes the group state
+            if bool(self._on) != was_on:
+                self._set_state()
+
+
+class AggregateGroup(BaseGroup):
+    """ Keeps the state of a group at an aggregate of the states of its
+        members.
+
+    Remembers the value each member contributes, so a state change of a
+    member only removes its old value from the aggregate and adds the new
+    one. """
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, hass, entity_id, entity_ids, auto, aggregate):
+        super().__init__(hass, entity_id, entity_ids, auto)
+        self.aggregate_type = AGGREGATE_TYPES[aggregate]
+        self.aggregate = self.aggregate_type()
+        self.state_attr[ATTR_AGGREGATE] = aggregate
+        self._values = {}
+        self._last_state = None
+
+    @property
+    def state(self):
+        """ The state the group should be in. """
+        value = self.aggregate.value
+
+        return STATE_UNKNOWN if value is None else str(value)
+
+    def _read_members(self):
+        """ Adds the values of all members to a new aggregate.
+            Lock should be held. """
+        self.aggregate = self.aggregate_type()
+        self._values = {}
+
+        for entity_id in set(self.entity_ids):
+            state = self.hass.states.get(entity_id)
+
+            if state is None:
+                continue
+
+            value = self.aggregate.parse(state.state)
+
+            if value is not None:
+                self.aggregate.add(value)
+                self._values[entity_id] = value
+
+            unit = state.attributes.get(ATTR_UNIT_OF_MEASUREMENT)
+
+            if unit is not None and self.aggregate.keeps_unit:
+                self.state_attr[ATTR_UNIT_OF_MEASUREMENT] = unit
+
+    # pylint: disable=unused-argument
+    def _member_changed(self, entity_id, old_state, new_state):
+        """ Replaces the value of the changed member in the aggregate. """
+        value = self.aggregate.parse(new_state.state)
+
+        with self._lock:
+            old_value = self._values.get(entity_id)
+
+            if value == old_value:
+                return
+
+            if old_value is not None:
+                self.aggregate.remove(old_value)
+                del self._values[entity_id]
+
+            if value is not None:
+                self.aggregate.add(value)
+                self._values[entity_id] = value
+
+            self._set_state()
+
+    def _set_state(self):
+        """ Sets the group state if it changed. Lock should be held. """
+        state = self.state
+
+        if state != self._last_state:
+            self._last_state = state
+
+            super()._set_state()
+
+
+class Aggregate(object):
+    """ Base class for aggregates over the states of group members.
+
+    Subclasses are updated incrementally: add is called with the value of
+    a member that joins the aggregate and remove with the value of a member
+    that leaves it. """
+
+    # If the aggregate has the same unit as the values it aggregates
+    keeps_unit = True
+
+    @staticmethod
+    def parse(state):
+        """ Returns the value state contributes or None if it should be
+            left out of the aggregate. """
+        try:
+            return float(state)
+
+        except ValueError:
+            return None
+
+    def add(self, value):
+        """ Adds value to the aggregate. """
+        raise NotImplementedError()
+
+    def remove(self, value):
+        """ Removes a value that has been added before. """
+        raise NotImplementedError()
+
+    @property
+    def value(self):
+        """ The current value of the aggregate, None if unknown. """
+        raise NotImplementedError()
+
+
+class MinAggregate(Aggregate):
+    """ Minimum of the values. Keeps the values in a heap. Removed values
+        are dropped from the heap once they reach the top. Values below the
+        top might never get there, so the heap is rebuilt from the values
+        that have not been removed once it is more than twice as big. """
+
+    # Sign to store values in the heap with
+    sign = 1
+
+    def __init__(self):
+        self._heap = []
+        self._removed = Counter()
+        self._count = 0
+
+    def add(self, value):
+        """ Adds value to the aggregate. """
+        heapq.heappush(self._heap, self.sign * value)
+        self._count += 1
+
+    def remove(self, value):
+        """ Removes a value that has been added before. """
+        self._removed[self.sign * value] += 1
+        self._count -= 1
+
+        if len(self._heap) > 2 * self._count:
+            self._compact()
+
+    def _compact(self):
+        """ Rebuilds the heap without the removed values. """
+        removed = self._removed
+        heap = []
+
+        for value in self._heap:
+            if removed[value]:
+                removed[value] -= 1
+
+            else:
+                heap.append(value)
+
+        heapq.heapify(heap)
+
+        self._heap = heap
+        self._removed = Counter()
+
+    @property
+    def value(self):
+        """ The current value of the aggregate, None if unknown. """
+        heap, removed = self._heap, self._removed
+
+        while heap and removed[heap[0]]:
+            removed[heap[0]] -= 1
+
+            if not removed[heap[0]]:
+                del removed[heap[0]]
+
+            heapq.heappop(heap)
+
+        return self.sign * heap[0] if heap else None
+
+
+class MaxAggregate(MinAggregate):
+    """ Maximum of the values. """
+
+    sign = -1
+
+
+class MeanAggregate(Aggregate):
+    """ Mean of the values, rounded to two decimals. Keeps a running sum. """
+
+    def __init__(self):
+        self._sum = 0
+        self._count = 0
+
+    def add(self, value):
+        """ Adds value to the aggregate. """
+        self._sum += value
+        self._count += 1
+
+    def remove(self, value):
+        """ Removes a value that has been added before. """
+        self._sum -= value
+        self._count -= 1
+
+    @property
+    def value(self):
+        """ The current value of the aggregate, None if unknown. """
+        return round(self._sum / self._count, 2) if self._count else None
+
+
+class CountAggregate(Aggregate):
+    """ Number of members that are in one of the ACTIVE_STATES. """
+
+    keeps_unit = False
+
+    def __init__(self):
+        self._count = 0
+
+    @staticmethod
+    def parse(state):
+        """ Returns 1 if state is active, None otherwise. """
+        return 1 if state in ACTIVE_STATES else None
+
+    def add(self, value):
+        """ Adds value to the aggregate. """
+        self._count += 1
+
+    def remove(self, value):
+        """ Removes a value that has been added before. """
+        self._count -= 1
+
+    @property
+    def value(self):
+        """ The current value of the aggregate. """
+        return self._count
+
+
+# Dict mapping aggregate name => Aggregate subclass
+AGGREGATE_TYPES = {
+    "min": MinAggregate,
+    "max": MaxAggregate,
+    "mean": MeanAggregate,
+    "count": CountAggregate
+}
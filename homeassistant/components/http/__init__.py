@@ -9,11 +9,16 @@ By default it will run on port 8123.
 All API calls have to be accompanied by an 'api_password' parameter and will
 return JSON. If successful calls will return status code 200 or 201.
 
+Clients that send the header 'Accept: application/x-msgpack' get responses in
+the binary wire format of homeassistant.wire instead. Request bodies in that
+format are accepted when sent with the matching Content-Type header.
+
 Other status codes that can occur are:
  - 400 (Bad Request)
  - 401 (Unauthorized)
  - 404 (Not Found)
  - 405 (Method not allowed)
+ - 413 (Request entity too large)
 
 The api supports the following actions:
 
@@ -32,6 +37,11 @@ Example result:
     { .. state object .. }
 ]
 
+Optional parameters to limit the result, each a comma seperated list:
+domain - only return states of entities within these domains
+entity_id - only return states of these entities
+fields - only return these keys of each state, ie. entity_id,state
+
 /api/states/<entity_id> - GET
 Returns the current state from an entity
 Example result:
@@ -61,6 +71,20 @@ Example result:
     "state": "below_horizon"
 }
 
+/api/states - POST
+Updates the state of multiple entities in one transaction. Returns a list with
+the result for each entity, in the order they were given. Status is 201 for
+new entities, 200 for updated entities or 400/422 if the item was invalid.
+parameter: states - list of objects with entity_id, state and attributes
+Example result:
+[
+    {
+        "entity_id": "weather.sun",
+        "state": { .. state object .. },
+        "status": 200
+    }
+]
+
 /api/events/<event_type> - POST
 Fires an event with event_type
 optional parameter: event_data - JSON encoded object
@@ -69,6 +93,27 @@ Example result:
     "message": "Event download_file fired."
 }
 
+/api/batch - POST
+Dispatches a list of service calls and event fires. Like the single call
+endpoints it does not wait for them to be handled, so they are not handled in
+any particular order and can be handled at the same time. Returns a list with
+the result for each item.
+parameter: batch - list of objects that are either
+  {"type": "service", "domain": .., "service": .., "service_data": {..}} or
+  {"type": "event", "event_type": .., "event_data": {..}}
+Example result:
+[
+    {
+        "message": "Service light/turn_on called.",
+        "status": 200
+    }
+]
+
+/api/metrics - GET
+Returns the metrics that Home Assistant collected in the Prometheus text
+format. Metrics are only collected if metrics=1 is set in the homeassistant
+section of the config.
+
 """
 
 import json
@@ -85,6 +130,8 @@ from urllib.parse import urlparse, parse_qs
 import homeassistant as ha
 import homeassistant.remote as rem
 import homeassistant.util as util
+import homeassistant.wire as wire
+import homeassistant.metrics as metrics
 from . import frontend
 
 DOMAIN = "http"
@@ -97,6 +144,7 @@ HTTP_BAD_REQUEST = 400
 HTTP_UNAUTHORIZED = 401
 HTTP_NOT_FOUND = 404
 HTTP_METHOD_NOT_ALLOWED = 405
+HTTP_REQUEST_ENTITY_TOO_LARGE = 413
 HTTP_UNPROCESSABLE_ENTITY = 422
 
 URL_ROOT = "/"
@@ -107,6 +155,14 @@ CONF_API_PASSWORD = "api_password"
 CONF_SERVER_HOST = "server_host"
 CONF_SERVER_PORT = "server_port"
 CONF_DEVELOPMENT = "development"
+CONF_SERVER_BACKEND = "server_backend"
+CONF_MAX_BODY_SIZE = "max_body_size"
+
+# Default maximum size in bytes of a request body
+DEFAULT_MAX_BODY_SIZE = 1024 * 1024
+
+SERVER_BACKEND_THREADED = "threaded"
+SERVER_BACKEND_ASYNCIO = "asyncio"
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -123,22 +179,46 @@ def setup(hass, config):
     # If no server host is given, accept all incoming requests
     server_host = config[DOMAIN].get(CONF_SERVER_HOST, '0.0.0.0')
 
-    server_port = config[DOMAIN].get(CONF_SERVER_PORT, rem.SERVER_PORT)
+    server_port = util.convert(config[DOMAIN].get(CONF_SERVER_PORT), int,
+                               rem.SERVER_PORT)
 
     development = config[DOMAIN].get(CONF_DEVELOPMENT, "") == "1"
 
-    server = HomeAssistantHTTPServer((server_host, server_port),
-                                     RequestHandler, hass, api_password,
-                                     development)
+    max_body_size = util.convert(config[DOMAIN].get(CONF_MAX_BODY_SIZE),
+                                 int, DEFAULT_MAX_BODY_SIZE)
 
-    hass.listen_once_event(
-        ha.EVENT_HOMEASSISTANT_START,
+    server_backend = config[DOMAIN].get(
+        CONF_SERVER_BACKEND, SERVER_BACKEND_THREADED)
+
+    if server_backend == SERVER_BACKEND_THREADED:
+        server_class = HomeAssistantHTTPServer
+
+    elif server_backend == SERVER_BACKEND_ASYNCIO:
+        # Only import asyncio when it is used
+        from .async_server import HomeAssistantAsyncHTTPServer
+
+        server_class = HomeAssistantAsyncHTTPServer
+
+    else:
+        _LOGGER.error("Unknown server backend specified: %s", server_backend)
+
+        return False
+
+    server = server_class((server_host, server_port),
+                          RequestHandler, hass, api_password, development,
+                          max_body_size)
+
+    # Also starts the server if it is set up again after a config reload
+    hass.track_start(
         lambda event:
         threading.Thread(target=server.start, daemon=True).start())
 
     hass.listen_once_event(
         ha.EVENT_HOMEASSISTANT_STOP,
-        lambda event: server.shutdown())
+        lambda event: server.stop())
+
+    # Releases the port so the server can be set up again
+    hass.register_unload(server.stop)
 
     # If no local api set, set one with known information
     if isinstance(hass, rem.HomeAssistant) and hass.local_api is None:
@@ -150,34 +230,61 @@ def setup(hass, config):
 
 class HomeAssistantHTTPServer(ThreadingMixIn, HTTPServer):
     """ Handle HTTP requests in a threaded fashion. """
-    # pylint: disable=too-few-public-methods
+    # pylint: disable=too-few-public-methods, too-many-instance-attributes
 
     allow_reuse_address = True
     daemon_threads = True
 
     # pylint: disable=too-many-arguments
     def __init__(self, server_address, RequestHandlerClass,
-                 hass, api_password, development=False):
+                 hass, api_password, development=False, max_body_size=None):
         super().__init__(server_address, RequestHandlerClass)
 
         self.server_address = server_address
         self.hass = hass
         self.api_password = api_password
         self.development = development
+        self.max_body_size = max_body_size
 
         # We will lazy init this one if needed
         self.event_forwarder = None
 
+        # Protects that the server is not started after it has been stopped
+        self._state_lock = threading.Lock()
+        self._started = False
+        self._stopped = False
+
         if development:
             _LOGGER.info("running frontend in development mode")
 
     def start(self):
         """ Starts the server. """
+        with self._state_lock:
+            if self._stopped:
+                return
+
+            self._started = True
+
         _LOGGER.info(
             "Starting web interface at http://%s:%d", *self.server_address)
 
         self.serve_forever()
 
+    def stop(self):
+        """ Stops the server and closes the listening socket. """
+        with self._state_lock:
+            if self._stopped:
+                return
+
+            self._stopped = True
+
+            # shutdown blocks until serve_forever returns, so only call it
+            # if serve_forever has been or is about to be called
+            if self._started:
+                self.shutdown()
+
+        self.server_close()
+
 
 # pylint: disable=too-many-public-methods
 class RequestHandler(SimpleHTTPRequestHandler):
@@ -199,6 +306,7 @@ class RequestHandler(SimpleHTTPRequestHandler):
 
         # /states
         ('GET', rem.URL_API_STATES, '_handle_get_api_states'),
+        ('POST', rem.URL_API_STATES, '_handle_post_api_states'),
         ('GET',
          re.compile(r'/api/states/(?P<entity_id>[a-zA-Z\._0-9]+)'),
          '_handle_get_api_states_entity'),
@@ -223,6 +331,12 @@ class RequestHandler(SimpleHTTPRequestHandler):
                      r'(?P<service>[a-zA-Z\._0-9]+)')),
          '_handle_post_api_services_domain_service'),
 
+        # /batch
+        ('POST', rem.URL_API_BATCH, '_handle_post_api_batch'),
+
+        # /metrics
+        ('GET', rem.URL_API_METRICS, '_handle_get_api_metrics'),
+
         # /event_forwarding
         ('POST', rem.URL_API_EVENT_FORWARD, '_handle_post_api_event_forward'),
         ('DELETE', rem.URL_API_EVENT_FORWARD,
@@ -250,24 +364,18 @@ class RequestHandler(SimpleHTTPRequestHandler):
             data[key] = data[key][-1]
 
         # Did we get post input ?
-        content_length = int(self.headers.get('Content-Length', 0))
+        body_content = self._read_body()
 
-        if content_length:
-            body_content = self.rfile.read(content_length).decode("UTF-8")
+        if body_content is None:
+            return
 
-            if self.use_json:
-                try:
-                    data.update(json.loads(body_content))
-                except ValueError:
-                    _LOGGER.exception("Exception parsing JSON: %s",
-                                      body_content)
+        elif body_content:
+            body_data = self._parse_body(body_content)
 
-                    self._message(
-                        "Error parsing JSON", HTTP_UNPROCESSABLE_ENTITY)
-                    return
-            else:
-                data.update({key: value[-1] for key, value in
-                             parse_qs(body_content).items()})
+            if body_data is None:
+                return
+
+            data.update(body_data)
 
         api_password = self.headers.get(rem.AUTH_HEADER)
 
@@ -319,6 +427,69 @@ class RequestHandler(SimpleHTTPRequestHandler):
         else:
             self.send_response(HTTP_NOT_FOUND)
 
+    def _read_body(self):
+        """ Reads the request body while enforcing the maximum body size.
+            Returns the body as bytes or None if the body was rejected and a
+            response has been sent. """
+        content_length = util.convert(
+            self.headers.get('Content-Length', 0), int, -1)
+
+        max_body_size = self.server.max_body_size
+
+        # Reject bad or too big bodies before reading them. We will not read
+        # the body so the connection cannot be reused.
+        if content_length < 0:
+            self.close_connection = True
+            self._message("Invalid Content-Length", HTTP_BAD_REQUEST)
+            return None
+
+        elif max_body_size is not None and content_length > max_body_size:
+            self.close_connection = True
+            self._message(
+                "Request body exceeds {} bytes".format(max_body_size),
+                HTTP_REQUEST_ENTITY_TOO_LARGE)
+            return None
+
+        body_content = self.rfile.read(content_length) \
+            if content_length else b''
+
+        if len(body_content) < content_length:
+            self.close_connection = True
+            self._message("Incomplete request body", HTTP_BAD_REQUEST)
+            return None
+
+        return body_content
+
+    def _parse_body(self, body_content):
+        """ Parses the request body. Returns a dict with the body data or
+            None if the body could not be parsed and a response has been
+            sent. """
+        if not self.use_json:
+            return {key: value[-1] for key, value in
+                    parse_qs(body_content.decode("UTF-8")).items()}
+
+        try:
+            if self.headers.get('Content-Type', '').startswith(
+                    wire.CONTENT_TYPE):
+                body_data = wire.unpack(body_content)
+
+            else:
+                # json only accepts bytes from Python 3.6 on. Decoding
+                # errors are ValueErrors and handled below.
+                body_data = json.loads(body_content.decode('UTF-8'))
+
+            if not isinstance(body_data, dict):
+                raise ValueError("Body is not a JSON object")
+
+            return body_data
+
+        except ValueError:
+            _LOGGER.exception("Exception parsing JSON: %s",
+                              body_content[:200])
+
+            self._message("Error parsing JSON", HTTP_UNPROCESSABLE_ENTITY)
+            return None
+
     def do_HEAD(self):  # pylint: disable=invalid-name
         """ HEAD request handler. """
         self._handle_request('HEAD')
@@ -381,8 +552,20 @@ class RequestHandler(SimpleHTTPRequestHandler):
 
     # pylint: disable=unused-argument
     def _handle_get_api_states(self, path_match, data):
-        """ Returns a dict containing all entity ids and their state. """
-        self._write_json(self.server.hass.states.all())
+        """ Returns a list of states. Optional query parameters domain and
+            entity_id filter the states, fields limits the returned keys.
+            Each parameter accepts a comma seperated list. """
+        domains, entity_ids, fields = (
+            _list_param(data.get(key)) for key in ('domain', 'entity_id',
+                                                   'fields'))
+
+        if fields is not None and not set(fields) <= set(ha.State.__slots__):
+            self._message("Invalid fields specified",
+                          HTTP_UNPROCESSABLE_ENTITY)
+            return
+
+        self._write_json(
+            self.server.hass.states.as_dicts(domains, entity_ids, fields))
 
     # pylint: disable=unused-argument
     def _handle_get_api_states_entity(self, path_match, data):
@@ -431,6 +614,60 @@ class RequestHandler(SimpleHTTPRequestHandler):
             self._message(
                 "State of {} changed to {}".format(entity_id, new_state))
 
+    def _handle_post_api_states(self, path_match, data):
+        """ Handles updating the state of multiple entities at once.
+
+        This handles the following paths:
+        /api/states
+        """
+        try:
+            items = data['states']
+        except KeyError:
+            self._message("states not specified", HTTP_BAD_REQUEST)
+            return
+
+        if not isinstance(items, list):
+            self._message("states should be a list",
+                          HTTP_UNPROCESSABLE_ENTITY)
+            return
+
+        results = []
+        updates = []
+
+        for item in items:
+            if not isinstance(item, dict) or \
+               'entity_id' not in item or 'state' not in item:
+
+                results.append({'status': HTTP_BAD_REQUEST,
+                                'message': "entity_id or state not specified"})
+
+            elif not isinstance(item['entity_id'], str) or \
+                    not ha.ENTITY_ID_PATTERN.match(item['entity_id']) or \
+                    not isinstance(item.get('attributes') or {}, dict):
+
+                results.append({'entity_id': item['entity_id'],
+                                'status': HTTP_UNPROCESSABLE_ENTITY,
+                                'message': "Invalid entity_id or attributes"})
+
+            else:
+                # Placeholder, filled in after the states have been set
+                results.append(None)
+                updates.append((item['entity_id'], item['state'],
+                                item.get('attributes')))
+
+        set_results = iter(self.server.hass.states.set_multiple(updates))
+
+        for index, result in enumerate(results):
+            if result is None:
+                state, is_new = next(set_results)
+
+                results[index] = {
+                    'entity_id': state.entity_id,
+                    'status': HTTP_CREATED if is_new else HTTP_OK,
+                    'state': state}
+
+        self._write_json(results)
+
     def _handle_get_api_events(self, path_match, data):
         """ Handles getting overview of event listeners. """
         self._write_json([{"event": key, "listener_count": value}
@@ -451,20 +688,28 @@ class RequestHandler(SimpleHTTPRequestHandler):
             self._message("event_data should be an object",
                           HTTP_UNPROCESSABLE_ENTITY)
 
-        event_origin = ha.EventOrigin.remote
+        self._fire_remote_event(event_type, event_data)
+
+        self._message("Event {} fired.".format(event_type))
+
+    def _fire_remote_event(self, event_type, event_data):
+        """ Fires an event received via the API as a remote event. """
 
         # Special case handling for event STATE_CHANGED
         # We will try to convert state dicts back to State objects
         if event_type == ha.EVENT_STATE_CHANGED and event_data:
             for key in ('old_state', 'new_state'):
-                state = ha.State.from_dict(event_data.get(key))
+                state = event_data.get(key)
+
+                # States are already decoded by the binary wire format
+                if not isinstance(state, ha.State):
+                    state = ha.State.from_dict(state)
 
                 if state:
                     event_data[key] = state
 
-        self.server.hass.bus.fire(event_type, event_data, event_origin)
-
-        self._message("Event {} fired.".format(event_type))
+        self.server.hass.bus.fire(event_type, event_data,
+                                  ha.EventOrigin.remote)
 
     def _handle_get_api_services(self, path_match, data):
         """ Handles getting overview of services. """
@@ -487,6 +732,99 @@ class RequestHandler(SimpleHTTPRequestHandler):
 
         self._message("Service {}/{} called.".format(domain, service))
 
+    def _handle_post_api_batch(self, path_match, data):
+        """ Handles dispatching a list of service calls and event fires.
+        Handling them happens in the worker pool and is not ordered.
+
+        This handles the following paths:
+        /api/batch
+        """
+        try:
+            items = data['batch']
+        except KeyError:
+            self._message("batch not specified", HTTP_BAD_REQUEST)
+            return
+
+        if not isinstance(items, list):
+            self._message("batch should be a list",
+                          HTTP_UNPROCESSABLE_ENTITY)
+            return
+
+        results = []
+
+        for item in items:
+            if not isinstance(item, dict):
+                item = {}
+
+            item_type = item.get('type')
+
+            if item_type == rem.BATCH_TYPE_SERVICE and \
+               'domain' in item and 'service' in item:
+
+                service_data = item.get('service_data') or {}
+
+                if not isinstance(item['domain'], str) or \
+                   not isinstance(item['service'], str):
+
+                    results.append({
+                        'status': HTTP_UNPROCESSABLE_ENTITY,
+                        'message': "domain and service should be strings"})
+                    continue
+
+                if not isinstance(service_data, dict):
+                    results.append({
+                        'status': HTTP_UNPROCESSABLE_ENTITY,
+                        'message': "service_data should be an object"})
+                    continue
+
+                self.server.hass.call_service(
+                    item['domain'], item['service'], service_data)
+
+                results.append({
+                    'status': HTTP_OK,
+                    'message': "Service {}/{} called.".format(
+                        item['domain'], item['service'])})
+
+            elif item_type == rem.BATCH_TYPE_EVENT and 'event_type' in item:
+                event_data = item.get('event_data')
+
+                if not isinstance(item['event_type'], str):
+                    results.append({
+                        'status': HTTP_UNPROCESSABLE_ENTITY,
+                        'message': "event_type should be a string"})
+                    continue
+
+                if event_data is not None and \
+                   not isinstance(event_data, dict):
+
+                    results.append({
+                        'status': HTTP_UNPROCESSABLE_ENTITY,
+                        'message': "event_data should be an object"})
+                    continue
+
+                self._fire_remote_event(item['event_type'], event_data)
+
+                results.append({
+                    'status': HTTP_OK,
+                    'message': "Event {} fired.".format(item['event_type'])})
+
+            else:
+                results.append({'status': HTTP_BAD_REQUEST,
+                                'message': "Invalid batch item"})
+
+        self._write_json(results)
+
+    def _handle_get_api_metrics(self, path_match, data):
+        """ Returns the collected metrics in the Prometheus text format. """
+        content = self.server.hass.metrics.to_prometheus().encode("UTF-8")
+
+        self.send_response(HTTP_OK)
+        self.send_header('Content-type', metrics.CONTENT_TYPE_PROMETHEUS)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+
+        self.wfile.write(content)
+
     # pylint: disable=invalid-name
     def _handle_post_api_event_forward(self, path_match, data):
         """ Handles adding an event forwarding target. """
@@ -617,16 +955,35 @@ class RequestHandler(SimpleHTTPRequestHandler):
         self.end_headers()
 
     def _write_json(self, data=None, status_code=HTTP_OK, location=None):
-        """ Helper method to return JSON to the caller. """
+        """ Helper method to return JSON to the caller.
+            Uses the binary wire format instead if the caller accepts it. """
+        use_binary = wire.CONTENT_TYPE in self.headers.get('Accept', '')
+
         self.send_response(status_code)
-        self.send_header('Content-type', 'application/json')
+        self.send_header('Content-type', wire.CONTENT_TYPE if use_binary
+                         else rem.CONTENT_TYPE_JSON)
 
         if location:
             self.send_header('Location', location)
 
         self.end_headers()
 
-        if data is not None:
+        if data is None:
+            pass
+
+        elif use_binary:
+            self.wfile.write(wire.pack(data))
+
+        else:
             self.wfile.write(
                 json.dumps(data, indent=4, sort_keys=True,
                            cls=rem.JSONEncoder).encode("UTF-8"))
+
+
+def _list_param(value):
+    """ Converts a comma seperated query parameter to a list.
+        Returns None if value is None. """
+    if value is None or isinstance(value, list):
+        return value
+
+    return [item.strip() for item in str(value).split(",") if item.strip()]
@@ -0,0 +1,272 @@
+"""
+homeassistant.components.http.async_server
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Asyncio based server backend for the HTTP component.
+
+Every connection is served by a coroutine instead of a thread, which makes
+holding many idle keep-alive connections cheap. Complete requests are
+handed to the same RequestHandler as the threaded server uses, so both
+backends share the route table and handlers.
+"""
+import asyncio
+import io
+import logging
+import threading
+import http.client
+from concurrent.futures import ThreadPoolExecutor
+
+import homeassistant.util as util
+
+# Seconds an idle keep-alive connection is kept open
+KEEP_ALIVE_TIMEOUT = 300
+
+# Maximum size in bytes of the request line plus headers
+MAX_HEADER_SIZE = 65536
+
+# Number of threads that run request handlers
+HANDLER_THREAD_COUNT = 4
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class HomeAssistantAsyncHTTPServer(object):
+    """ Handle HTTP requests from an asyncio event loop. """
+    # pylint: disable=too-many-instance-attributes
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, server_address, RequestHandlerClass,
+                 hass, api_password, development=False, max_body_size=None):
+        self.server_address = server_address
+        self.hass = hass
+        self.api_password = api_password
+        self.development = development
+        self.max_body_size = max_body_size
+
+        # We will lazy init this one if needed
+        self.event_forwarder = None
+
+        self._handler_class = _buffered_handler(RequestHandlerClass)
+        self._executor = ThreadPoolExecutor(HANDLER_THREAD_COUNT)
+        self._tasks = set()
+
+        # Protects that the loop is not started after it has been stopped
+        self._state_lock = threading.Lock()
+        self._started = False
+        self._stopping = False
+        self._closed = threading.Event()
+
+        # Bind now so errors surface during setup like with HTTPServer
+        self._loop = asyncio.new_event_loop()
+        self._server = self._loop.run_until_complete(asyncio.start_server(
+            self._connection_made, server_address[0], server_address[1],
+            reuse_address=True, limit=MAX_HEADER_SIZE))
+
+        if development:
+            _LOGGER.info("running frontend in development mode")
+
+    def start(self):
+        """ Starts the server. """
+        with self._state_lock:
+            if self._stopping:
+                return
+
+            self._started = True
+
+        _LOGGER.info(
+            "Starting asyncio web interface at http://%s:%d",
+            *self.server_address)
+
+        asyncio.set_event_loop(self._loop)
+
+        try:
+            self._loop.run_forever()
+        finally:
+            self._close()
+
+    def stop(self):
+        """ Stops the server, closes all open connections and the listening
+            socket. Blocks until the server has stopped. """
+        with self._state_lock:
+            if self._stopping:
+                return
+
+            self._stopping = True
+
+        if self._started:
+            asyncio.run_coroutine_threadsafe(self._stop(), self._loop)
+
+        else:
+            self._server.close()
+            self._loop.run_until_complete(self._server.wait_closed())
+            self._close()
+
+        self._closed.wait()
+
+    def _close(self):
+        """ Closes the loop once it has stopped. """
+        self._loop.close()
+        self._executor.shutdown(wait=False)
+        self._closed.set()
+
+    async def _stop(self):
+        """ Closes the listening socket and connections, stops the loop. """
+        self._server.close()
+
+        # Cancelling a task closes its connection
+        tasks = list(self._tasks)
+
+        for task in tasks:
+            task.cancel()
+
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        await self._server.wait_closed()
+
+        self._loop.stop()
+
+    def _connection_made(self, reader, writer):
+        """ Starts serving a new connection in a task that is tracked so
+            it can be cancelled when the server stops. """
+        task = self._loop.create_task(self._handle_connection(reader, writer))
+
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _handle_connection(self, reader, writer):
+        """ Serves requests on a connection until it is closed. """
+        peer = writer.get_extra_info('peername')
+        loop = asyncio.get_event_loop()
+
+        try:
+            while True:
+                request = await _read_request(reader, self.max_body_size)
+
+                if request is None:
+                    break
+
+                raw_request, keep_alive = request
+
+                response = await loop.run_in_executor(
+                    self._executor, self._process_request, raw_request, peer)
+
+                writer.write(_finalize_response(response, keep_alive))
+                await writer.drain()
+
+                if not keep_alive:
+                    break
+
+        except ConnectionError:
+            pass
+
+        except asyncio.CancelledError:  # pylint: disable=try-except-raise
+            # Before Python 3.8 this is an Exception
+            raise
+
+        except Exception:  # pylint: disable=broad-except
+            _LOGGER.exception("Error serving connection from %s", peer)
+
+        finally:
+            writer.close()
+
+    def _process_request(self, raw_request, client_address):
+        """ Runs the request handler on a buffered request.
+            Returns the raw response, which is empty if the handler failed.
+        """
+        try:
+            return self._handler_class(
+                raw_request, client_address, self).wfile.getvalue()
+
+        except Exception:  # pylint: disable=broad-except
+            # An empty response is turned into a 500 by _finalize_response
+            _LOGGER.exception("Error handling request from %s",
+                              client_address)
+
+            return b''
+
+
+async def _read_request(reader, max_body_size):
+    """ Reads the next request from reader.
+        Returns tuple (raw_request, keep_alive) or None if the connection
+        has been closed or timed out.
+
+        Bodies that are bigger than max_body_size or have an invalid length
+        are not read. The request handler will reject the request based on
+        its headers and the connection will be closed. """
+    try:
+        head = await asyncio.wait_for(
+            reader.readuntil(b'\r\n\r\n'), KEEP_ALIVE_TIMEOUT)
+
+        request_line, _, header_data = head.partition(b'\r\n')
+
+        headers = http.client.parse_headers(io.BytesIO(header_data))
+
+        content_length = util.convert(
+            headers.get('Content-Length', 0), int, -1)
+
+        if content_length < 0 or (max_body_size is not None and
+                                  content_length > max_body_size):
+            return head, False
+
+        body = await reader.readexactly(content_length) \
+            if content_length > 0 else b''
+
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+            asyncio.TimeoutError, http.client.HTTPException):
+        return None
+
+    connection = headers.get('Connection', '').lower()
+
+    if request_line.rstrip().endswith(b'HTTP/1.1'):
+        keep_alive = connection != 'close'
+    else:
+        keep_alive = connection == 'keep-alive'
+
+    return head + body, keep_alive
+
+
+def _finalize_response(response, keep_alive):
+    """ Rewrites the status line and framing headers of a response
+        generated by the request handler so it can be sent over a
+        keep-alive connection. """
+    head, _, body = response.partition(b'\r\n\r\n')
+
+    lines = head.split(b'\r\n')
+
+    if not lines[0].startswith(b'HTTP/'):
+        lines = [b'HTTP/1.1 500 Internal Server Error']
+        body = b''
+
+    status = b'HTTP/1.1' + lines[0][lines[0].index(b' '):]
+
+    headers = [line for line in lines[1:]
+               if not line.lower().startswith((b'content-length:',
+                                               b'connection:'))]
+
+    headers.append('Content-Length: {}'.format(len(body)).encode())
+    headers.append(b'Connection: keep-alive' if keep_alive
+                   else b'Connection: close')
+
+    return b'\r\n'.join([status] + headers) + b'\r\n\r\n' + body
+
+
+def _buffered_handler(handler_class):
+    """ Returns a subclass of handler_class that reads the request from a
+        bytes object and writes the response to a buffer. """
+
+    class BufferedRequestHandler(handler_class):
+        """ Request handler that works on in-memory buffers. """
+
+        def setup(self):
+            """ Sets up buffers instead of socket files. """
+            # pylint: disable=attribute-defined-outside-init
+            self.rfile = io.BytesIO(self.request)
+            self.wfile = io.BytesIO()
+
+        def finish(self):
+            """ Flushes headers that have not been sent yet. """
+            # Some handlers only send a response code
+            if getattr(self, '_headers_buffer', None):
+                self.end_headers()
+
+    return BufferedRequestHandler
@@ -130,8 +130,10 @@ def setup(hass, config):
         hass.states.set(ENTITY_ID, new_state, state_attributes)
 
         # +1 second so Ephem will report it has set
-        hass.track_point_in_time(update_sun_state,
-                                 next_change + timedelta(seconds=1))
+        # Scheduled within our context so it is removed when sun is unloaded
+        with hass.component_context(DOMAIN):
+            hass.track_point_in_time(update_sun_state,
+                                     next_change + timedelta(seconds=1))
 
     update_sun_state(datetime.now())
 
@@ -19,8 +19,8 @@ import pkgutil
 import importlib
 import logging
 
-# List of available components
-AVAILABLE_COMPONENTS = []
+# Set of available components
+AVAILABLE_COMPONENTS = set()
 
 # Dict of loaded components mapped name => module
 _COMPONENT_CACHE = {}
@@ -35,7 +35,7 @@ def prepare(hass):
 
     AVAILABLE_COMPONENTS.clear()
 
-    AVAILABLE_COMPONENTS.extend(
+    AVAILABLE_COMPONENTS.update(
         item[1] for item in
         pkgutil.iter_modules(components.__path__, 'homeassistant.components.'))
 
@@ -44,7 +44,8 @@ def prepare(hass):
 
     if os.path.isdir(custom_path):
         # Ensure we can load custom components using Pythons import
-        sys.path.insert(0, hass.config_dir)
+        if hass.config_dir not in sys.path:
+            sys.path.insert(0, hass.config_dir)
 
         # We cannot use the same approach as for built-in components because
         # custom components might only contain a platform for a component.
@@ -56,10 +57,10 @@ def prepare(hass):
         # just might output more errors.
         for fil in os.listdir(custom_path):
             if os.path.isdir(os.path.join(custom_path, fil)):
-                AVAILABLE_COMPONENTS.append('custom_components.{}'.format(fil))
+                AVAILABLE_COMPONENTS.add('custom_components.{}'.format(fil))
 
             else:
-                AVAILABLE_COMPONENTS.append(
+                AVAILABLE_COMPONENTS.add(
                     'custom_components.{}'.format(fil[0:-3]))
 
 
@@ -0,0 +1,246 @@
+"""
+homeassistant.metrics
+~~~~~~~~~~~~~~~~~~~~~
+
+Counters and histograms that show where Home Assistant spends its time.
+
+The core records events fired per type, the number of listeners each event
+is handed to, how long jobs wait in the worker pool queue and run, and how
+long service calls take. The device tracker records how long scans take.
+Collecting is disabled by default; while disabled every measuring point
+costs no more than checking a flag.
+
+The collected values can be rendered in the Prometheus text format, which
+includes the run time of the slowest jobs as gauges.
+"""
+import heapq
+import threading
+import time
+from collections import defaultdict
+
+# Default histogram buckets, in seconds
+DEFAULT_BUCKETS = (.001, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+
+# Buckets for the number of listeners an event is handed to
+FAN_OUT_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64)
+
+# Number of slowest jobs to remember
+SLOWEST_JOB_COUNT = 10
+
+METRIC_EVENTS_FIRED = "homeassistant_events_fired_total"
+METRIC_EVENT_FAN_OUT = "homeassistant_event_listeners"
+METRIC_JOB_WAIT = "homeassistant_job_wait_seconds"
+METRIC_JOB_RUN = "homeassistant_job_run_seconds"
+METRIC_SERVICE_CALL = "homeassistant_service_call_seconds"
+METRIC_POOL_QUEUE = "homeassistant_pool_queue_depth"
+METRIC_SLOWEST_JOB = "homeassistant_slowest_job_seconds"
+METRIC_DEVICE_SCAN = "homeassistant_device_scan_seconds"
+METRIC_DEVICE_SCANS_SKIPPED = "homeassistant_device_scans_skipped_total"
+
+CONTENT_TYPE_PROMETHEUS = "text/plain; version=0.0.4"
+
+
+class Histogram(object):
+    """ Counts observed values in buckets. """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, value):
+        """ Adds value to the histogram. """
+        self.count += 1
+        self.sum += value
+
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+
+    def cumulative_counts(self):
+        """ Returns list of tuples (upper bound, number of values <= bound).
+        """
+        total = 0
+        result = []
+
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            result.append((bound, total))
+
+        return result
+
+
+class Metrics(object):
+    """ Collects counters, histograms and gauges. """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._counters = defaultdict(int)
+        self._histograms = {}
+        self._gauges = {}
+        self._slowest_jobs = []
+
+    def inc(self, name, value=1, **labels):
+        """ Increases counter name with labels by value. """
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self._counters[name, _label_key(labels)] += value
+
+    def observe(self, name, value, buckets=DEFAULT_BUCKETS, **labels):
+        """ Adds value to histogram name with labels. """
+        if not self.enabled:
+            return
+
+        key = (name, _label_key(labels))
+
+        with self._lock:
+            histogram = self._histograms.get(key)
+
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+
+            histogram.observe(value)
+
+    def add_gauge(self, name, get_value):
+        """ Adds gauge name that is read by calling get_value when the
+            metrics are rendered. """
+        self._gauges[name] = get_value
+
+    def record_event(self, event_type, fan_out):
+        """ Records an event that has been handed to fan_out listeners. """
+        self.inc(METRIC_EVENTS_FIRED, event_type=event_type)
+        self.observe(METRIC_EVENT_FAN_OUT, fan_out, FAN_OUT_BUCKETS,
+                     event_type=event_type)
+
+    def record_service_call(self, domain, service, seconds):
+        """ Records a service call that took seconds from being queued
+            till it finished. """
+        self.observe(METRIC_SERVICE_CALL, seconds,
+                     domain=domain, service=service)
+
+    def record_job(self, name, wait_time, run_time):
+        """ Records a job of the worker pool that ran function name. """
+        if not self.enabled:
+            return
+
+        self.observe(METRIC_JOB_WAIT, wait_time)
+        self.observe(METRIC_JOB_RUN, run_time, listener=name)
+
+        with self._lock:
+            job = (run_time, time.time(), name)
+
+            if len(self._slowest_jobs) < SLOWEST_JOB_COUNT:
+                heapq.heappush(self._slowest_jobs, job)
+            elif job > self._slowest_jobs[0]:
+                heapq.heapreplace(self._slowest_jobs, job)
+
+    @property
+    def slowest_jobs(self):
+        """ List of the slowest jobs, slowest first. Each job is a dict
+            with the listener name, run time and the time it finished. """
+        with self._lock:
+            jobs = sorted(self._slowest_jobs, reverse=True)
+
+        return [{'listener': name, 'run_time': run_time, 'finished': finished}
+                for run_time, finished, name in jobs]
+
+    def get(self, name, **labels):
+        """ Returns the value of a counter or the Histogram of name with
+            labels. Returns None if nothing has been recorded. """
+        key = (name, _label_key(labels))
+
+        with self._lock:
+            if key in self._counters:
+                return self._counters[key]
+
+            return self._histograms.get(key)
+
+    def reset(self):
+        """ Forgets all recorded values. """
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self._slowest_jobs.clear()
+
+    def to_prometheus(self):
+        """ Returns the metrics in the Prometheus text format. """
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items(),
+                                key=lambda item: item[0])
+            slowest_jobs = list(self._slowest_jobs)
+
+        lines = []
+        written = set()
+
+        def write_type(name, metric_type):
+            """ Writes the type line once per metric. """
+            if name not in written:
+                written.add(name)
+                lines.append("# TYPE {} {}".format(name, metric_type))
+
+        for name, get_value in sorted(self._gauges.items()):
+            write_type(name, "gauge")
+            lines.append("{} {}".format(name, get_value()))
+
+        if slowest_jobs:
+            write_type(METRIC_SLOWEST_JOB, "gauge")
+            lines.extend(_format_slowest_jobs(slowest_jobs))
+
+        for (name, labels), value in counters:
+            write_type(name, "counter")
+            lines.append("{}{} {}".format(name, _format_labels(labels),
+                                          value))
+
+        for (name, labels), histogram in histograms:
+            write_type(name, "histogram")
+
+            for bound, count in histogram.cumulative_counts():
+                lines.append("{}_bucket{} {}".format(
+                    name, _format_labels(labels + (('le', bound),)), count))
+
+            lines.append("{}_bucket{} {}".format(
+                name, _format_labels(labels + (('le', '+Inf'),)),
+                histogram.count))
+            lines.append("{}_sum{} {}".format(
+                name, _format_labels(labels), histogram.sum))
+            lines.append("{}_count{} {}".format(
+                name, _format_labels(labels), histogram.count))
+
+        return "\n".join(lines) + "\n"
+
+
+def _format_slowest_jobs(slowest_jobs):
+    """ Returns the gauge lines for slowest_jobs, slowest first. A job can
+        be among the slowest more than once, only its slowest run is written
+        so every label set is unique. """
+    run_times = {}
+
+    for run_time, _, job in slowest_jobs:
+        run_times[job] = max(run_time, run_times.get(job, 0))
+
+    return ["{}{} {}".format(METRIC_SLOWEST_JOB,
+                             _format_labels((('job', job),)), run_time)
+            for job, run_time in sorted(run_times.items(),
+                                        key=lambda item: -item[1])]
+
+
+def _label_key(labels):
+    """ Returns a hashable representation of labels. """
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+def _format_labels(labels):
+    """ Formats labels as {name="value",..}. """
+    if not labels:
+        return ""
+
+    return "{" + ",".join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\')
+                         .replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels) + "}"
@@ -0,0 +1,110 @@
+"""
+homeassistant.profiler
+~~~~~~~~~~~~~~~~~~~~~~
+
+Records where time is spent while Home Assistant starts.
+
+Bootstrap measures config parsing, preparing the loader, importing each
+component and setting up each component. The results can be printed as a
+report or written as a trace file that can be opened in Chrome via
+chrome://tracing.
+"""
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+import homeassistant as ha
+
+# Categories of measurements
+CATEGORY_CONFIG = "config"
+CATEGORY_LOADER = "loader"
+CATEGORY_IMPORT = "import"
+CATEGORY_SETUP = "setup"
+CATEGORY_START = "start"
+
+TRACE_FILE = "startup_trace.json"
+
+
+class StartupProfiler(object):
+    """ Collects timed spans during startup. """
+
+    def __init__(self):
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self._start_fired = None
+        self.spans = []
+
+    @contextmanager
+    def measure(self, category, name):
+        """ Context manager that records how long its body takes. """
+        start = time.perf_counter()
+
+        try:
+            yield
+
+        finally:
+            self.add(category, name, start)
+
+    def add(self, category, name, start, end=None):
+        """ Records a span that started at start (perf_counter value). """
+        end = time.perf_counter() if end is None else end
+
+        with self._lock:
+            self.spans.append((category, name, start - self._start,
+                               end - start, threading.get_ident()))
+
+    def track_start(self, hass):
+        """ Records when the start event is handed to the listeners. Should
+            be called before components are set up so that its listener is
+            the first one to be registered. The span is recorded by
+            finish_start. """
+        def start_listener(event):  # pylint: disable=unused-argument
+            """ Remembers when the start event was dispatched. """
+            self._start_fired = time.perf_counter()
+
+        hass.listen_once_event(ha.EVENT_HOMEASSISTANT_START, start_listener)
+
+    def finish_start(self, hass):
+        """ Waits till the listeners of the start event are done and records
+            the time they took. """
+        # pylint: disable=protected-access
+        hass._pool.block_till_done()
+
+        if self._start_fired is not None:
+            self.add(CATEGORY_START, ha.EVENT_HOMEASSISTANT_START,
+                     self._start_fired)
+
+    def report(self):
+        """ Returns the recorded spans as text, slowest first. """
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span[3],
+                           reverse=True)
+
+        return "\n".join(
+            "{:9.3f}s  {:<8} {}".format(duration, category, name)
+            for category, name, _, duration, _ in spans)
+
+    def write_chrome_trace(self, path):
+        """ Writes the recorded spans to path in the Chrome trace format. """
+        with self._lock:
+            events = [{'name': name, 'cat': category, 'ph': 'X',
+                       'ts': int(start * 1000000),
+                       'dur': int(duration * 1000000),
+                       'pid': 1, 'tid': thread}
+                      for category, name, start, duration, thread
+                      in self.spans]
+
+        with open(path, 'w') as trace_file:
+            json.dump({'traceEvents': events}, trace_file)
+
+
+@contextmanager
+def measure(profiler, category, name):
+    """ Measures the body with profiler. Does nothing if profiler is None. """
+    if profiler is None:
+        yield
+
+    else:
+        with profiler.measure(category, name):
+            yield
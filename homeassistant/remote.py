@@ -14,10 +14,14 @@ import logging
 import json
 import enum
 import urllib.parse
+from datetime import datetime
 
 import requests
 
 import homeassistant as ha
+import homeassistant.util as util
+import homeassistant.wire as wire
+import homeassistant.metrics as metrics
 
 SERVER_PORT = 8123
 
@@ -30,8 +34,15 @@ URL_API_EVENTS = "/api/events"
 URL_API_EVENTS_EVENT = "/api/events/{}"
 URL_API_SERVICES = "/api/services"
 URL_API_SERVICES_SERVICE = "/api/services/{}/{}"
+URL_API_METRICS = "/api/metrics"
+URL_API_BATCH = "/api/batch"
 URL_API_EVENT_FORWARD = "/api/event_forwarding"
 
+BATCH_TYPE_SERVICE = "service"
+BATCH_TYPE_EVENT = "event"
+
+CONTENT_TYPE_JSON = "application/json"
+
 METHOD_GET = "get"
 METHOD_POST = "post"
 
@@ -52,17 +63,26 @@ class APIStatus(enum.Enum):
 
 
 class API(object):
-    """ Object to pass around Home Assistant API location and credentials. """
-    # pylint: disable=too-few-public-methods
+    """ Object to pass around Home Assistant API location and credentials.
 
-    def __init__(self, host, api_password, port=None):
+    If use_binary is True the compact binary wire format is requested from
+    the server. Once the server answers in it, request bodies are sent in
+    it too. Otherwise JSON is used. """
+    # pylint: disable=too-few-public-methods, too-many-instance-attributes
+    def __init__(self, host, api_password, port=None, use_binary=False):
         self.host = host
         self.port = port or SERVER_PORT
         self.api_password = api_password
         self.base_url = "http://{}:{}".format(host, self.port)
         self.status = None
+        self.use_binary = use_binary
+        self._send_binary = False
         self._headers = {AUTH_HEADER: api_password}
 
+        if use_binary:
+            self._headers['Accept'] = "{}, {}".format(
+                wire.CONTENT_TYPE, CONTENT_TYPE_JSON)
+
     def validate_api(self, force_validate=False):
         """ Tests if we can communicate with the API. """
         if self.status is None or force_validate:
@@ -72,18 +92,35 @@ class API(object):
 
     def __call__(self, method, path, data=None):
         """ Makes a call to the Home Assistant api. """
-        if data is not None:
+        headers = self._headers
+
+        if data is None:
+            pass
+
+        elif self._send_binary and method != METHOD_GET:
+            data = wire.pack(data)
+            headers = dict(headers)
+            headers['Content-Type'] = wire.CONTENT_TYPE
+
+        else:
             data = json.dumps(data, cls=JSONEncoder)
 
         url = urllib.parse.urljoin(self.base_url, path)
 
         try:
             if method == METHOD_GET:
-                return requests.get(
-                    url, params=data, timeout=5, headers=self._headers)
+                req = requests.get(
+                    url, params=data, timeout=5, headers=headers)
             else:
-                return requests.request(
-                    method, url, data=data, timeout=5, headers=self._headers)
+                req = requests.request(
+                    method, url, data=data, timeout=5, headers=headers)
+
+            # Server answered in the binary format so it understands it
+            if self.use_binary and not self._send_binary and \
+               _is_binary(req):
+                self._send_binary = True
+
+            return req
 
         except requests.exceptions.ConnectionError:
             _LOGGER.exception("Error connecting to server")
@@ -97,7 +134,7 @@ class API(object):
 
 class HomeAssistant(ha.HomeAssistant):
     """ Home Assistant that forwards work. """
-    # pylint: disable=super-init-not-called
+    # pylint: disable=super-init-not-called, too-many-instance-attributes
 
     def __init__(self, remote_api, local_api=None):
         if not remote_api.validate_api():
@@ -108,12 +145,23 @@ class HomeAssistant(ha.HomeAssistant):
         self.remote_api = remote_api
         self.local_api = local_api
 
-        self._pool = pool = ha.create_worker_pool()
+        self.metrics = metrics.Metrics()
+
+        self._pool = pool = ha.create_worker_pool(hass_metrics=self.metrics)
+
+        self.metrics.add_gauge(metrics.METRIC_POOL_QUEUE,
+                               pool.work_queue.qsize)
 
-        self.bus = EventBus(remote_api, pool)
+        self.bus = EventBus(remote_api, pool, self.metrics)
         self.services = ha.ServiceRegistry(self.bus, pool)
         self.states = StateMachine(self.bus, self.remote_api)
 
+        self.components = []
+        self._scopes = {}
+
+        self.started = False
+        self._start_lock = threading.Lock()
+
     def start(self):
         # If there is no local API setup but we do want to connect with remote
         # We create a random password and set up a local api
@@ -131,6 +179,9 @@ class HomeAssistant(ha.HomeAssistant):
         # Setup that events from remote_api get forwarded to local_api
         connect_remote_events(self.remote_api, self.local_api)
 
+        with self._start_lock:
+            self.started = True
+
         self.bus.fire(ha.EVENT_HOMEASSISTANT_START,
                       origin=ha.EventOrigin.remote)
 
@@ -151,8 +202,8 @@ class EventBus(ha.EventBus):
     """ EventBus implementation that forwards fire_event to remote API. """
     # pylint: disable=too-few-public-methods
 
-    def __init__(self, api, pool=None):
-        super().__init__(pool)
+    def __init__(self, api, pool=None, hass_metrics=None):
+        super().__init__(pool, hass_metrics)
         self._api = api
 
     def fire(self, event_type, event_data=None, origin=ha.EventOrigin.local):
@@ -241,14 +292,30 @@ class StateMachine(ha.StateMachine):
         """ Calls set_state on remote API . """
         set_state(self._api, entity_id, new_state, attributes)
 
+    def set_multiple(self, updates):
+        """ Calls set_states on remote API. """
+        return set_states(self._api, updates)
+
     def mirror(self):
         """ Discards current data and mirrors the remote state machine. """
-        self._states = {state.entity_id: state for state
-                        in get_states(self._api)}
+        with self._lock:
+            self._states = {state.entity_id: state for state
+                            in get_states(self._api)}
+
+            self._domain_index = {}
+
+            for entity_id in self._states:
+                self._index(entity_id)
 
     def _state_changed_listener(self, event):
         """ Listens for state changed events and applies them. """
-        self._states[event.data['entity_id']] = event.data['new_state']
+        entity_id = event.data['entity_id']
+
+        with self._lock:
+            if entity_id not in self._states:
+                self._index(entity_id)
+
+            self._states[entity_id] = event.data['new_state']
 
 
 class JSONEncoder(json.JSONEncoder):
@@ -261,9 +328,31 @@ class JSONEncoder(json.JSONEncoder):
         if isinstance(obj, ha.State):
             return obj.as_dict()
 
+        elif isinstance(obj, datetime):
+            return util.datetime_to_str(obj)
+
         return json.JSONEncoder.default(self, obj)
 
 
+def _is_binary(req):
+    """ Returns True if the response is in the binary wire format. """
+    return req.headers.get('Content-Type', '').startswith(wire.CONTENT_TYPE)
+
+
+def _response_data(req):
+    """ Decodes the body of a response from the API.
+        Raises ValueError if it cannot be decoded. """
+    if _is_binary(req):
+        return wire.unpack(req.content)
+
+    return req.json()
+
+
+def _to_state(data):
+    """ Converts a decoded state to a State object. """
+    return data if isinstance(data, ha.State) else ha.State.from_dict(data)
+
+
 def validate_api(api):
     """ Makes a call to validate API. """
     try:
@@ -316,10 +405,10 @@ def get_event_listeners(api):
     try:
         req = api(METHOD_GET, URL_API_EVENTS)
 
-        return req.json() if req.status_code == 200 else {}
+        return _response_data(req) if req.status_code == 200 else {}
 
     except (ha.HomeAssistantError, ValueError):
-        # ValueError if req.json() can't parse the json
+        # ValueError if the response can't be parsed
         _LOGGER.exception("Unexpected result retrieving event listeners")
 
         return {}
@@ -348,11 +437,11 @@ def get_state(api, entity_id):
 
         # req.status_code == 422 if entity does not exist
 
-        return ha.State.from_dict(req.json()) \
+        return _to_state(_response_data(req)) \
             if req.status_code == 200 else None
 
     except (ha.HomeAssistantError, ValueError):
-        # ValueError if req.json() can't parse the json
+        # ValueError if the response can't be parsed
         _LOGGER.exception("Error fetching state")
 
         return None
@@ -365,11 +454,11 @@ def get_states(api):
         req = api(METHOD_GET,
                   URL_API_STATES)
 
-        return [ha.State.from_dict(item) for
-                item in req.json()]
+        return [_to_state(item) for
+                item in _response_data(req)]
 
     except (ha.HomeAssistantError, ValueError, AttributeError):
-        # ValueError if req.json() can't parse the json
+        # ValueError if the response can't be parsed
         _LOGGER.exception("Error fetching states")
 
         return {}
@@ -404,6 +493,39 @@ def set_state(api, entity_id, new_state, attributes=None):
         return False
 
 
+def set_states(api, updates):
+    """
+    Tells API to update the states of multiple entities in one request.
+    Updates is a list of (entity_id, new_state, attributes) tuples.
+    Returns a list with a tuple (state, is_new) for each update. State is
+    None if the update failed.
+    """
+
+    data = {'states': [{'entity_id': entity_id,
+                        'state': new_state,
+                        'attributes': attributes or {}}
+                       for entity_id, new_state, attributes in updates]}
+
+    try:
+        req = api(METHOD_POST, URL_API_STATES, data)
+
+        if req.status_code != 200:
+            _LOGGER.error("Error changing states: %d - %s",
+                          req.status_code, req.text)
+
+            return [(None, False)] * len(data['states'])
+
+        return [(_to_state(result.get('state')),
+                 result['status'] == 201)
+                for result in _response_data(req)]
+
+    except (ha.HomeAssistantError, ValueError, KeyError):
+        # ValueError if the response can't be parsed
+        _LOGGER.exception("Error setting states")
+
+        return [(None, False)] * len(data['states'])
+
+
 def is_state(api, entity_id, state):
     """ Queries API to see if entity_id is specified state. """
     cur_state = get_state(api, entity_id)
@@ -419,10 +541,10 @@ def get_services(api):
     try:
         req = api(METHOD_GET, URL_API_SERVICES)
 
-        return req.json() if req.status_code == 200 else {}
+        return _response_data(req) if req.status_code == 200 else {}
 
     except (ha.HomeAssistantError, ValueError):
-        # ValueError if req.json() can't parse the json
+        # ValueError if the response can't be parsed
         _LOGGER.exception("Got unexpected services result")
 
         return {}
@@ -441,3 +563,57 @@ def call_service(api, domain, service, service_data=None):
 
     except ha.HomeAssistantError:
         _LOGGER.exception("Error calling service")
+
+
+def call_services(api, service_calls):
+    """
+    Calls multiple services at the remote API in one request.
+    Service_calls is a list of (domain, service, service_data) tuples.
+    Returns True if success.
+    """
+    return _post_batch(api, [{'type': BATCH_TYPE_SERVICE,
+                              'domain': domain,
+                              'service': service,
+                              'service_data': service_data}
+                             for domain, service, service_data
+                             in service_calls])
+
+
+def fire_events(api, events):
+    """
+    Fires multiple events at the remote API in one request.
+    Events is a list of (event_type, event_data) tuples.
+    Returns True if success.
+    """
+    return _post_batch(api, [{'type': BATCH_TYPE_EVENT,
+                              'event_type': event_type,
+                              'event_data': event_data}
+                             for event_type, event_data in events])
+
+
+def _post_batch(api, items):
+    """ Posts a list of batch items to the remote API.
+        Returns True if all items were dispatched. """
+    try:
+        req = api(METHOD_POST, URL_API_BATCH, {'batch': items})
+
+        if req.status_code != 200:
+            _LOGGER.error("Error executing batch: %d - %s",
+                          req.status_code, req.text)
+
+            return False
+
+        failed = [result for result in _response_data(req)
+                  if result.get('status') != 200]
+
+        for result in failed:
+            _LOGGER.error("Error executing batch item: %s",
+                          result.get('message'))
+
+        return not failed
+
+    except (ha.HomeAssistantError, ValueError, AttributeError):
+        # ValueError if the response can't be parsed
+        _LOGGER.exception("Error executing batch")
+
+        return False
@@ -6,7 +6,9 @@ Helper methods for various modules.
 """
 import threading
 import queue
+import time
 import datetime
+import functools
 import re
 import enum
 import socket
@@ -38,18 +40,36 @@ def slugify(text):
 def datetime_to_str(dattim):
     """ Converts datetime to a string format.
 
+    Hand-rolled equivalent of dattim.strftime(DATE_STR_FORMAT).
+
     @rtype : str
     """
-    return dattim.strftime(DATE_STR_FORMAT)
+    return "{:02d}:{:02d}:{:02d} {:02d}-{:02d}-{:04d}".format(
+        dattim.hour, dattim.minute, dattim.second,
+        dattim.day, dattim.month, dattim.year)
 
 
+# States often share a timestamp and are parsed over and over again when
+# they are forwarded between instances. Cache recent results.
+@functools.lru_cache(maxsize=512)
 def str_to_datetime(dt_str):
     """ Converts a string to a datetime object.
 
+    Strings in the exact DATE_STR_FORMAT layout are parsed by hand because
+    strptime is slow. Other strings are handed to strptime.
+
     @rtype: datetime
     """
     try:
+        if len(dt_str) == 19 and dt_str[2] == ':' and dt_str[5] == ':' and \
+           dt_str[8] == ' ' and dt_str[11] == '-' and dt_str[14] == '-':
+
+            return datetime.datetime(
+                int(dt_str[15:19]), int(dt_str[12:14]), int(dt_str[9:11]),
+                int(dt_str[0:2]), int(dt_str[3:5]), int(dt_str[6:8]))
+
         return datetime.datetime.strptime(dt_str, DATE_STR_FORMAT)
+
     except ValueError:  # If dt_str did not match our format
         return None
 
@@ -134,6 +154,34 @@ def ensure_unique_string(preferred_string, current_strings):
     return string
 
 
+# pylint: disable=too-few-public-methods
+class UniqueStringAllocator(object):
+    """ Hands out strings that are unique among the strings it handed out
+        before. Like ensure_unique_string appends _2, _3, .. but remembers
+        the next suffix to try for each preferred string, so allocating
+        many strings takes linear time. """
+
+    def __init__(self, current_strings=()):
+        self.used = set(current_strings)
+        self._next_try = {}
+
+    def allocate(self, preferred_string):
+        """ Returns a unique string based on preferred_string. """
+        tries = self._next_try.get(preferred_string, 1)
+
+        string = preferred_string if tries == 1 else \
+            "{}_{}".format(preferred_string, tries)
+
+        while string in self.used:
+            tries += 1
+            string = "{}_{}".format(preferred_string, tries)
+
+        self._next_try[preferred_string] = tries + 1
+        self.used.add(string)
+
+        return string
+
+
 # Taken from: http://stackoverflow.com/a/11735897
 def get_local_ip():
     """ Tries to determine the local IP address of the machine. """
@@ -219,12 +267,16 @@ class ThreadPool(object):
     Will initiate it's workers using worker(queue).start() """
     # pylint: disable=too-many-instance-attributes
 
-    def __init__(self, worker_count, job_handler, busy_callback=None):
+    # pylint: disable=too-many-arguments
+    def __init__(self, worker_count, job_handler, busy_callback=None,
+                 job_done_callback=None):
         """
         worker_count: number of threads to run that handle jobs
         job_handler: method to be called from worker thread to handle job
         busy_callback: method to be called when queue gets too big.
                        Parameters: list_of_current_jobs, number_pending_jobs
+        job_done_callback: method to be called after a job has been handled.
+                           Parameters: job, seconds_waited, seconds_running
         """
         self.work_queue = work_queue = queue.PriorityQueue()
         self.current_jobs = current_jobs = []
@@ -237,7 +289,8 @@ class ThreadPool(object):
         for _ in range(worker_count):
             worker = threading.Thread(target=_threadpool_worker,
                                       args=(work_queue, current_jobs,
-                                            job_handler, self._quit_task))
+                                            job_handler, self._quit_task,
+                                            job_done_callback))
             worker.daemon = True
             worker.start()
 
@@ -291,16 +344,19 @@ class PriorityQueueItem(object):
     def __init__(self, priority, item):
         self.priority = priority
         self.item = item
+        self.queued = time.perf_counter()
 
     def __lt__(self, other):
         return self.priority < other.priority
 
 
-def _threadpool_worker(work_queue, current_jobs, job_handler, quit_task):
+def _threadpool_worker(work_queue, current_jobs, job_handler, quit_task,
+                       job_done_callback=None):
     """ Provides the base functionality of a worker for the thread pool. """
     while True:
         # Get new item from work_queue
-        job = work_queue.get().item
+        queue_item = work_queue.get()
+        job = queue_item.item
 
         if job == quit_task:
             work_queue.task_done()
@@ -311,7 +367,18 @@ def _threadpool_worker(work_queue, current_jobs, job_handler, quit_task):
         current_jobs.append(job_log)
 
         # Do the job
-        job_handler(job)
+        if job_done_callback is None:
+            job_handler(job)
+
+        else:
+            started = time.perf_counter()
+
+            job_handler(job)
+
+            finished = time.perf_counter()
+
+            job_done_callback(job, started - queue_item.queued,
+                              finished - started)
 
         # Remove from current running job
         current_jobs.remove(job_log)
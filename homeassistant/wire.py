@@ -0,0 +1,365 @@
+"""
+homeassistant.wire
+~~~~~~~~~~~~~~~~~~
+
+Compact binary encoding for traffic between Home Assistant instances.
+
+Implements the part of MessagePack (http://msgpack.org/) that is needed to
+represent JSON data, extended with types for datetime, State, Event and
+ServiceCall objects. Use pack to encode and unpack to decode.
+"""
+import struct
+import datetime
+
+import homeassistant as ha
+
+CONTENT_TYPE = "application/x-msgpack"
+
+# Extension type codes
+EXT_DATETIME = 1
+EXT_STATE = 2
+EXT_EVENT = 3
+EXT_SERVICE_CALL = 4
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+_STRUCT_FLOAT = struct.Struct('>d')
+
+
+def pack(obj):
+    """ Encodes obj. Raises TypeError if obj contains unsupported objects.
+
+    @rtype: bytes
+    """
+    out = bytearray()
+
+    _pack(obj, out)
+
+    return bytes(out)
+
+
+def unpack(data):
+    """ Decodes data that was encoded with pack.
+    Raises ValueError if data is not valid. """
+    try:
+        obj, pos = _unpack(data, 0)
+
+    except (IndexError, struct.error, UnicodeDecodeError, TypeError,
+            RuntimeError, ha.HomeAssistantError) as err:
+        raise ValueError("Invalid data: {}".format(err))
+
+    if pos != len(data):
+        raise ValueError("Extra data after position {}".format(pos))
+
+    return obj
+
+
+# pylint: disable=too-many-branches
+def _pack(obj, out):
+    """ Appends the encoded obj to bytearray out. """
+    if obj is None:
+        out.append(0xc0)
+
+    elif obj is True:
+        out.append(0xc3)
+
+    elif obj is False:
+        out.append(0xc2)
+
+    elif isinstance(obj, int):
+        _pack_int(obj, out)
+
+    elif isinstance(obj, float):
+        out.append(0xcb)
+        out += _STRUCT_FLOAT.pack(obj)
+
+    elif isinstance(obj, str):
+        data = obj.encode('utf-8')
+        _pack_header(len(data), out, 0xa0, 32, 0xd9, 0xda, 0xdb)
+        out += data
+
+    elif isinstance(obj, (bytes, bytearray)):
+        _pack_header(len(obj), out, None, 0, 0xc4, 0xc5, 0xc6)
+        out += obj
+
+    elif isinstance(obj, (list, tuple)):
+        _pack_header(len(obj), out, 0x90, 16, None, 0xdc, 0xdd)
+        for item in obj:
+            _pack(item, out)
+
+    elif isinstance(obj, dict):
+        _pack_header(len(obj), out, 0x80, 16, None, 0xde, 0xdf)
+        for key, value in obj.items():
+            _pack(key, out)
+            _pack(value, out)
+
+    elif isinstance(obj, datetime.datetime):
+        delta = obj - _EPOCH
+        seconds = delta.days * 86400 + delta.seconds
+
+        _pack_ext(EXT_DATETIME,
+                  [seconds, obj.microsecond] if obj.microsecond
+                  else seconds, out)
+
+    elif isinstance(obj, ha.State):
+        _pack_ext(EXT_STATE, [obj.entity_id, obj.state, obj.attributes,
+                              obj.last_changed], out)
+
+    elif isinstance(obj, ha.Event):
+        _pack_ext(EXT_EVENT, [obj.event_type, obj.data, str(obj.origin)],
+                  out)
+
+    elif isinstance(obj, ha.ServiceCall):
+        _pack_ext(EXT_SERVICE_CALL, [obj.domain, obj.service, obj.data], out)
+
+    else:
+        raise TypeError("{} is not serializable".format(repr(obj)))
+
+
+def _pack_int(value, out):
+    """ Appends the smallest encoding of integer value to out. """
+    if 0 <= value < 128:
+        out.append(value)
+
+    elif -32 <= value < 0:
+        out.append(value & 0xff)
+
+    elif value >= 0:
+        for code, fmt, limit in ((0xcc, '>B', 1 << 8),
+                                 (0xcd, '>H', 1 << 16),
+                                 (0xce, '>I', 1 << 32),
+                                 (0xcf, '>Q', 1 << 64)):
+            if value < limit:
+                out.append(code)
+                out += struct.pack(fmt, value)
+                return
+
+        raise TypeError("Integer {} is too big".format(value))
+
+    else:
+        for code, fmt, limit in ((0xd0, '>b', 1 << 7),
+                                 (0xd1, '>h', 1 << 15),
+                                 (0xd2, '>i', 1 << 31),
+                                 (0xd3, '>q', 1 << 63)):
+            if value >= -limit:
+                out.append(code)
+                out += struct.pack(fmt, value)
+                return
+
+        raise TypeError("Integer {} is too small".format(value))
+
+
+# pylint: disable=too-many-arguments
+def _pack_header(length, out, fix_code, fix_limit, code8, code16, code32):
+    """ Appends the header for a str, bin, array or map of length to out. """
+    if length < fix_limit:
+        out.append(fix_code | length)
+
+    elif code8 is not None and length < 1 << 8:
+        out.append(code8)
+        out.append(length)
+
+    elif length < 1 << 16:
+        out.append(code16)
+        out += struct.pack('>H', length)
+
+    else:
+        out.append(code32)
+        out += struct.pack('>I', length)
+
+
+def _pack_ext(ext_type, fields, out):
+    """ Appends an extension type with fields as payload to out. """
+    payload = pack(fields)
+    length = len(payload)
+
+    fixext = {1: 0xd4, 2: 0xd5, 4: 0xd6, 8: 0xd7, 16: 0xd8}.get(length)
+
+    if fixext is not None:
+        out.append(fixext)
+
+    elif length < 1 << 8:
+        out.append(0xc7)
+        out.append(length)
+
+    elif length < 1 << 16:
+        out.append(0xc8)
+        out += struct.pack('>H', length)
+
+    else:
+        out.append(0xc9)
+        out += struct.pack('>I', length)
+
+    out.append(ext_type)
+    out += payload
+
+
+# pylint: disable=too-many-return-statements
+def _unpack(data, pos):
+    """ Decodes the object starting at pos.
+        Returns tuple (object, position after object). """
+    code = data[pos]
+    pos += 1
+
+    if code < 0x80:
+        return code, pos
+
+    elif code >= 0xe0:
+        return code - 0x100, pos
+
+    elif code <= 0x8f:
+        return _unpack_map(data, pos, code & 0x0f)
+
+    elif code <= 0x9f:
+        return _unpack_array(data, pos, code & 0x0f)
+
+    elif code <= 0xbf:
+        return _unpack_str(data, pos, code & 0x1f)
+
+    elif code in _SIMPLE:
+        return _SIMPLE[code], pos
+
+    elif code in _NUMBERS:
+        fmt = _NUMBERS[code]
+        return fmt.unpack_from(data, pos)[0], pos + fmt.size
+
+    elif code in _LENGTHS:
+        kind, fmt = _LENGTHS[code]
+        length = fmt.unpack_from(data, pos)[0]
+        pos += fmt.size
+
+        if kind == 'str':
+            return _unpack_str(data, pos, length)
+        elif kind == 'bin':
+            return _unpack_bin(data, pos, length)
+        elif kind == 'array':
+            return _unpack_array(data, pos, length)
+        elif kind == 'map':
+            return _unpack_map(data, pos, length)
+        else:
+            return _unpack_ext(data, pos, length)
+
+    elif code in _FIXEXT:
+        return _unpack_ext(data, pos, _FIXEXT[code])
+
+    raise ValueError("Unknown type code {:#x}".format(code))
+
+
+def _unpack_str(data, pos, length):
+    """ Decodes a string of length bytes starting at pos. """
+    _check_length(data, pos, length)
+    return bytes(data[pos:pos + length]).decode('utf-8'), pos + length
+
+
+def _unpack_bin(data, pos, length):
+    """ Decodes binary data of length bytes starting at pos. """
+    _check_length(data, pos, length)
+    return bytes(data[pos:pos + length]), pos + length
+
+
+def _unpack_array(data, pos, length):
+    """ Decodes an array of length items starting at pos. """
+    items = []
+
+    for _ in range(length):
+        item, pos = _unpack(data, pos)
+        items.append(item)
+
+    return items, pos
+
+
+def _unpack_map(data, pos, length):
+    """ Decodes a map of length pairs starting at pos. """
+    items = {}
+
+    for _ in range(length):
+        key, pos = _unpack(data, pos)
+        items[key], pos = _unpack(data, pos)
+
+    return items, pos
+
+
+def _unpack_ext(data, pos, length):
+    """ Decodes an extension type with a payload of length bytes. """
+    ext_type = data[pos]
+    pos += 1
+
+    _check_length(data, pos, length)
+
+    fields = unpack(data[pos:pos + length])
+    pos += length
+
+    try:
+        return _build_ext(ext_type, fields), pos
+
+    except (OverflowError, AttributeError, ValueError) as err:
+        raise ValueError("Invalid extension type {}: {}".format(
+            ext_type, err))
+
+
+def _build_ext(ext_type, fields):
+    """ Builds the object of extension type ext_type from its fields. """
+    if ext_type == EXT_DATETIME:
+        if isinstance(fields, list):
+            _check_fields(fields, int, int)
+            seconds, microseconds = fields
+        else:
+            _check_fields([fields], int)
+            seconds, microseconds = fields, 0
+
+        return _EPOCH + datetime.timedelta(
+            seconds=seconds, microseconds=microseconds)
+
+    elif ext_type == EXT_STATE:
+        # The state itself can be any value
+        _check_fields(fields, str, object, dict, datetime.datetime)
+
+        return ha.State(*fields)
+
+    elif ext_type == EXT_EVENT:
+        _check_fields(fields, str, dict, str)
+        event_type, event_data, origin = fields
+
+        return ha.Event(event_type, event_data, ha.EventOrigin(origin))
+
+    elif ext_type == EXT_SERVICE_CALL:
+        _check_fields(fields, str, str, dict)
+
+        return ha.ServiceCall(*fields)
+
+    raise ValueError("Unknown extension type {}".format(ext_type))
+
+
+def _check_fields(fields, *types):
+    """ Raises ValueError if fields is not a list with a value of each of
+        the given types. """
+    if not isinstance(fields, list) or len(fields) != len(types):
+        raise ValueError("Expected {} fields".format(len(types)))
+
+    for field, field_type in zip(fields, types):
+        if not isinstance(field, field_type):
+            raise ValueError("Field {} is not a {}".format(
+                repr(field), field_type.__name__))
+
+
+def _check_length(data, pos, length):
+    """ Raises ValueError if data does not contain length bytes at pos. """
+    if pos + length > len(data):
+        raise ValueError("Data is truncated")
+
+
+_SIMPLE = {0xc0: None, 0xc2: False, 0xc3: True}
+
+_NUMBERS = {code: struct.Struct(fmt) for code, fmt in (
+    (0xca, '>f'), (0xcb, '>d'),
+    (0xcc, '>B'), (0xcd, '>H'), (0xce, '>I'), (0xcf, '>Q'),
+    (0xd0, '>b'), (0xd1, '>h'), (0xd2, '>i'), (0xd3, '>q'))}
+
+_LENGTHS = {code: (kind, struct.Struct(fmt)) for code, kind, fmt in (
+    (0xd9, 'str', '>B'), (0xda, 'str', '>H'), (0xdb, 'str', '>I'),
+    (0xc4, 'bin', '>B'), (0xc5, 'bin', '>H'), (0xc6, 'bin', '>I'),
+    (0xdc, 'array', '>H'), (0xdd, 'array', '>I'),
+    (0xde, 'map', '>H'), (0xdf, 'map', '>I'),
+    (0xc7, 'ext', '>B'), (0xc8, 'ext', '>H'), (0xc9, 'ext', '>I'))}
+
+_FIXEXT = {0xd4: 1, 0xd5: 2, 0xd6: 4, 0xd7: 8, 0xd8: 16}
@@ -0,0 +1,327 @@
+"""
+test.test_bootstrap
+~~~~~~~~~~~~~~~~~~~
+
+Tests bootstrapping Home Assistant from a config dict.
+"""
+# pylint: disable=too-many-public-methods,protected-access
+import unittest
+import threading
+import types
+import tempfile
+import json
+import os
+import time
+
+import requests
+
+import homeassistant as ha
+import homeassistant.remote as remote
+import homeassistant.loader as loader
+import homeassistant.bootstrap as bootstrap
+import homeassistant.profiler as profiling
+
+from helper import get_test_home_assistant
+
+
+def mock_component(domain, dependencies=None, setup=None):
+    """ Creates a component module that calls setup when set up. """
+    component = types.ModuleType(domain)
+    component.DOMAIN = domain
+    component.DEPENDENCIES = dependencies or []
+    component.setup = lambda hass, config: setup() if setup else True
+
+    return component
+
+
+class TestBootstrap(unittest.TestCase):
+    """ Test the bootstrap module. """
+
+    def setUp(self):  # pylint: disable=invalid-name
+        self.hass = get_test_home_assistant()
+        self.domains = []
+
+    def tearDown(self):  # pylint: disable=invalid-name
+        """ Stop down stuff we started. """
+        self.hass._pool.stop()
+
+        for domain in self.domains:
+            loader._COMPONENT_CACHE.pop(domain, None)
+
+    def add_component(self, domain, dependencies=None, setup=None):
+        """ Registers a mock component with the loader. """
+        self.domains.append(domain)
+        loader.set_component(
+            domain, mock_component(domain, dependencies, setup))
+
+    def test_parallel_setup(self):
+        """ Test that independent components are set up concurrently and
+            after their dependencies. """
+        started = {'mock_a': threading.Event(), 'mock_b': threading.Event()}
+        order = []
+        concurrent = []
+
+        def setup_waiting(domain, other):
+            """ Only succeeds if the other component is being set up too. """
+            def setup():
+                """ Mock setup method. """
+                started[domain].set()
+                order.append(domain)
+                concurrent.append(started[other].wait(5))
+
+                return True
+
+            return setup
+
+        self.add_component('mock_a', setup=setup_waiting('mock_a', 'mock_b'))
+        self.add_component('mock_b', setup=setup_waiting('mock_b', 'mock_a'))
+        self.add_component('mock_c', ['mock_a', 'mock_b'],
+                           lambda: order.append('mock_c') or True)
+
+        bootstrap.from_config_dict(
+            {'mock_a': {}, 'mock_b': {}, 'mock_c': {}}, self.hass)
+
+        self.assertEqual([True, True], concurrent)
+        self.assertEqual('mock_c', order[-1])
+        self.assertEqual(3, len(order))
+
+    def test_group_loaded_late(self):
+        """ Test that group is set up after all other components unless
+            they depend on it. """
+        order = []
+
+        def setup_logging(domain):
+            """ Returns a mock setup method that logs its domain. """
+            return lambda: order.append(domain) or True
+
+        self.add_component('group', setup=setup_logging('group'))
+        self.add_component('mock_a', setup=setup_logging('mock_a'))
+        self.add_component('mock_b', ['group'], setup_logging('mock_b'))
+
+        bootstrap.from_config_dict({'mock_a': {}, 'mock_b': {}}, self.hass)
+
+        self.assertEqual(['mock_a', 'group', 'mock_b'], order)
+
+        order.clear()
+
+        hass = get_test_home_assistant()
+
+        bootstrap.from_config_dict({'mock_a': {}}, hass)
+
+        hass._pool.stop()
+
+        self.assertEqual(['mock_a', 'group'], order)
+
+    def test_dependency_levels(self):
+        """ Test sorting components in setup levels. """
+        levels, unresolved = bootstrap._dependency_levels({
+            'a': [], 'b': ['a'], 'c': ['a'], 'd': ['b', 'c'],
+            'e': ['f'], 'f': ['e'], 'g': ['missing']})
+
+        self.assertEqual([['a'], ['b', 'c'], ['d']], levels)
+        self.assertEqual({'e', 'f', 'g'}, unresolved)
+
+        levels, unresolved = bootstrap._dependency_levels(
+            {'b': ['a'], 'c': ['b']}, {'a'})
+
+        self.assertEqual([['b'], ['c']], levels)
+        self.assertEqual(set(), unresolved)
+
+    def test_dependency_chain(self):
+        """ Test explaining why a component cannot be set up. """
+        dependencies = {'a': [], 'b': ['a', 'c'], 'c': ['d'], 'd': ['b'],
+                        'e': ['a', 'f'], 'f': ['missing']}
+
+        self.assertEqual(
+            ['b', 'c', 'd', 'b'],
+            bootstrap._dependency_chain(dependencies, 'b', {'a'}))
+        self.assertEqual(
+            ['e', 'f', 'missing (not available)'],
+            bootstrap._dependency_chain(dependencies, 'e', {'a'}))
+
+    def test_skip_unresolved(self):
+        """ Test that components in a cycle are not set up. """
+        order = []
+
+        def setup_logging(domain):
+            """ Returns a mock setup method that logs its domain. """
+            return lambda: order.append(domain) or True
+
+        self.add_component('mock_a', setup=setup_logging('mock_a'))
+        self.add_component('mock_b', ['mock_c'], setup_logging('mock_b'))
+        self.add_component('mock_c', ['mock_b'], setup_logging('mock_c'))
+
+        with self.assertLogs(bootstrap.__name__, 'ERROR') as logs:
+            bootstrap.from_config_dict({'mock_a': {}, 'mock_b': {}},
+                                       self.hass)
+
+        self.assertEqual(['mock_a'], order)
+        self.assertIn('mock_b -> mock_c -> mock_b', logs.output[0])
+
+    def test_profile_startup(self):
+        """ Test that startup steps are recorded by the profiler. """
+        self.add_component('mock_a')
+
+        profiler = profiling.StartupProfiler()
+
+        bootstrap.from_config_dict({'mock_a': {}}, self.hass, profiler)
+
+        self.hass.bus.fire(ha.EVENT_HOMEASSISTANT_START)
+        profiler.finish_start(self.hass)
+
+        recorded = {(category, name) for category, name, _, _, _
+                    in profiler.spans}
+
+        self.assertIn((profiling.CATEGORY_LOADER, 'prepare'), recorded)
+        self.assertIn((profiling.CATEGORY_IMPORT, 'mock_a'), recorded)
+        self.assertIn((profiling.CATEGORY_SETUP, 'mock_a'), recorded)
+        self.assertIn((profiling.CATEGORY_SETUP, 'group'), recorded)
+        self.assertIn((profiling.CATEGORY_START, ha.EVENT_HOMEASSISTANT_START),
+                      recorded)
+
+        self.assertEqual(len(recorded), len(profiler.report().split("\n")))
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            trace_path = os.path.join(tmp_dir, profiling.TRACE_FILE)
+
+            profiler.write_chrome_trace(trace_path)
+
+            with open(trace_path) as trace_file:
+                trace = json.load(trace_file)
+
+        self.assertEqual(len(profiler.spans), len(trace['traceEvents']))
+
+    def test_reload_config(self):
+        """ Test that only changed components are set up again. """
+        setups = []
+        events = []
+
+        def setup_tracking(domain):
+            """ Returns a mock setup method that registers a listener
+                and a service. """
+            def setup():
+                """ Mock setup method. """
+                setups.append(domain)
+
+                self.hass.bus.listen('test_event',
+                                     lambda event: events.append(domain))
+                self.hass.services.register(domain, 'test', lambda call: None)
+
+                return True
+
+            return setup
+
+        self.add_component('mock_a', setup=setup_tracking('mock_a'))
+        self.add_component('mock_b', ['mock_a'], setup_tracking('mock_b'))
+        self.add_component('mock_c', setup=setup_tracking('mock_c'))
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            config_path = os.path.join(tmp_dir, 'home-assistant.conf')
+
+            with open(config_path, 'w') as conf:
+                conf.write("[mock_a]\nvalue=1\n[mock_b]\n[mock_c]\n")
+
+            bootstrap.from_config_file(config_path, self.hass, False)
+
+            self.assertEqual(3, len(setups))
+
+            with open(config_path, 'w') as conf:
+                conf.write("[mock_a]\nvalue=2\n[mock_b]\n")
+
+            setups.clear()
+
+            self.hass.call_service(
+                ha.DOMAIN, ha.SERVICE_HOMEASSISTANT_RELOAD_CONFIG)
+            self.hass._pool.block_till_done()
+
+        self.assertEqual(['mock_a', 'mock_b'], setups)
+        self.assertNotIn('mock_c', self.hass.components)
+        self.assertFalse(self.hass.services.has_service('mock_c', 'test'))
+
+        self.hass.bus.fire('test_event')
+        self.hass._pool.block_till_done()
+
+        self.assertEqual(['mock_a', 'mock_b'], sorted(events))
+
+    def test_reload_not_reloadable(self):
+        """ Test that components that cannot be unloaded are not reloaded,
+            neither are the components they depend on. """
+        setups = []
+
+        self.add_component('mock_a', setup=lambda: setups.append('a') or 1)
+        self.add_component('mock_b', ['mock_a'],
+                           lambda: setups.append('b') or True)
+
+        loader.get_component('mock_b').RELOADABLE = False
+
+        bootstrap.from_config_dict({'mock_a': {}, 'mock_b': {}}, self.hass)
+
+        setups.clear()
+
+        with self.assertLogs(bootstrap.__name__, 'WARNING') as logs:
+            bootstrap.reload_config(
+                self.hass, {'mock_a': {}, 'mock_b': {}},
+                {'mock_a': {'value': '1'}})
+
+        self.assertEqual([], setups)
+        self.assertIn('mock_a', self.hass.components)
+        self.assertIn('mock_b', self.hass.components)
+        self.assertIn('mock_b cannot be unloaded', logs.output[0])
+
+    def test_reload_removes_groups(self):
+        """ Test that groups removed from the config are removed. """
+        self.hass.states.set('light.bowl', 'on')
+
+        bootstrap.from_config_dict(
+            {'group': {'a': 'light.bowl', 'b': 'light.bowl'}}, self.hass)
+
+        self.assertIsNotNone(self.hass.states.get('group.b'))
+
+        bootstrap.reload_config(
+            self.hass, {'group': {'a': 'light.bowl', 'b': 'light.bowl'}},
+            {'group': {'a': 'light.bowl'}})
+
+        self.assertIsNotNone(self.hass.states.get('group.a'))
+        self.assertIsNone(self.hass.states.get('group.b'))
+
+    def test_reload_http(self):
+        """ Test that the http server is stopped and started again with the
+            new config when its section changes. """
+        url = "http://127.0.0.1:8126/api/"
+
+        def get_status(password):
+            """ Returns the status code of an API request, waiting for the
+                server to come up. """
+            for _ in range(50):
+                try:
+                    return requests.get(
+                        url, headers={remote.AUTH_HEADER: password},
+                        timeout=5).status_code
+
+                except requests.exceptions.ConnectionError:
+                    time.sleep(.1)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            config_path = os.path.join(tmp_dir, 'home-assistant.conf')
+
+            with open(config_path, 'w') as conf:
+                conf.write("[http]\napi_password=old\nserver_port=8126\n")
+
+            bootstrap.from_config_file(config_path, self.hass, False)
+
+            self.hass.start()
+
+            self.assertEqual(200, get_status('old'))
+
+            with open(config_path, 'w') as conf:
+                conf.write("[http]\napi_password=new\nserver_port=8126\n")
+
+            self.hass.call_service(
+                ha.DOMAIN, ha.SERVICE_HOMEASSISTANT_RELOAD_CONFIG)
+            self.hass._pool.block_till_done()
+
+            self.assertIn('http', self.hass.components)
+            self.assertEqual(200, get_status('new'))
+            self.assertEqual(401, get_status('old'))
+
+        self.hass.stop()
@@ -0,0 +1,493 @@
+"""
+test.test_component_device_tracker
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Tests the device tracker compoments.
+"""
+# pylint: disable=protected-access,too-many-public-methods
+# pylint: disable=too-few-public-methods
+import unittest
+import logging
+import tempfile
+import threading
+import csv
+import os
+import json
+import http.server
+from datetime import datetime
+
+import homeassistant as ha
+import homeassistant.components as comps
+import homeassistant.metrics as metrics
+import homeassistant.components.device_tracker as device_tracker
+import homeassistant.components.device_tracker.tomato as tomato
+import homeassistant.components.device_tracker.luci as luci
+
+# Shortened response of the Tomato API
+TOMATO_RESPONSE = (
+    "\narplist = [['192.168.1.10','00:11:22:33:44:55','br0']];\n"
+    "wlnoise = [-99];\n"
+    "dhcpd_static = 'AA:BB<192.168.1.2<static>'.split('>');\n"
+    "wldev = [['eth1','F4:F5:D8:AA:AA:AA',-42,0,6000,6000,0],"
+    "['eth1','58:35:D9:BB:BB:BB',-61,1,1000,2000,0]];\n"
+    "dhcpd_lease = [['chromecast','192.168.1.5','F4:F5:D8:AA:AA:AA',"
+    "'0 days, 16:17:08'],['','192.168.1.7','58:35:D9:BB:BB:BB',"
+    "'0 days, 01:02:03']];\n")
+
+
+def setUpModule():   # pylint: disable=invalid-name
+    """ Setup to ignore errors about missing devices. """
+    logging.disable(logging.CRITICAL)
+
+
+class MockScanner(object):
+    """ Scanner that finds the devices it is told to find. """
+
+    def __init__(self):
+        self.found = []
+
+    def scan_devices(self):
+        """ Returns the MACs of the found devices. """
+        return list(self.found)
+
+    def get_device_name(self, device):
+        """ Returns the name of device. """
+        return "name_" + device
+
+
+class TestComponentsDeviceTracker(unittest.TestCase):
+    """ Tests homeassistant.components.device_tracker module. """
+
+    def setUp(self):  # pylint: disable=invalid-name
+        """ Init needed objects. """
+        self.hass = ha.HomeAssistant()
+        self.config_dir = tempfile.TemporaryDirectory()
+        self.hass.config_dir = self.config_dir.name
+        self.scanner = MockScanner()
+
+    def tearDown(self):  # pylint: disable=invalid-name
+        """ Stop down stuff we started. """
+        self.hass.stop()
+        self.config_dir.cleanup()
+
+    def write_known_devices(self, rows):
+        """ Writes the known devices file with rows of (device, name, track).
+        """
+        with open(self.hass.get_config_path(
+                device_tracker.KNOWN_DEVICES_FILE), 'w') as outp:
+            writer = csv.writer(outp)
+            writer.writerow(("device", "name", "track", "picture"))
+
+            for device, name, track in rows:
+                writer.writerow((device, name, track, ""))
+
+    def test_write_unknown_devices(self):
+        """ Test that found devices are added to the known devices file. """
+        self.scanner.found = ['CD', 'AB', 'CD']
+
+        tracker = device_tracker.DeviceTracker(
+            self.hass, {'mock': self.scanner})
+
+        self.assertEqual({'AB', 'CD'}, tracker.untracked)
+        self.assertEqual(set(), tracker.tracked)
+
+        # New devices are written in batches
+        self.assertFalse(os.path.isfile(self.hass.get_config_path(
+            device_tracker.KNOWN_DEVICES_FILE)))
+
+        locked = []
+
+        def get_device_name(device):
+            """ Records if the tracker lock is held while names are looked
+                up. """
+            locked.append(tracker.lock.locked())
+
+            return "name_" + device
+
+        self.scanner.get_device_name = get_device_name
+        self.scanner.found = ['EF']
+        tracker.update_devices()
+
+        # Names are looked up without holding the lock
+        self.assertEqual([False], locked)
+
+        tracker.known_devices_store.flush()
+
+        with open(self.hass.get_config_path(
+                device_tracker.KNOWN_DEVICES_FILE)) as inp:
+            rows = list(csv.DictReader(inp))
+
+        self.assertEqual(
+            [('AB', 'name_AB'), ('CD', 'name_CD'), ('EF', 'name_EF')],
+            [(row['device'], row['name']) for row in rows])
+
+        # Known devices are not written again
+        tracker.update_devices()
+        tracker.known_devices_store.flush()
+
+        with open(self.hass.get_config_path(
+                device_tracker.KNOWN_DEVICES_FILE)) as inp:
+            self.assertEqual(3, len(list(csv.DictReader(inp))))
+
+        # Our own writes do not cause the file to be parsed again
+        self.assertIsNone(tracker.known_devices_store.read())
+
+    def test_track_devices(self):
+        """ Test setting the state of tracked devices. """
+        self.write_known_devices([('AB', 'Paulus', 1), ('CD', 'Paulus', 1),
+                                  ('EF', 'Printer', 0)])
+
+        self.scanner.found = ['AB', 'EF']
+
+        tracker = device_tracker.DeviceTracker(
+            self.hass, {'mock': self.scanner})
+
+        self.assertEqual({'AB', 'CD'}, tracker.tracked)
+        self.assertEqual({'EF'}, tracker.untracked)
+        self.assertEqual(
+            {'device_tracker.Paulus', 'device_tracker.Paulus_2'},
+            tracker.device_entity_ids)
+
+        self.assertTrue(self.hass.states.is_state(
+            'device_tracker.Paulus', comps.STATE_HOME))
+        self.assertTrue(self.hass.states.is_state(
+            'device_tracker.Paulus_2', comps.STATE_NOT_HOME))
+        self.assertTrue(device_tracker.is_on(self.hass))
+
+        # Devices that are gone are removed after the known devices reload
+        self.write_known_devices([('CD', 'Paulus', 1)])
+
+        self.hass.call_service(device_tracker.DOMAIN,
+                               device_tracker.SERVICE_DEVICE_TRACKER_RELOAD)
+        self.hass._pool.block_till_done()
+
+        self.assertEqual({'CD'}, tracker.tracked)
+        self.assertEqual({'device_tracker.Paulus'},
+                         tracker.device_entity_ids)
+
+        tracker.update_devices(['CD'])
+
+        self.assertTrue(self.hass.states.is_state(
+            'device_tracker.Paulus', comps.STATE_HOME))
+        self.assertNotIn('device_tracker.Paulus_2',
+                         self.hass.states.entity_ids)
+
+    def test_scan_devices_async(self):
+        """ Test that scans run in the background one at a time. """
+        self.write_known_devices([('AB', 'Paulus', 1)])
+
+        tracker = device_tracker.DeviceTracker(
+            self.hass, {'mock': self.scanner})
+
+        self.hass.metrics.enabled = True
+
+        scanning = threading.Event()
+        finish_scan = threading.Event()
+
+        def scan_devices():
+            """ Blocks until the test lets the scan finish. """
+            scanning.set()
+            finish_scan.wait(5)
+
+            return ['AB']
+
+        self.scanner.scan_devices = scan_devices
+
+        self.assertTrue(tracker.scan_devices_async())
+        self.assertTrue(scanning.wait(5))
+
+        # Ticks while scanning are skipped
+        self.hass.bus.fire(ha.EVENT_TIME_CHANGED,
+                           {ha.ATTR_NOW: datetime.now()})
+        self.hass._pool.block_till_done()
+
+        self.assertFalse(tracker.scan_devices_async())
+        self.assertEqual(2, self.hass.metrics.get(
+            metrics.METRIC_DEVICE_SCANS_SKIPPED))
+        self.assertTrue(self.hass.states.is_state(
+            'device_tracker.Paulus', comps.STATE_NOT_HOME))
+
+        finish_scan.set()
+
+        # Wait for the scan to finish
+        with tracker._scan_lock:
+            pass
+
+        self.assertTrue(self.hass.states.is_state(
+            'device_tracker.Paulus', comps.STATE_HOME))
+        self.assertEqual(1, self.hass.metrics.get(
+            metrics.METRIC_DEVICE_SCAN, platform='mock').count)
+
+    def test_multiple_scanners(self):
+        """ Test merging the devices found by multiple scanners. """
+        self.write_known_devices([('AB', 'Paulus', 1), ('CD', 'Anne', 1)])
+
+        other_scanner = MockScanner()
+        other_scanner.get_device_name = lambda device: None
+
+        tracker = device_tracker.DeviceTracker(
+            self.hass, {'mock': self.scanner, 'other': other_scanner})
+
+        self.scanner.found = ['AB']
+        other_scanner.found = ['CD', 'EF']
+
+        tracker.update_devices()
+
+        self.assertTrue(self.hass.states.is_state(
+            'device_tracker.Paulus', comps.STATE_HOME))
+        self.assertTrue(self.hass.states.is_state(
+            'device_tracker.Anne', comps.STATE_HOME))
+        self.assertEqual({'mock', 'other'}, set(tracker.last_seen['AB']) |
+                         set(tracker.last_seen['CD']))
+
+        # Names come from the first scanner that knows them
+        self.assertEqual('name_EF', tracker.known_devices['EF']['name'])
+
+        # The freshest source decides if a device is gone
+        tracker.last_seen['AB']['mock'] -= 2 * tracker.error_scanning
+        tracker.last_seen['CD']['other'] -= 2 * tracker.error_scanning
+        tracker.last_seen['CD']['mock'] = datetime.now()
+
+        self.scanner.found = []
+        other_scanner.found = []
+
+        tracker.update_devices()
+
+        self.assertTrue(self.hass.states.is_state(
+            'device_tracker.Paulus', comps.STATE_NOT_HOME))
+        self.assertTrue(self.hass.states.is_state(
+            'device_tracker.Anne', comps.STATE_HOME))
+
+        # The scan threads are stopped when Home Assistant stops
+        self.hass.stop()
+
+        self.assertRaises(RuntimeError, tracker._executor.submit, len, [])
+
+    def test_platform_config(self):
+        """ Test that prefixed config values are used for their platform. """
+        config = {'type': 'tomato,netgear', 'host': '192.168.1.1',
+                  'netgear_host': '192.168.1.2', 'password': 'secret'}
+
+        self.assertEqual(
+            '192.168.1.2',
+            device_tracker._platform_config(config, 'netgear')['host'])
+        self.assertEqual(
+            '192.168.1.1',
+            device_tracker._platform_config(config, 'tomato')['host'])
+        self.assertEqual(
+            'secret',
+            device_tracker._platform_config(config, 'netgear')['password'])
+
+    def test_device_scanner_names(self):
+        """ Test that the scanner base class caches names. """
+        fetches = []
+
+        class NamedScanner(device_tracker.DeviceScanner):
+            """ Scanner that knows the names of two devices. """
+
+            def scan_devices(self):
+                """ Returns the MACs of the found devices. """
+                return ['AB', 'CD', 'EF']
+
+            def _fetch_device_names(self, devices):
+                """ Returns the names of the devices. """
+                fetches.append(devices)
+
+                return {'AB': 'Paulus', 'CD': 'Anne'}
+
+        scanner = NamedScanner()
+
+        device_tracker.DeviceTracker(self.hass, {'named': scanner})
+
+        # Names of all new devices are fetched at once
+        self.assertEqual([['AB', 'CD', 'EF']], fetches)
+
+        self.assertEqual('Paulus', scanner.get_device_name('AB'))
+        self.assertIsNone(scanner.get_device_name('EF'))
+        self.assertEqual(1, len(fetches))
+
+        # Names expire
+        for device, (name, expires) in list(scanner._names.items()):
+            scanner._names[device] = (
+                name, expires - 2 * device_tracker.DEVICE_NAME_TTL)
+
+        self.assertEqual({'AB': 'Paulus', 'GH': None},
+                         scanner.get_device_names(['AB', 'GH']))
+        self.assertEqual([['AB', 'GH']], fetches[1:])
+
+    def test_parse_tomato_response(self):
+        """ Test parsing the values we use from a Tomato response. """
+        results = tomato.parse_tomato_response(TOMATO_RESPONSE)
+
+        self.assertEqual(
+            [['eth1', 'F4:F5:D8:AA:AA:AA', -42, 0, 6000, 6000, 0],
+             ['eth1', '58:35:D9:BB:BB:BB', -61, 1, 1000, 2000, 0]],
+            results['wldev'])
+        self.assertEqual(
+            ['chromecast', '192.168.1.5', 'F4:F5:D8:AA:AA:AA',
+             '0 days, 16:17:08'],
+            results['dhcpd_lease'][0])
+
+        self.assertEqual(
+            {'wlnoise': [-99]},
+            tomato.parse_tomato_response(TOMATO_RESPONSE, ['wlnoise', 'x']))
+
+        with self.assertRaises(ValueError):
+            tomato.parse_tomato_response("wldev = [['eth1',;\n")
+
+    def test_tomato_single_flight(self):
+        """ Test that concurrent Tomato scans make one request and do not
+            block name lookups. """
+        scanner = tomato.TomatoDeviceScanner({
+            ha.CONF_HOST: '127.0.0.1:1', ha.CONF_USERNAME: 'user',
+            ha.CONF_PASSWORD: 'pass', tomato.CONF_HTTP_ID: '1234'})
+
+        requests = []
+        sending = threading.Event()
+        finish = threading.Event()
+
+        class MockSession(object):
+            """ Session that blocks until the test lets it respond. """
+
+            # pylint: disable=no-self-use,unused-argument
+            def send(self, request, timeout):
+                """ Returns the recorded response. """
+                requests.append(request)
+                sending.set()
+                finish.wait(5)
+
+                return type('Response', (object,), {
+                    'status_code': 200, 'text': TOMATO_RESPONSE})
+
+        scanner.session = MockSession()
+
+        threads = [threading.Thread(target=scanner.scan_devices)
+                   for _ in range(3)]
+
+        for thread in threads:
+            thread.start()
+
+        self.assertTrue(sending.wait(5))
+
+        # Results are not locked while the request is made
+        with scanner.lock:
+            self.assertEqual([], scanner.last_results['wldev'])
+
+        finish.set()
+
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(1, len(requests))
+        self.assertEqual(['F4:F5:D8:AA:AA:AA', '58:35:D9:BB:BB:BB'],
+                         scanner.scan_devices())
+        self.assertEqual('chromecast',
+                         scanner.get_device_name('F4:F5:D8:AA:AA:AA'))
+
+
+class LuciHandler(http.server.BaseHTTPRequestHandler):
+    """ Stand-in for the RPC API of a Luci router. """
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        """ Answers an RPC call. """
+        router = self.server.luci
+        router['requests'].append((self.path.split('?')[0],
+                                   self.client_address[1]))
+
+        call = json.loads(self.rfile.read(
+            int(self.headers['Content-Length'])).decode())
+
+        if self.path.startswith('/cgi-bin/luci/rpc/auth'):
+            router['token_count'] += 1
+            router['token'] = 'token_{}'.format(router['token_count'])
+            result = router['token'] if call['params'] == ['user', 'pass'] \
+                else None
+
+        elif 'auth={}'.format(router['token']) not in self.path:
+            self.send_response(403)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        elif call['method'] == 'net.arptable':
+            result = [{'HW address': 'F4:F5:D8:AA:AA:AA'}]
+
+        else:
+            result = {'cfg01': {'.type': 'host', 'name': 'chromecast',
+                                'mac': 'F4:F5:D8:AA:AA:AA'},
+                      'cfg02': {'.type': 'dnsmasq'}}
+
+        body = json.dumps({'id': None, 'result': result,
+                           'error': None}).encode()
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        """ Keep test output clean. """
+        pass
+
+
+class TestLuciDeviceScanner(unittest.TestCase):
+    """ Tests the Luci scanner against a stand-in Luci server. """
+
+    def setUp(self):  # pylint: disable=invalid-name
+        """ Starts the stand-in Luci server. """
+        self.server = http.server.HTTPServer(('127.0.0.1', 0), LuciHandler)
+        self.server.luci = self.luci = {
+            'requests': [], 'token': None, 'token_count': 0}
+
+        threading.Thread(target=self.server.serve_forever,
+                         daemon=True).start()
+
+        self.config = {
+            ha.CONF_HOST: '127.0.0.1:{}'.format(self.server.server_port),
+            ha.CONF_USERNAME: 'user', ha.CONF_PASSWORD: 'pass'}
+
+    def tearDown(self):  # pylint: disable=invalid-name
+        """ Stops the stand-in Luci server. """
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_scan_and_reauthenticate(self):
+        """ Test scanning and logging in again when the token expires. """
+        scanner = luci.LuciDeviceScanner(self.config)
+
+        self.assertTrue(scanner.success_init)
+        self.assertEqual(['F4:F5:D8:AA:AA:AA'], scanner.scan_devices())
+
+        # Names are looked up during the scan
+        self.assertEqual(
+            ['/cgi-bin/luci/rpc/auth', '/cgi-bin/luci/rpc/sys',
+             '/cgi-bin/luci/rpc/uci'],
+            [path for path, _ in self.luci['requests']])
+        self.assertEqual('chromecast',
+                         scanner.get_device_name('F4:F5:D8:AA:AA:AA'))
+        self.assertEqual(3, len(self.luci['requests']))
+
+        # One connection is used for all requests
+        self.assertEqual(1, len(set(
+            port for _, port in self.luci['requests'])))
+
+        # Expire the token on the router
+        self.luci['token'] = 'expired'
+        scanner.date_updated = None
+
+        self.assertEqual(['F4:F5:D8:AA:AA:AA'], scanner.scan_devices())
+        self.assertEqual('token_2', scanner.token)
+        self.assertEqual(
+            ['/cgi-bin/luci/rpc/sys', '/cgi-bin/luci/rpc/auth',
+             '/cgi-bin/luci/rpc/sys'],
+            [path for path, _ in self.luci['requests'][3:]])
+
+    def test_wrong_credentials(self):
+        """ Test that the scanner fails to initialize with wrong
+            credentials. """
+        self.config[ha.CONF_PASSWORD] = 'wrong'
+
+        self.assertFalse(luci.LuciDeviceScanner(self.config).success_init)
@@ -89,6 +89,55 @@ class TestComponentsGroup(unittest.TestCase):
         # Try to setup an empty group
         self.assertFalse(group.setup_group(self.hass, 'nothing', []))
 
+    def test_on_count(self):
+        """ Test that the group keeps count of the members that are on. """
+        manager = group.get_manager(self.hass)
+        bowl_group = manager.groups[self.group_name]
+
+        self.assertEqual(1, bowl_group.on_count)
+
+        self.hass.states.set('light.Ceiling', comps.STATE_ON)
+        self.hass._pool.block_till_done()
+
+        self.assertEqual(2, bowl_group.on_count)
+
+        # Attribute changes do not change the count
+        self.hass.states.set('light.Ceiling', comps.STATE_ON, {'level': 1})
+        self.hass.states.set('light.Bowl', comps.STATE_OFF)
+        self.hass._pool.block_till_done()
+
+        self.assertEqual(1, bowl_group.on_count)
+        self.assertTrue(group.is_on(self.hass, self.group_name))
+
+        # Setting up a group again replaces the old one
+        group.setup_group(self.hass, 'init_group', ['light.Bowl'], False)
+
+        self.assertIsNot(bowl_group, manager.groups[self.group_name])
+        self.assertFalse(group.is_on(self.hass, self.group_name))
+
+        self.hass.states.set('light.Ceiling', comps.STATE_OFF)
+        self.hass._pool.block_till_done()
+
+        self.assertEqual(1, bowl_group.on_count)
+
+    def test_member_change_seen_twice(self):
+        """ Test that a state change that was already read when the group
+            started does not count twice. """
+        bowl_group = group.get_manager(self.hass).groups[self.group_name]
+
+        old_state = ha.State('light.Bowl', comps.STATE_OFF)
+        new_state = self.hass.states.get('light.Bowl')
+
+        bowl_group._member_changed('light.Bowl', old_state, new_state)
+
+        self.assertEqual(1, bowl_group.on_count)
+
+        self.hass.states.set('light.Bowl', comps.STATE_OFF)
+        self.hass._pool.block_till_done()
+
+        self.assertEqual(0, bowl_group.on_count)
+        self.assertFalse(group.is_on(self.hass, self.group_name))
+
     def test__get_group_type(self):
         """ Test _get_group_type method. """
         self.assertEqual('on_off', group._get_group_type(comps.STATE_ON))
@@ -126,6 +175,44 @@ class TestComponentsGroup(unittest.TestCase):
         # Test that non strings are ignored
         self.assertEqual([], group.expand_entity_ids(self.hass, [5, True]))
 
+    def test_nested_groups(self):
+        """ Test expanding nested groups and finding the groups of an
+            entity. """
+        self.assertTrue(group.setup_group(
+            self.hass, 'nested_group',
+            ['switch.AC', self.group_name, self.mixed_group_name]))
+
+        nested_name = group.ENTITY_ID_FORMAT.format('nested_group')
+
+        self.assertEqual(
+            ['light.Bowl', 'switch.AC', 'light.Ceiling'],
+            group.expand_entity_ids(self.hass, ['light.Bowl', nested_name]))
+
+        self.assertEqual(
+            {self.group_name, self.mixed_group_name, nested_name},
+            group.get_groups(self.hass, 'light.Bowl'))
+        self.assertEqual(
+            {self.group_name, nested_name},
+            group.get_groups(self.hass, 'light.Ceiling'))
+        self.assertEqual(set(), group.get_groups(self.hass, 'switch.none'))
+
+        # A group cannot contain itself
+        self.assertFalse(group.setup_group(
+            self.hass, 'init_group', ['light.Bowl', nested_name]))
+        self.assertEqual(
+            [self.group_name, nested_name, self.group_name],
+            group.get_manager(self.hass).find_cycle(
+                self.group_name, [nested_name]))
+
+        # Replacing a group updates which groups an entity is in
+        group.setup_group(self.hass, 'init_group', ['light.Bowl'])
+
+        self.assertEqual(
+            set(), group.get_groups(self.hass, 'light.Ceiling'))
+        self.assertEqual(
+            {self.group_name, self.mixed_group_name, nested_name},
+            group.get_groups(self.hass, 'light.Bowl'))
+
     def test_get_entity_ids(self):
         """ Test get_entity_ids method. """
         # Get entity IDs from our group
@@ -161,3 +248,94 @@ class TestComponentsGroup(unittest.TestCase):
 
         self.assertEqual(comps.STATE_ON, group_state.state)
         self.assertFalse(group_state.attributes[group.ATTR_AUTO])
+
+    def test_aggregate_groups(self):
+        """ Test groups that aggregate the states of their members. """
+        sensors = ['tellstick_sensor.a', 'tellstick_sensor.b',
+                   'tellstick_sensor.c']
+
+        for entity_id, temperature in zip(sensors, ('20', '22.5', '25')):
+            self.hass.states.set(entity_id, temperature,
+                                 {comps.ATTR_UNIT_OF_MEASUREMENT: '°C'})
+
+        for aggregate in ('min', 'max', 'mean'):
+            self.assertTrue(group.setup_group(
+                self.hass, aggregate, sensors, aggregate=aggregate))
+
+        def states():
+            """ Returns the states of the min, max and mean groups. """
+            return [self.hass.states.get(
+                group.ENTITY_ID_FORMAT.format(aggregate)).state
+                    for aggregate in ('min', 'max', 'mean')]
+
+        self.assertEqual(['20.0', '25.0', '22.5'], states())
+        self.assertEqual(
+            '°C', self.hass.states.get('group.min').attributes[
+                comps.ATTR_UNIT_OF_MEASUREMENT])
+
+        self.hass.states.set('tellstick_sensor.c', '18')
+        self.hass._pool.block_till_done()
+
+        self.assertEqual(['18.0', '22.5', '20.17'], states())
+
+        # Members without a numeric state are left out
+        self.hass.states.set('tellstick_sensor.b', 'unknown')
+        self.hass.states.set('tellstick_sensor.a', '30')
+        self.hass._pool.block_till_done()
+
+        self.assertEqual(['18.0', '30.0', '24.0'], states())
+
+        for entity_id in sensors:
+            self.hass.states.set(entity_id, 'unknown')
+        self.hass._pool.block_till_done()
+
+        self.assertEqual([group.STATE_UNKNOWN] * 3, states())
+
+    def test_count_aggregate(self):
+        """ Test counting the active members of a group. """
+        self.hass.states.set('cover.garage', group.STATE_OPEN)
+
+        self.assertTrue(group.setup(self.hass, {group.DOMAIN: {
+            'active': 'count:light.Bowl,light.Ceiling,cover.garage'}}))
+
+        self.assertEqual('2', self.hass.states.get('group.active').state)
+
+        self.hass.states.set('light.Ceiling', comps.STATE_ON)
+        self.hass.states.set('cover.garage', 'closed')
+        self.hass.states.set('light.Bowl', comps.STATE_ON, {'level': 1})
+        self.hass._pool.block_till_done()
+
+        self.assertEqual('2', self.hass.states.get('group.active').state)
+
+        # Unknown aggregates and non existing members are errors
+        self.assertFalse(group.setup_group(
+            self.hass, 'unknown', ['light.Bowl'], aggregate='median'))
+        self.assertFalse(group.setup_group(
+            self.hass, 'missing', ['light.Missing'], aggregate='count'))
+
+    def test_min_aggregate(self):
+        """ Test removing values from the min aggregate. """
+        aggregate = group.MinAggregate()
+
+        for value in (3, 1, 2, 1):
+            aggregate.add(value)
+
+        aggregate.remove(1)
+        self.assertEqual(1, aggregate.value)
+
+        aggregate.remove(1)
+        self.assertEqual(2, aggregate.value)
+
+        aggregate.remove(3)
+        aggregate.remove(2)
+        self.assertIsNone(aggregate.value)
+
+        # Values below the minimum do not pile up in the heap
+        aggregate.add(1)
+
+        for value in range(2, 1000):
+            aggregate.add(value)
+            aggregate.remove(value)
+
+        self.assertEqual(1, aggregate.value)
+        self.assertLessEqual(len(aggregate._heap), 2)
@@ -8,6 +8,8 @@ Tests Home Assistant HTTP component does what it should do.
 import re
 import unittest
 import json
+import socket
+from unittest import mock
 
 import requests
 
@@ -99,6 +101,34 @@ class TestHTTP(unittest.TestCase):
 
         self.assertEqual(hass.states.all(), remote_data)
 
+    def test_api_list_state_entities_filtered(self):
+        """ Test filtering and limiting the fields of the state list. """
+        hass.states.set('filter.one', 'on', {'big': 'attribute'})
+        hass.states.set('filter.two', 'off')
+
+        req = requests.get(_url(remote.URL_API_STATES),
+                           params={'domain': 'filter',
+                                   'fields': 'entity_id,state'},
+                           headers=HA_HEADERS)
+
+        self.assertEqual([{'entity_id': 'filter.one', 'state': 'on'},
+                          {'entity_id': 'filter.two', 'state': 'off'}],
+                         req.json())
+
+        req = requests.get(_url(remote.URL_API_STATES),
+                           params={'entity_id': 'filter.two,test.test'},
+                           headers=HA_HEADERS)
+
+        self.assertEqual(
+            [hass.states.get('filter.two'), hass.states.get('test.test')],
+            [ha.State.from_dict(item) for item in req.json()])
+
+        req = requests.get(_url(remote.URL_API_STATES),
+                           params={'fields': 'entity_id,secret'},
+                           headers=HA_HEADERS)
+
+        self.assertEqual(422, req.status_code)
+
     def test_api_get_state(self):
         """ Test if the debug interface allows us to get a state. """
         req = requests.get(
@@ -152,6 +182,27 @@ class TestHTTP(unittest.TestCase):
         self.assertEqual(201, req.status_code)
         self.assertEqual(cur_state, new_state)
 
+    def test_api_set_multiple_states(self):
+        """ Test if the API allows us to set multiple states at once. """
+        hass.states.set("test.bulk_existing", "off")
+
+        req = requests.post(
+            _url(remote.URL_API_STATES),
+            data=json.dumps({"states": [
+                {"entity_id": "test.bulk_existing", "state": "on"},
+                {"entity_id": "test.bulk_new", "state": "on",
+                 "attributes": {"test": 1}},
+                {"entity_id": "invalid", "state": "on"},
+                {"state": "on"}]}),
+            headers=HA_HEADERS)
+
+        self.assertEqual(200, req.status_code)
+        self.assertEqual([200, 201, 422, 400],
+                         [result["status"] for result in req.json()])
+        self.assertEqual(hass.states.get("test.bulk_new"),
+                         ha.State.from_dict(req.json()[1]["state"]))
+        self.assertEqual("on", hass.states.get("test.bulk_existing").state)
+
     # pylint: disable=invalid-name
     def test_api_fire_event_with_no_data(self):
         """ Test if the API allows us to fire an event. """
@@ -214,6 +265,42 @@ class TestHTTP(unittest.TestCase):
         self.assertEqual(422, req.status_code)
         self.assertEqual(0, len(test_value))
 
+    def test_api_fire_event_with_str_only_json(self):
+        """ Test that bodies are decoded before they are parsed, as json
+            only accepts bytes from Python 3.6 on. """
+        test_value = []
+
+        hass.listen_once_event("test_event_str_json", test_value.append)
+
+        def loads(data):
+            """ json.loads as it behaves on Python 3.5. """
+            if not isinstance(data, str):
+                raise TypeError("the JSON object must be str")
+
+            return json.loads(data)
+
+        with mock.patch.object(http, 'json',
+                               mock.Mock(loads=loads, dumps=json.dumps)):
+            req = requests.post(
+                _url(remote.URL_API_EVENTS_EVENT.format(
+                    "test_event_str_json")),
+                data=json.dumps({"test": 1}),
+                headers=HA_HEADERS)
+
+        hass._pool.block_till_done()
+
+        self.assertEqual(200, req.status_code)
+        self.assertEqual(1, len(test_value))
+
+    def test_api_fire_event_with_invalid_encoding(self):
+        """ Test that a body that is not UTF-8 is rejected. """
+        req = requests.post(
+            _url(remote.URL_API_EVENTS_EVENT.format("test_event_encoding")),
+            data=b'{"test": "\xff"}',
+            headers=HA_HEADERS)
+
+        self.assertEqual(422, req.status_code)
+
     def test_api_get_event_listeners(self):
         """ Test if we can get the list of events being listened for. """
         req = requests.get(_url(remote.URL_API_EVENTS),
@@ -279,3 +366,74 @@ class TestHTTP(unittest.TestCase):
         hass._pool.block_till_done()
 
         self.assertEqual(1, len(test_value))
+
+    def test_api_batch(self):
+        """ Test if the API executes a batch of service calls and events. """
+        service_calls = []
+        events = []
+
+        hass.services.register("test_domain", "test_batch",
+                               lambda call: service_calls.append(call))
+        hass.listen_once_event("test_batch_event", events.append)
+
+        req = requests.post(
+            _url(remote.URL_API_BATCH),
+            data=json.dumps({"batch": [
+                {"type": "service", "domain": "test_domain",
+                 "service": "test_batch", "service_data": {"test": 1}},
+                {"type": "event", "event_type": "test_batch_event"},
+                {"type": "event", "event_type": "test_batch_event",
+                 "event_data": "not an object"},
+                {"type": "unknown"},
+                {"type": "event", "event_type": ["test_batch_event"]},
+                {"type": "service", "domain": "test_domain",
+                 "service": {"test_batch": 1}}]}),
+            headers=HA_HEADERS)
+
+        hass._pool.block_till_done()
+
+        self.assertEqual(200, req.status_code)
+        self.assertEqual([200, 200, 422, 400, 422, 422],
+                         [result["status"] for result in req.json()])
+        self.assertEqual(1, len(service_calls))
+        self.assertEqual(1, service_calls[0].data["test"])
+        self.assertEqual(1, len(events))
+
+    def test_body_too_large(self):
+        """ Test that bodies over the maximum size are rejected unread. """
+        sock = socket.create_connection(("127.0.0.1", SERVER_PORT))
+
+        try:
+            sock.sendall(
+                "POST {} HTTP/1.1\r\n{}: {}\r\nContent-Length: {}\r\n\r\n"
+                .format(remote.URL_API_STATES, remote.AUTH_HEADER,
+                        API_PASSWORD, http.DEFAULT_MAX_BODY_SIZE + 1)
+                .encode())
+
+            self.assertIn(b" 413 ", sock.makefile('rb').readline())
+
+        finally:
+            sock.close()
+
+    def test_api_metrics(self):
+        """ Test if the metrics are returned in the Prometheus format. """
+        hass.metrics.enabled = True
+
+        try:
+            hass.bus.fire('test_metrics_event')
+            hass.metrics.record_job('test_metrics_job', 0, 5)
+
+            req = requests.get(_url(remote.URL_API_METRICS),
+                               headers=HA_HEADERS)
+
+        finally:
+            hass.metrics.enabled = False
+
+        self.assertEqual(200, req.status_code)
+        self.assertTrue(req.headers['content-type'].startswith('text/plain'))
+        self.assertIn(
+            'homeassistant_events_fired_total'
+            '{event_type="test_metrics_event"} 1', req.text.split("\n"))
+        self.assertIn(
+            'homeassistant_slowest_job_seconds{job="test_metrics_job"} 5',
+            req.text.split("\n"))
@@ -0,0 +1,177 @@
+"""
+test.test_component_http_async
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Tests the asyncio server backend of the HTTP component.
+"""
+# pylint: disable=protected-access,too-many-public-methods
+import unittest
+import json
+import socket
+import threading
+from unittest import mock
+
+import requests
+
+import homeassistant as ha
+import homeassistant.remote as remote
+import homeassistant.components.http as http
+from homeassistant.components.http.async_server import (
+    HomeAssistantAsyncHTTPServer)
+
+API_PASSWORD = "test1234"
+
+SERVER_PORT = 8125
+
+# Port for servers that are started and stopped by a single test
+STOP_SERVER_PORT = 8127
+
+HTTP_BASE_URL = "http://127.0.0.1:{}".format(SERVER_PORT)
+
+HA_HEADERS = {remote.AUTH_HEADER: API_PASSWORD}
+
+hass = None
+
+
+def _url(path=""):
+    """ Helper method to generate urls. """
+    return HTTP_BASE_URL + path
+
+
+def setUpModule():   # pylint: disable=invalid-name
+    """ Initalizes a Home Assistant server using the asyncio backend. """
+    global hass
+
+    hass = ha.HomeAssistant()
+
+    hass.states.set('test.test', 'a_state')
+
+    http.setup(hass,
+               {http.DOMAIN: {http.CONF_API_PASSWORD: API_PASSWORD,
+                              http.CONF_SERVER_PORT: SERVER_PORT,
+                              http.CONF_SERVER_BACKEND:
+                              http.SERVER_BACKEND_ASYNCIO}})
+
+    hass.start()
+
+
+def tearDownModule():   # pylint: disable=invalid-name
+    """ Stops the Home Assistant server. """
+    global hass
+
+    hass.stop()
+
+
+class TestHTTPAsync(unittest.TestCase):
+    """ Test the asyncio HTTP server backend. """
+
+    def test_api_password(self):
+        """ Test if we get access denied without a valid password. """
+        req = requests.get(
+            _url(remote.URL_API_STATES_ENTITY.format("test.test")))
+
+        self.assertEqual(401, req.status_code)
+
+    def test_api_get_state(self):
+        """ Test if we can get a state. """
+        req = requests.get(
+            _url(remote.URL_API_STATES_ENTITY.format("test.test")),
+            headers=HA_HEADERS)
+
+        self.assertEqual(hass.states.get("test.test"),
+                         ha.State.from_dict(req.json()))
+
+    def test_api_state_change(self):
+        """ Test if we can change a state. """
+        req = requests.post(
+            _url(remote.URL_API_STATES_ENTITY.format("test.async")),
+            data=json.dumps({"state": "on"}),
+            headers=HA_HEADERS)
+
+        self.assertEqual(201, req.status_code)
+        self.assertEqual("on", hass.states.get("test.async").state)
+
+    def test_not_found(self):
+        """ Test that a request to an unknown path gets a response. """
+        req = requests.get(_url("/does_not_exist"), headers=HA_HEADERS)
+
+        self.assertEqual(404, req.status_code)
+
+    def test_keep_alive(self):
+        """ Test that multiple requests can be made over one connection. """
+        session = requests.Session()
+
+        for _ in range(3):
+            req = session.get(_url(remote.URL_API), headers=HA_HEADERS)
+
+            self.assertEqual(200, req.status_code)
+            self.assertEqual("keep-alive", req.headers['Connection'])
+
+    def test_idle_connections(self):
+        """ Test that idle connections do not block other requests. """
+        sockets = [socket.create_connection(("127.0.0.1", SERVER_PORT))
+                   for _ in range(20)]
+
+        try:
+            req = requests.get(_url(remote.URL_API), headers=HA_HEADERS)
+
+            self.assertEqual(200, req.status_code)
+
+        finally:
+            for sock in sockets:
+                sock.close()
+
+    def test_body_too_large(self):
+        """ Test that bodies over the maximum size are rejected unread. """
+        sock = socket.create_connection(("127.0.0.1", SERVER_PORT))
+
+        try:
+            sock.sendall(
+                "POST {} HTTP/1.1\r\n{}: {}\r\nContent-Length: {}\r\n\r\n"
+                .format(remote.URL_API_STATES, remote.AUTH_HEADER,
+                        API_PASSWORD, http.DEFAULT_MAX_BODY_SIZE + 1)
+                .encode())
+
+            self.assertIn(b" 413 ", sock.makefile('rb').readline())
+
+        finally:
+            sock.close()
+
+    def test_handler_error(self):
+        """ Test that a failing handler results in a 500. """
+        with mock.patch.object(http.RequestHandler, '_handle_get_api',
+                               side_effect=RuntimeError("handler failed")):
+            req = requests.get(_url(remote.URL_API), headers=HA_HEADERS)
+
+        self.assertEqual(500, req.status_code)
+
+    def test_stop_with_open_connection(self):
+        """ Test that stopping cancels the tasks of open connections. """
+        server = HomeAssistantAsyncHTTPServer(
+            ('127.0.0.1', STOP_SERVER_PORT), http.RequestHandler, hass,
+            API_PASSWORD)
+
+        thread = threading.Thread(target=server.start, daemon=True)
+        thread.start()
+
+        session = requests.Session()
+
+        try:
+            req = session.get(
+                "http://127.0.0.1:{}{}".format(STOP_SERVER_PORT,
+                                               remote.URL_API),
+                headers=HA_HEADERS)
+
+            self.assertEqual("keep-alive", req.headers['Connection'])
+
+            tasks = list(server._tasks)
+
+            server.stop()
+            thread.join(5)
+
+        finally:
+            session.close()
+
+        self.assertEqual(1, len(tasks))
+        self.assertTrue(tasks[0].cancelled())
+        self.assertFalse(thread.is_alive())
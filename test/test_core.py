@@ -84,7 +84,7 @@ class TestHomeAssistant(unittest.TestCase):
         self.hass.track_state_change(
             'light.Bowl', lambda a, b, c: specific_runs.append(1), 'on', 'off')
 
-        self.hass.track_state_change(
+        remove = self.hass.track_state_change(
             'light.Bowl', lambda a, b, c: wildcard_runs.append(1),
             ha.MATCH_ALL, ha.MATCH_ALL)
 
@@ -112,6 +112,12 @@ class TestHomeAssistant(unittest.TestCase):
         self.assertEqual(1, len(specific_runs))
         self.assertEqual(3, len(wildcard_runs))
 
+        # Removed listener should not be called anymore
+        remove()
+        self.hass.states.set('light.Bowl', 'off')
+        self.hass._pool.block_till_done()
+        self.assertEqual(3, len(wildcard_runs))
+
     def test_listen_once_event(self):
         """ Test listen_once_event method. """
         runs = []
@@ -127,6 +133,24 @@ class TestHomeAssistant(unittest.TestCase):
         self.hass._pool.block_till_done()
         self.assertEqual(1, len(runs))
 
+        # Firing twice before the pool runs the listener only queues it once
+        self.hass.listen_once_event('test_event', lambda x: runs.append(1))
+
+        self.hass.bus.fire('test_event')
+        self.hass.bus.fire('test_event')
+        self.hass._pool.block_till_done()
+        self.assertEqual(2, len(runs))
+        self.assertNotIn('test_event', self.hass.bus.listeners)
+
+        # A removed one time listener does not fire
+        remove = self.hass.listen_once_event(
+            'test_event', lambda x: runs.append(1))
+        remove()
+
+        self.hass.bus.fire('test_event')
+        self.hass._pool.block_till_done()
+        self.assertEqual(2, len(runs))
+
     def test_track_point_in_time(self):
         """ Test track point in time. """
         before_birthday = datetime(1985, 7, 9, 12, 0, 0)
@@ -158,6 +182,15 @@ class TestHomeAssistant(unittest.TestCase):
         self.hass._pool.block_till_done()
         self.assertEqual(2, len(runs))
 
+        remove = self.hass.track_point_in_time(
+            lambda x: runs.append(1), birthday_paulus)
+        remove()
+
+        self._send_time_changed(after_birthday)
+        self.hass._pool.block_till_done()
+        self.assertEqual(2, len(runs))
+        self.assertNotIn(ha.EVENT_TIME_CHANGED, self.hass.bus.listeners)
+
     def test_track_time_change(self):
         """ Test tracking time change. """
         wildcard_runs = []
@@ -182,6 +215,86 @@ class TestHomeAssistant(unittest.TestCase):
         self.assertEqual(2, len(specific_runs))
         self.assertEqual(3, len(wildcard_runs))
 
+    def test_unload_component(self):
+        """ Test that listeners and services owned by a component are
+            removed when it is unloaded. """
+        runs = []
+
+        with self.hass.component_context('test') as scope:
+            self.hass.track_time_change(lambda x: runs.append(1))
+            self.hass.services.register('test', 'test_service', len)
+            self.hass.register_unload(lambda: runs.append(4))
+
+        self.hass.track_time_change(lambda x: runs.append(2))
+
+        # Listeners added later within the context belong to the same scope
+        with self.hass.component_context('test') as later_scope:
+            self.hass.listen_once_event('test_event', lambda x: runs.append(3))
+
+        self.assertIs(scope, later_scope)
+        self.assertEqual(2, len(scope.listeners))
+        self.assertEqual([('test', 'test_service')], scope.services)
+
+        self.hass.components.append('test')
+        self.hass.unload_component('test')
+
+        self._send_time_changed(datetime(2014, 5, 24, 12, 0, 0))
+        self.hass._pool.block_till_done()
+
+        self.hass.bus.fire('test_event')
+        self.hass._pool.block_till_done()
+
+        self.assertEqual([4, 2], runs)
+        self.assertFalse(
+            self.hass.services.has_service('test', 'test_service'))
+        self.assertNotIn('test', self.hass.components)
+
+    def test_scope_untracks_removed(self):
+        """ Test that listeners and services that are removed are no longer
+            owned by the component. """
+        with self.hass.component_context('test') as scope:
+            remove = self.hass.bus.listen('test_event', len)
+            self.hass.bus.listen('test_event', len)
+            self.hass.services.register('test', 'test_service', len)
+            self.hass.services.register('test', 'other_service', len)
+
+        remove()
+        self.hass.services.unregister('test', 'test_service')
+
+        self.assertEqual([('test_event', len)], scope.listeners)
+        self.assertEqual([('test', 'other_service')], scope.services)
+
+        # A service registered again by another component changes owner
+        with self.hass.component_context('other'):
+            self.hass.services.register('test', 'other_service', len)
+
+        self.assertEqual([], scope.services)
+
+        self.hass.unload_component('test')
+
+        self.assertEqual([], scope.listeners)
+        self.assertTrue(
+            self.hass.services.has_service('test', 'other_service'))
+
+    def test_track_start(self):
+        """ Test that start actions run on start or right away if Home
+            Assistant has started already. """
+        runs = []
+
+        self.hass.track_start(lambda event: runs.append(event.event_type))
+
+        self.hass.start()
+        self.hass._pool.block_till_done()
+
+        self.assertEqual([ha.EVENT_HOMEASSISTANT_START], runs)
+
+        self.hass.track_start(lambda event: runs.append(event.event_type))
+        self.hass._pool.block_till_done()
+
+        self.assertEqual([ha.EVENT_HOMEASSISTANT_START] * 2, runs)
+
+        self.hass.stop()
+
     def _send_time_changed(self, now):
         """ Send a time changed event. """
         self.hass.bus.fire(ha.EVENT_TIME_CHANGED, {ha.ATTR_NOW: now})
@@ -234,6 +347,11 @@ class TestEventBus(unittest.TestCase):
         # Try deleting listener while category doesn't exist either
         self.bus.remove_listener('test', listener)
 
+        # Remove listener using the returned function
+        remove = self.bus.listen('test', listener)
+        remove()
+        self.assertEqual(old_count, len(self.bus.listeners))
+
 
 class TestState(unittest.TestCase):
     """ Test EventBus methods. """
@@ -285,6 +403,46 @@ class TestStateMachine(unittest.TestCase):
         # If it does not exist, we should get False
         self.assertFalse(self.states.remove('light.Bowl'))
 
+    def test_as_dicts(self):
+        """ Test as_dicts method. """
+        self.states.set("light.Ceiling", "off", {"brightness": 100})
+
+        self.assertEqual(
+            [{'entity_id': 'light.Bowl', 'state': 'on'},
+             {'entity_id': 'light.Ceiling', 'state': 'off'}],
+            self.states.as_dicts(domains=['light'],
+                                 fields=['entity_id', 'state']))
+
+        self.assertEqual(
+            [self.states.get('switch.AC').as_dict()],
+            self.states.as_dicts(entity_ids=['switch.AC', 'switch.none']))
+
+        self.assertEqual(
+            [{'state': 'off'}],
+            self.states.as_dicts(domains=['light'],
+                                 entity_ids=['light.Ceiling', 'switch.AC'],
+                                 fields=['state']))
+
+        self.states.remove('switch.AC')
+
+        self.assertEqual([], self.states.as_dicts(domains=['switch']))
+
+    def test_set_multiple(self):
+        """ Test set_multiple method. """
+        results = self.states.set_multiple([
+            ('light.Bowl', 'off', None),
+            ('switch.AC', 'off', None),
+            ('light.Ceiling', 'on', {'brightness': 100})])
+
+        self.assertEqual([False, False, True],
+                         [is_new for _, is_new in results])
+        self.assertEqual(['off', 'off', 'on'],
+                         [state.state for state, _ in results])
+        self.assertTrue(self.states.is_state('light.Bowl', 'off'))
+        self.assertEqual(
+            {'brightness': 100},
+            self.states.get('light.Ceiling').attributes)
+
 
 class TestServiceCall(unittest.TestCase):
     """ Test ServiceCall class. """
@@ -317,3 +475,11 @@ class TestServiceRegistry(unittest.TestCase):
         """ Test has_service method. """
         self.assertTrue(
             self.services.has_service("test_domain", "test_service"))
+
+    def test_unregister(self):
+        """ Test unregister method. """
+        self.services.unregister("test_domain", "test_service")
+
+        self.assertFalse(
+            self.services.has_service("test_domain", "test_service"))
+        self.assertNotIn("test_domain", self.services.services)
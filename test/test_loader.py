@@ -25,6 +25,13 @@ class TestLoader(unittest.TestCase):
         """ Stop down stuff we started. """
         self.hass._pool.stop()
 
+    def test_prepare(self):
+        """ Test if prepare finds built-in and custom components. """
+        self.assertIn('homeassistant.components.http',
+                      loader.AVAILABLE_COMPONENTS)
+        self.assertIn('custom_components.custom_one',
+                      loader.AVAILABLE_COMPONENTS)
+
     def test_set_component(self):
         """ Test if set_component works. """
         loader.set_component('switch.test', mock_toggledevice_platform)
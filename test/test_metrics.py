@@ -0,0 +1,137 @@
+"""
+test.test_metrics
+~~~~~~~~~~~~~~~~~
+
+Tests the metrics that are collected by the core.
+"""
+# pylint: disable=too-many-public-methods,protected-access
+import unittest
+
+import homeassistant as ha
+import homeassistant.metrics as metrics
+
+
+class TestMetrics(unittest.TestCase):
+    """ Test the Metrics class. """
+
+    def setUp(self):  # pylint: disable=invalid-name
+        self.metrics = metrics.Metrics(True)
+
+    def test_disabled(self):
+        """ Test that nothing is recorded while disabled. """
+        self.metrics.enabled = False
+
+        self.metrics.inc('test_total')
+        self.metrics.observe('test_seconds', 1)
+        self.metrics.record_job('test', 1, 1)
+
+        self.assertIsNone(self.metrics.get('test_total'))
+        self.assertIsNone(self.metrics.get('test_seconds'))
+        self.assertEqual([], self.metrics.slowest_jobs)
+
+    def test_counter(self):
+        """ Test counting with labels. """
+        self.metrics.inc('test_total', kind='a')
+        self.metrics.inc('test_total', 2, kind='a')
+        self.metrics.inc('test_total', kind='b')
+
+        self.assertEqual(3, self.metrics.get('test_total', kind='a'))
+        self.assertEqual(1, self.metrics.get('test_total', kind='b'))
+
+    def test_histogram(self):
+        """ Test observing values in a histogram. """
+        for value in (0.5, 1, 3, 20):
+            self.metrics.observe('test_seconds', value, (1, 5))
+
+        histogram = self.metrics.get('test_seconds')
+
+        self.assertEqual(4, histogram.count)
+        self.assertEqual(24.5, histogram.sum)
+        self.assertEqual([(1, 2), (5, 3)], histogram.cumulative_counts())
+
+    def test_slowest_jobs(self):
+        """ Test that only the slowest jobs are remembered. """
+        for index in range(metrics.SLOWEST_JOB_COUNT + 5):
+            self.metrics.record_job('job_{}'.format(index), 0, index)
+
+        jobs = self.metrics.slowest_jobs
+
+        self.assertEqual(metrics.SLOWEST_JOB_COUNT, len(jobs))
+        self.assertEqual('job_{}'.format(metrics.SLOWEST_JOB_COUNT + 4),
+                         jobs[0]['listener'])
+
+    def test_to_prometheus(self):
+        """ Test rendering in the Prometheus text format. """
+        self.metrics.add_gauge('test_depth', lambda: 3)
+        self.metrics.inc('test_total', kind='say "hi"')
+        self.metrics.observe('test_seconds', 2, (1, 5))
+
+        lines = self.metrics.to_prometheus().split("\n")
+
+        self.assertIn('# TYPE test_depth gauge', lines)
+        self.assertIn('test_depth 3', lines)
+        self.assertIn('test_total{kind="say \\"hi\\""} 1', lines)
+        self.assertIn('test_seconds_bucket{le="1"} 0', lines)
+        self.assertIn('test_seconds_bucket{le="5"} 1', lines)
+        self.assertIn('test_seconds_bucket{le="+Inf"} 1', lines)
+        self.assertIn('test_seconds_count 1', lines)
+
+    def test_slowest_jobs_to_prometheus(self):
+        """ Test that the slowest jobs are rendered as gauges. """
+        self.metrics.record_job('fast', 0, 1)
+        self.metrics.record_job('slow', 0, 3)
+        self.metrics.record_job('slow', 0, 2)
+
+        lines = self.metrics.to_prometheus().split("\n")
+
+        self.assertIn('# TYPE {} gauge'.format(metrics.METRIC_SLOWEST_JOB),
+                      lines)
+        self.assertEqual(
+            ['{}{{job="slow"}} 3'.format(metrics.METRIC_SLOWEST_JOB),
+             '{}{{job="fast"}} 1'.format(metrics.METRIC_SLOWEST_JOB)],
+            [line for line in lines
+             if line.startswith(metrics.METRIC_SLOWEST_JOB)])
+
+
+class TestCoreMetrics(unittest.TestCase):
+    """ Test the metrics recorded by Home Assistant. """
+
+    def setUp(self):  # pylint: disable=invalid-name
+        self.hass = ha.HomeAssistant()
+        self.hass.metrics.enabled = True
+
+    def tearDown(self):  # pylint: disable=invalid-name
+        """ Stop down stuff we started. """
+        self.hass._pool.stop()
+
+    def test_event_metrics(self):
+        """ Test that events and listener jobs are recorded. """
+        def test_listener(event):
+            """ Listener to be measured. """
+            pass
+
+        self.hass.bus.listen('test_event', test_listener)
+        self.hass.bus.listen('test_event', test_listener)
+
+        self.hass.bus.fire('test_event')
+        self.hass._pool.block_till_done()
+
+        self.assertEqual(1, self.hass.metrics.get(
+            metrics.METRIC_EVENTS_FIRED, event_type='test_event'))
+        self.assertEqual(2, self.hass.metrics.get(
+            metrics.METRIC_EVENT_FAN_OUT, event_type='test_event').sum)
+        self.assertEqual(2, self.hass.metrics.get(
+            metrics.METRIC_JOB_RUN, listener='test_listener').count)
+        self.assertEqual(2, self.hass.metrics.get(
+            metrics.METRIC_JOB_WAIT).count)
+
+    def test_service_metrics(self):
+        """ Test that service calls are recorded. """
+        self.hass.services.register('test', 'service', lambda call: None)
+
+        self.hass.call_service('test', 'service')
+        self.hass._pool.block_till_done()
+
+        self.assertEqual(1, self.hass.metrics.get(
+            metrics.METRIC_SERVICE_CALL,
+            domain='test', service='service').count)
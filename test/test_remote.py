@@ -9,6 +9,7 @@ import unittest
 
 import homeassistant as ha
 import homeassistant.remote as remote
+import homeassistant.metrics as metrics
 import homeassistant.components.http as http
 
 API_PASSWORD = "test1234"
@@ -117,6 +118,32 @@ class TestRemoteMethods(unittest.TestCase):
 
         self.assertEqual('set_test', hass.states.get('test.test').state)
 
+    def test_set_states(self):
+        """ Test Python API set_states. """
+        results = remote.set_states(
+            master_api, [('test.test', 'set_states_test', None),
+                         ('test.set_states', 'on', {'test': 1})])
+
+        self.assertEqual([False, True], [is_new for _, is_new in results])
+        self.assertEqual('set_states_test', hass.states.get('test.test').state)
+        self.assertEqual(hass.states.get('test.set_states'), results[1][0])
+
+    def test_binary_wire_format(self):
+        """ Test that the API negotiates and uses the binary format. """
+        binary_api = remote.API("127.0.0.1", API_PASSWORD, use_binary=True)
+
+        self.assertEqual(remote.APIStatus.OK, remote.validate_api(binary_api))
+        self.assertTrue(binary_api._send_binary)
+
+        self.assertEqual(hass.states.all(), remote.get_states(binary_api))
+        self.assertEqual(hass.states.get('test.test'),
+                         remote.get_state(binary_api, 'test.test'))
+
+        self.assertTrue(remote.set_state(
+            binary_api, 'test.binary', 'on', {'test': 1}))
+        self.assertEqual({'test': 1},
+                         hass.states.get('test.binary').attributes)
+
     def test_is_state(self):
         """ Test Python API is_state. """
 
@@ -150,6 +177,37 @@ class TestRemoteMethods(unittest.TestCase):
 
         self.assertEqual(1, len(test_value))
 
+    def test_call_services(self):
+        """ Test Python API call_services. """
+        test_value = []
+
+        hass.services.register("test_domain", "test_services",
+                               lambda call: test_value.append(call))
+
+        self.assertTrue(remote.call_services(
+            master_api, [("test_domain", "test_services", {"count": 1}),
+                         ("test_domain", "test_services", None)]))
+
+        hass._pool.block_till_done()
+
+        self.assertEqual(2, len(test_value))
+
+    def test_fire_events(self):
+        """ Test Python API fire_events. """
+        test_value = []
+
+        hass.bus.listen("test.fire_events", test_value.append)
+
+        self.assertTrue(remote.fire_events(
+            master_api, [("test.fire_events", None),
+                         ("test.fire_events", {"test": 1})]))
+
+        hass._pool.block_till_done()
+
+        self.assertEqual(2, len(test_value))
+
+        hass.bus.remove_listener("test.fire_events", test_value.append)
+
 
 class TestRemoteClasses(unittest.TestCase):
     """ Test the homeassistant.remote module. """
@@ -199,3 +257,17 @@ class TestRemoteClasses(unittest.TestCase):
         hass._pool.block_till_done()
 
         self.assertEqual(1, len(test_value))
+
+    def test_eventbus_metrics(self):
+        """ Test that the event bus of a slave records metrics. """
+        slave.metrics.enabled = True
+
+        try:
+            slave.bus.fire("test.metrics", origin=ha.EventOrigin.remote)
+
+            self.assertEqual(
+                1, slave.metrics.get(metrics.METRIC_EVENTS_FIRED,
+                                     event_type="test.metrics"))
+
+        finally:
+            slave.metrics.enabled = False
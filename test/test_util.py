@@ -43,6 +43,10 @@ class TestUtil(unittest.TestCase):
         """ Test str_to_datetime. """
         self.assertEqual(datetime(1986, 7, 9, 12, 0, 0),
                          util.str_to_datetime("12:00:00 09-07-1986"))
+        self.assertEqual(datetime(1986, 7, 9, 2, 0, 0),
+                         util.str_to_datetime("2:00:00 9-7-1986"))
+        self.assertIsNone(util.str_to_datetime("12:00:00 32-07-1986"))
+        self.assertIsNone(util.str_to_datetime("not a date"))
 
     def test_split_entity_id(self):
         """ Test split_entity_id. """
@@ -87,3 +91,12 @@ class TestUtil(unittest.TestCase):
         self.assertEqual(
             "Beer_3",
             util.ensure_unique_string("Beer", ["Beer", "Beer_2"]))
+
+    def test_unique_string_allocator(self):
+        """ Test UniqueStringAllocator. """
+        allocator = util.UniqueStringAllocator(["Beer_2"])
+
+        self.assertEqual(
+            ["Beer", "Beer_3", "Wine", "Beer_4", "Beer_2_2"],
+            [allocator.allocate(string) for string
+             in ("Beer", "Beer", "Wine", "Beer", "Beer_2")])
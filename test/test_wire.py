@@ -0,0 +1,94 @@
+"""
+test.test_wire
+~~~~~~~~~~~~~~
+
+Tests the binary wire format.
+"""
+# pylint: disable=too-many-public-methods,protected-access
+import unittest
+from datetime import datetime
+
+import homeassistant as ha
+import homeassistant.wire as wire
+
+
+class TestWire(unittest.TestCase):
+    """ Tests homeassistant.wire. """
+
+    def test_round_trip(self):
+        """ Test that JSON compatible data survives a round trip. """
+        for obj in (None, True, False, 0, 127, 128, -1, -33, -200, 70000,
+                    2**40, -2**40, 1.5, "", "x" * 40, "x" * 300,
+                    "x" * 70000, "é", [], [1, [2, "3"]],
+                    list(range(20)), {}, {"a": {"b": None}},
+                    {str(i): i for i in range(20)}):
+            self.assertEqual(obj, wire.unpack(wire.pack(obj)))
+
+    def test_tuple(self):
+        """ Test that tuples are encoded as lists. """
+        self.assertEqual([1, 2], wire.unpack(wire.pack((1, 2))))
+
+    def test_datetime(self):
+        """ Test encoding datetime objects. """
+        for obj in (datetime(2015, 2, 1, 12, 0, 5),
+                    datetime(1960, 1, 1, 0, 0, 0, 5)):
+            self.assertEqual(obj, wire.unpack(wire.pack(obj)))
+
+    def test_state(self):
+        """ Test encoding State objects. """
+        state = ha.State("light.bowl", "on", {"brightness": 100},
+                         datetime(2015, 2, 1, 12, 0, 5))
+
+        result = wire.unpack(wire.pack({"new_state": state}))["new_state"]
+
+        self.assertEqual(state, result)
+        self.assertEqual(state.last_changed, result.last_changed)
+
+    def test_event(self):
+        """ Test encoding Event objects. """
+        event = wire.unpack(wire.pack(
+            ha.Event("test", {"a": 1}, ha.EventOrigin.remote)))
+
+        self.assertEqual("test", event.event_type)
+        self.assertEqual({"a": 1}, event.data)
+        self.assertEqual(ha.EventOrigin.remote, event.origin)
+
+    def test_service_call(self):
+        """ Test encoding ServiceCall objects. """
+        call = wire.unpack(wire.pack(
+            ha.ServiceCall("light", "turn_on", {"entity_id": "light.bowl"})))
+
+        self.assertEqual("light", call.domain)
+        self.assertEqual("turn_on", call.service)
+        self.assertEqual({"entity_id": "light.bowl"}, call.data)
+
+    def test_unsupported(self):
+        """ Test that unsupported objects raise TypeError. """
+        self.assertRaises(TypeError, wire.pack, object())
+        self.assertRaises(TypeError, wire.pack, 2**64)
+
+    def test_invalid_data(self):
+        """ Test that invalid data raises ValueError. """
+        for data in (b"", b"\xc1", b"\xa5ab", b"\x92\x01", b"\x01\x02",
+                     b"\xd6\x02abcd", b"\x91" * 100000):
+            self.assertRaises(ValueError, wire.unpack, data)
+
+    def test_invalid_extension(self):
+        """ Test that extension types with invalid fields raise ValueError. """
+        for ext_type, fields in (
+                (wire.EXT_DATETIME, 2**62),
+                (wire.EXT_DATETIME, [0, 2**62]),
+                (wire.EXT_DATETIME, "now"),
+                (wire.EXT_STATE, ["light.bowl", "on", {}, 1]),
+                (wire.EXT_STATE, ["light.bowl", "on", None,
+                                  datetime(2015, 2, 1)]),
+                (wire.EXT_STATE, ["light.bowl", "on"]),
+                (wire.EXT_STATE, 5),
+                (wire.EXT_EVENT, ["test", {}, "unknown"]),
+                (wire.EXT_EVENT, [1, {}, "LOCAL"]),
+                (wire.EXT_SERVICE_CALL, ["light", "turn_on", [1]]),
+                (9, None)):
+            data = bytearray()
+            wire._pack_ext(ext_type, fields, data)
+
+            self.assertRaises(ValueError, wire.unpack, bytes(data))